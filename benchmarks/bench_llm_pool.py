@@ -0,0 +1,66 @@
+"""Сравнение задержки LLMClient: новый TCP на каждый вызов против общего пула.
+
+Запуск: python benchmarks/bench_llm_pool.py [--calls 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import requests
+
+from stubs import FakeLLMServer
+
+
+def _measure(call, calls: int):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with FakeLLMServer() as server:
+        os.environ.setdefault("YANDEX_API_KEY", "bench")
+        os.environ.setdefault("YANDEX_FOLDER_ID", "bench")
+        os.environ["YANDEX_LLM_URL"] = server.url
+
+        from core.llm_client import LLMClient
+
+        client = LLMClient()
+
+        def cold_call():
+            # Поведение до пула: requests.post открывает новое соединение
+            payload = {"modelUri": client.model_uri, "messages": [{"role": "user", "text": "ping"}]}
+            response = requests.post(client.url, headers=client.headers, json=payload, timeout=client.timeout)
+            response.json()
+
+        before = server.connections
+        cold_mean, cold_p95 = _measure(cold_call, args.calls)
+        cold_conns = server.connections - before
+
+        before = server.connections
+        pooled_mean, pooled_p95 = _measure(lambda: client.get_response("ping"), args.calls)
+        pooled_conns = server.connections - before
+
+    print(f"{'mode':<10} {'mean, ms':>10} {'p95, ms':>10} {'tcp conns':>10}")
+    print(f"{'cold':<10} {cold_mean:>10.3f} {cold_p95:>10.3f} {cold_conns:>10}")
+    print(f"{'pooled':<10} {pooled_mean:>10.3f} {pooled_p95:>10.3f} {pooled_conns:>10}")
+    print(f"Выигрыш на вызов: {cold_mean - pooled_mean:.3f} ms ({cold_mean / pooled_mean:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Сквозной бенчмарк CodeAgent.run и ReviewerAgent.run_review на локальных заглушках.
+
+YandexGPT и GitHub REST API заменены заглушками из stubs.py, remote —
+локальный bare-репозиторий, поэтому ничего не уходит в сеть. Для синтетических
+репозиториев и diff растущего размера печатаются p50/p95, число вызовов API,
+отправленные байты и пиковый RSS. Каждый сценарий выполняется в отдельном
+процессе, чтобы пиковый RSS не накапливался между ними.
+
+Запуск: python benchmarks/bench_pipeline.py [--sizes 20,200,1000] [--runs 5]
+        [--latency 0.05] [--failure-rate 0.05] [--response-bytes 4000] [--no-stream]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stubs import FakeGitHubServer, FakeLLMServer
+
+REPO_NAME = "bench/repo"
+
+
+def _git(cwd: Path, *args: str) -> str:
+    return subprocess.run(["git", "-C", str(cwd), *args], check=True, capture_output=True, text=True).stdout
+
+
+def _module_source(index: int, version: int = 0) -> str:
+    lines = [f'"""Синтетический модуль {index}."""', ""]
+    for fn in range(8):
+        lines += [
+            f"def compute_{index}_{fn}(values):",
+            f'    """Сумма значений с коэффициентом {fn}."""',
+            "    total = 0",
+            "    for value in values:",
+            f"        total += value * {fn + version}",
+            "    return total",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def make_repo(base: Path, files: int) -> Path:
+    """Создает bare remote с files модулями, рабочую копию и ветку PR, меняющую четверть модулей."""
+    bare, seed = base / "remote.git", base / "seed"
+    _git(base, "init", "--bare", "-b", "main", str(bare))
+    _git(base, "init", "-b", "main", str(seed))
+    _git(seed, "config", "user.email", "bench@example.com")
+    _git(seed, "config", "user.name", "bench")
+    (seed / "README.md").write_text("# Synthetic project\n", encoding="utf-8")
+    (seed / "pkg").mkdir()
+    for i in range(files):
+        (seed / "pkg" / f"mod_{i}.py").write_text(_module_source(i), encoding="utf-8")
+    _git(seed, "add", "-A")
+    _git(seed, "commit", "-q", "-m", "init")
+    _git(seed, "remote", "add", "origin", str(bare))
+    _git(seed, "push", "-q", "origin", "main")
+
+    _git(seed, "checkout", "-q", "-b", "feature/bench")
+    for i in range(0, files, 4):
+        (seed / "pkg" / f"mod_{i}.py").write_text(_module_source(i, version=1), encoding="utf-8")
+    _git(seed, "commit", "-q", "-am", "change a quarter of modules")
+    _git(seed, "push", "-q", "origin", "feature/bench")
+
+    work = base / "work"
+    _git(base, "clone", "-q", str(bare), str(work))
+    return work
+
+
+def make_responder(response_bytes: int):
+    """Ответы LLM: JSON с правкой для Code Agent, текст ревью для остальных запросов."""
+    def respond(payload: dict) -> str:
+        system = payload["messages"][0]["text"]
+        if "files_to_create" in system:
+            filler = "# " + "x" * 78 + "\n"
+            padding = filler * max(0, response_bytes // len(filler))
+            return json.dumps({
+                "files_to_create": [{"path": "pkg/generated.py", "content": f"VALUE = 1\n{padding}"}],
+                "files_to_modify": [{
+                    "path": "pkg/mod_0.py",
+                    "edits": [{"search": "        total += value * 0\n", "replace": "        total += value\n"}],
+                }],
+            }, ensure_ascii=False)
+        return "Код соответствует задаче.\n" + "Замечание. " * max(0, response_bytes // 11 // 4) + "\nAPPROVE"
+    return respond
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))]
+
+
+def run_scenario(args) -> dict:
+    """Выполняется в дочернем процессе: поднимает заглушки и гоняет один сценарий."""
+    base = Path(tempfile.mkdtemp(prefix="bench-pipeline-"))
+    work = make_repo(base, args.size)
+
+    with FakeLLMServer(
+        latency=args.latency,
+        response_text=make_responder(args.response_bytes),
+        failure_rate=args.failure_rate,
+    ) as llm_server, FakeGitHubServer(base / "remote.git", REPO_NAME) as gh_server:
+        os.environ.update({
+            "GITHUB_TOKEN": "bench",
+            "YANDEX_API_KEY": "bench",
+            "YANDEX_FOLDER_ID": "bench",
+            "REPO_NAME": REPO_NAME,
+            "GITHUB_API_URL": gh_server.api_url,
+            "YANDEX_LLM_URL": llm_server.url,
+            "AGENT_CACHE_DIR": str(base / "cache"),
+            "LLM_CACHE": "off",
+            "LLM_BACKOFF_BASE": "0.01",
+            "REVIEW_INCREMENTAL": "0",
+            "CODE_AGENT_STREAM": "1" if args.stream else "0",
+            "CODE_AGENT_VALIDATE": "1" if args.validate else "0",
+        })
+
+        import logging
+
+        from core.config import AppConfig
+        from core.git_utils import GitHubManager
+        from agents.code_agent import CodeAgent
+        from agents.reviewer_agent import ReviewerAgent
+
+        logging.getLogger().setLevel(logging.WARNING)
+        config = AppConfig(github_token="bench", llm_api_key="bench", repo_name=REPO_NAME)
+        github = GitHubManager("bench", REPO_NAME, local_path=str(work))
+
+        samples = []
+        for run in range(args.runs):
+            if args.scenario == "code":
+                gh_server.issues[run + 1] = {"title": f"Fix compute_0 coefficients ({run})", "body": "compute_0_0"}
+                agent = CodeAgent(config, github=github)
+                start = time.perf_counter()
+                result = agent.run(run + 1, workdir=work)
+                samples.append(time.perf_counter() - start)
+                if result is None:
+                    raise RuntimeError("CodeAgent.run завершился ошибкой")
+                _git(work, "checkout", "-q", "-f", "main")
+            else:
+                number = gh_server.add_pull("feature/bench", "main", "Bench PR", "Synthetic change")
+                agent = ReviewerAgent(config, gh_manager=github)
+                start = time.perf_counter()
+                agent.run_review(number)
+                samples.append(time.perf_counter() - start)
+
+        diff_bytes = len(gh_server.pull_diff(next(iter(gh_server.pulls)))) if gh_server.pulls else 0
+        llm_stats, gh_stats = llm_server.stats(), gh_server.stats()
+
+    return {
+        "scenario": args.scenario,
+        "size": args.size,
+        "diff_kb": round(diff_bytes / 1024, 1),
+        "p50_ms": round(_percentile(samples, 0.5) * 1000, 1),
+        "p95_ms": round(_percentile(samples, 0.95) * 1000, 1),
+        "llm_calls": llm_stats["requests"],
+        "gh_calls": gh_stats["requests"],
+        "gh_by_route": gh_stats["calls"],
+        "sent_kb": round((llm_stats["bytes_in"] + gh_stats["bytes_in"]) / 1024, 1),
+        "received_kb": round((llm_stats["bytes_out"] + gh_stats["bytes_out"]) / 1024, 1),
+        # ru_maxrss в Linux — в КБ
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="20,200,1000", help="Число модулей в синтетическом репозитории")
+    parser.add_argument("--scenarios", default="code,review")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа LLM, с")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Доля ответов 503 от LLM")
+    parser.add_argument("--response-bytes", type=int, default=4000, help="Размер ответа LLM")
+    parser.add_argument("--no-stream", dest="stream", action="store_false")
+    parser.add_argument("--no-validate", dest="validate", action="store_false", help="Без проверки кода перед коммитом")
+    parser.add_argument("--json", action="store_true", help="Печатать результаты в JSON")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args)))
+        return
+
+    results = []
+    for scenario in args.scenarios.split(","):
+        for size in (int(s) for s in args.sizes.split(",")):
+            child_args = [
+                sys.executable, __file__, "--scenario", scenario, "--size", str(size),
+                "--runs", str(args.runs), "--latency", str(args.latency),
+                "--failure-rate", str(args.failure_rate), "--response-bytes", str(args.response_bytes),
+            ] + ([] if args.stream else ["--no-stream"]) + ([] if args.validate else ["--no-validate"])
+            output = subprocess.run(child_args, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    columns = ["scenario", "size", "diff_kb", "p50_ms", "p95_ms", "llm_calls", "gh_calls", "sent_kb", "received_kb", "peak_rss_mb"]
+    print(" ".join(f"{c:>11}" for c in columns))
+    for row in results:
+        print(" ".join(f"{row[c]:>11}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Холодный старт CLI по данным `python -X importtime`.
+
+Для каждой команды запускает новый интерпретатор, меряет время до выхода и
+разбирает вывод importtime: суммарное время импортов и самые тяжелые модули
+верхнего уровня. С --check падает, если `main.py --help` тянет тяжелые
+зависимости (PyGithub, GitPython, requests, click) или стартует дольше --max-ms.
+
+Запуск: python benchmarks/bench_startup.py [--runs 5] [--check] [--max-ms 300]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Модули, которые не должны загружаться ради --help
+HEAVY_MODULES = ("github", "git", "requests", "click", "dotenv")
+
+COMMANDS = {
+    "help": ["main.py", "--help"],
+    "enqueue": ["main.py", "enqueue", "--help"],
+    # Полный граф импортов подкоманд solve/review — для сравнения
+    "agents": ["-c", "import sys; sys.path.insert(0, 'src'); import agents.code_agent, agents.reviewer_agent"],
+}
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """Модуль верхнего уровня вложенности -> (self мкс, cumulative мкс)."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match and len(match.group(3)) == 1:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def run_command(args: List[str]) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Сколько самых тяжелых импортов показать")
+    parser.add_argument("--check", action="store_true", help="Проверить, что --help не импортирует тяжелые модули")
+    parser.add_argument("--max-ms", type=float, default=None, help="Порог медианы старта --help, мс")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'command':<10} {'median, ms':>11} {'imports, ms':>12}  heaviest imports")
+    for name, command in COMMANDS.items():
+        samples, modules = [], {}
+        for _ in range(args.runs):
+            elapsed, modules = run_command(command)
+            samples.append(elapsed)
+        median = statistics.median(samples)
+        imports_ms = sum(cumulative for _, cumulative in modules.values()) / 1000
+        heaviest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[: args.top]
+        listing = ", ".join(f"{module} {cumulative / 1000:.1f}" for module, (_, cumulative) in heaviest)
+        print(f"{name:<10} {median:>11.1f} {imports_ms:>12.1f}  {listing}")
+
+        if name == "help":
+            loaded = [m for m in HEAVY_MODULES if m in modules]
+            if args.check and loaded:
+                failures.append(f"main.py --help импортирует {', '.join(loaded)}")
+            if args.max_ms is not None and median > args.max_ms:
+                failures.append(f"main.py --help стартует {median:.0f} мс (порог {args.max_ms:.0f} мс)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+"""Локальные заглушки внешних API для бенчмарков."""
+import hashlib
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler_cls):
+        super().__init__(("127.0.0.1", 0), handler_cls)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.calls: Counter = Counter()
+
+    def get_request(self):
+        # Каждый accept — новое TCP-соединение
+        request = super().get_request()
+        with self.lock:
+            self.connections += 1
+        return request
+
+    def count(self, route: str, bytes_in: int) -> None:
+        with self.lock:
+            self.requests += 1
+            self.bytes_in += bytes_in
+            self.calls[route] += 1
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Иначе Nagle + delayed ACK добавляют ~40 мс к каждому ответу на keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self, route: str) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        request_line = len(self.requestline) + 2 + sum(len(k) + len(v) + 4 for k, v in self.headers.items())
+        self.server.count(route, request_line + len(body))
+        return body
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json", headers=None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_out += len(body)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        with self.server.lock:
+            self.server.bytes_out += len(data)
+
+
+class _LLMHandler(_CountingHandler):
+    def _completion(self, text: str) -> bytes:
+        return json.dumps({
+            "result": {
+                "alternatives": [{"message": {"role": "assistant", "text": text}, "status": "ALTERNATIVE_STATUS_FINAL"}],
+                "usage": {"inputTextTokens": "10", "completionTokens": "10", "totalTokens": "20"},
+            }
+        }, ensure_ascii=False).encode("utf-8")
+
+    def _chat_completion(self, text: str) -> bytes:
+        return json.dumps({
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        }, ensure_ascii=False).encode("utf-8")
+
+    def _chat_chunk(self, delta: str) -> bytes:
+        chunk = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": delta}}]}
+        return b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n"
+
+    def do_POST(self):
+        openai = self.path.endswith("/chat/completions")
+        payload = json.loads(self._read_body("chat" if openai else "completion") or b"{}")
+        server = self.server
+        if openai:
+            # Приводим к виду YandexGPT, чтобы responder был общим для обоих API
+            payload = {
+                "modelUri": payload.get("model"),
+                "completionOptions": {"stream": payload.get("stream", False)},
+                "messages": [{"role": m["role"], "text": m["content"]} for m in payload.get("messages", [])],
+            }
+        with server.lock:
+            server.models[payload.get("modelUri")] += 1
+        latency = server.latency(payload) if callable(server.latency) else server.latency
+        if latency:
+            time.sleep(latency)
+        with server.lock:
+            failed = server.random.random() < server.failure_rate
+        if failed:
+            self._send(503, b'{"error": "stub failure"}')
+            return
+
+        text = server.responder(payload)
+        if not payload.get("completionOptions", {}).get("stream"):
+            self._send(200, self._chat_completion(text) if openai else self._completion(text))
+            return
+
+        # Потоковый ответ YandexGPT: по JSON-объекту на строку, в каждом — весь текст на данный момент;
+        # OpenAI-совместимый API присылает server-sent events с приращениями текста
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if openai else "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = max(1, len(text) // server.stream_chunks)
+        start = 0
+        for end in list(range(step, len(text), step)) + [len(text)]:
+            self._write_chunk(self._chat_chunk(text[start:end]) if openai else self._completion(text[:end]) + b"\n")
+            start = end
+            if server.stream_delay:
+                time.sleep(server.stream_delay)
+        if openai:
+            self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeLLMServer:
+    """Заглушка YandexGPT completion endpoint с keep-alive и счетчиком соединений.
+
+    Тот же сервер отвечает как OpenAI-совместимый API по openai_url
+    (/v1/chat/completions). responder — строка или функция payload -> текст
+    ответа (payload в формате YandexGPT); failure_rate — доля ответов 503;
+    latency — задержка ответа, число или функция payload -> секунды;
+    потоковые запросы получают ответ stream_chunks кусками.
+    """
+
+    def __init__(
+        self,
+        latency: Union[float, Callable[[dict], float]] = 0.0,
+        response_text: Union[str, Callable[[dict], str]] = "ok",
+        failure_rate: float = 0.0,
+        stream_chunks: int = 20,
+        stream_delay: float = 0.0,
+        seed: int = 0,
+    ):
+        self.httpd = _StubServer(_LLMHandler)
+        self.httpd.latency = latency
+        self.httpd.responder = response_text if callable(response_text) else (lambda payload: response_text)
+        self.httpd.failure_rate = failure_rate
+        self.httpd.stream_chunks = stream_chunks
+        self.httpd.stream_delay = stream_delay
+        self.httpd.random = random.Random(seed)
+        self.httpd.models = Counter()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/foundationModels/v1/completion"
+
+    @property
+    def openai_url(self) -> str:
+        """Базовый адрес для OPENAI_BASE_URL."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def connections(self) -> int:
+        return self.httpd.connections
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.httpd.requests,
+            "connections": self.httpd.connections,
+            "bytes_in": self.httpd.bytes_in,
+            "bytes_out": self.httpd.bytes_out,
+            "models": dict(self.httpd.models),
+        }
+
+    def __enter__(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_ROUTES = [
+    ("issue", re.compile(r"^/repos/([^/]+/[^/]+)/issues/(\d+)$")),
+    ("issue_comments", re.compile(r"^/repos/([^/]+/[^/]+)/issues/(\d+)/comments$")),
+    ("comment", re.compile(r"^/repos/([^/]+/[^/]+)/issues/comments/(\d+)$")),
+    ("pull_reviews", re.compile(r"^/repos/([^/]+/[^/]+)/pulls/(\d+)/reviews$")),
+    ("pull", re.compile(r"^/repos/([^/]+/[^/]+)/pulls/(\d+)$")),
+    ("pulls", re.compile(r"^/repos/([^/]+/[^/]+)/pulls$")),
+    ("issues", re.compile(r"^/repos/([^/]+/[^/]+)/issues$")),
+    ("search", re.compile(r"^/search/issues$")),
+    ("user", re.compile(r"^/user$")),
+    ("graphql", re.compile(r"^/graphql$")),
+]
+
+_REVIEW_STATES = {"APPROVE": "APPROVED", "REQUEST_CHANGES": "CHANGES_REQUESTED", "COMMENT": "COMMENTED"}
+
+_GRAPHQL_FIELD = re.compile(r"(\w+): issueOrPullRequest\(number: (\d+)\)")
+_GRAPHQL_OBJECT = re.compile(r'(\w+): object\(expression: "([^"]+)"\)')
+
+
+def _page(items: list, query: Dict[str, list]) -> list:
+    per_page = int(query.get("per_page", ["30"])[0])
+    page = int(query.get("page", ["1"])[0])
+    return items[(page - 1) * per_page: page * per_page]
+
+
+def _route(path: str) -> Tuple[str, Optional[int]]:
+    path = path.split("?", 1)[0]
+    for name, pattern in _ROUTES:
+        match = pattern.match(path)
+        if match:
+            return name, int(match.group(2)) if match.lastindex and match.lastindex > 1 else None
+    return "unknown", None
+
+
+class _GitHubHandler(_CountingHandler):
+    def _json(self, status: int, data, conditional: bool = False, content_type: str = "application/json") -> None:
+        body = data if isinstance(data, bytes) else json.dumps(data, ensure_ascii=False).encode("utf-8")
+        headers = {"X-RateLimit-Limit": "5000", "X-RateLimit-Reset": str(int(time.time()) + 3600)}
+        if conditional:
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                headers["X-RateLimit-Remaining"] = str(self.server.remaining)
+                self._send(304, b"", content_type, headers)
+                return
+        with self.server.lock:
+            self.server.remaining -= 1
+            headers["X-RateLimit-Remaining"] = str(self.server.remaining)
+        self._send(status, body, content_type, headers)
+
+    def do_GET(self):
+        route, number = _route(self.path)
+        self._read_body(f"GET {route}")
+        stub: "FakeGitHubServer" = self.server.stub
+        query = parse_qs(urlsplit(self.path).query)
+        if route == "issues":
+            labels = set(filter(None, query.get("labels", [""])[0].split(",")))
+            items = [stub.issue_json(n) for n in sorted(stub.issues)]
+            items += [{**stub.pull_json(n), "pull_request": {}} for n in sorted(stub.pulls)]
+            items = [i for i in items if labels <= {label["name"] for label in i["labels"]}]
+            self._json(200, _page(items, query), conditional=True)
+        elif route == "pulls":
+            self._json(200, _page([stub.pull_json(n) for n in sorted(stub.pulls)], query), conditional=True)
+        elif route == "search":
+            # Поддерживается только фильтр is:issue / is:pr и метки label:<name>
+            q = query.get("q", [""])[0].split()
+            labels = {term[len("label:"):] for term in q if term.startswith("label:")}
+            items = [stub.issue_json(n) for n in sorted(stub.issues)] if "is:issue" in q else [
+                {**stub.pull_json(n), "pull_request": {}} for n in sorted(stub.pulls)
+            ]
+            items = [i for i in items if labels <= {label["name"] for label in i["labels"]}]
+            self._json(200, {"total_count": len(items), "items": _page(items, query)})
+        elif route == "issue":
+            self._json(200, stub.issue_json(number), conditional=True)
+        elif route == "issue_comments":
+            self._json(200, _page(stub.comments.get(number, []), query), conditional=True)
+        elif route == "user":
+            # Токен GitHub Actions не раскрывает своего пользователя: GitHub отвечает 403
+            if stub.token_login is None:
+                self._json(403, {"message": "Resource not accessible by integration"})
+            else:
+                self._json(200, {"login": stub.token_login, "type": "User"}, conditional=True)
+        elif route == "pull" and number in stub.pulls:
+            if "diff" in self.headers.get("Accept", ""):
+                self._json(200, stub.pull_diff(number).encode("utf-8"), conditional=True, content_type="text/plain")
+            else:
+                self._json(200, stub.pull_json(number), conditional=True)
+        else:
+            self._json(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        route, number = _route(self.path)
+        body = json.loads(self._read_body(f"POST {route}") or b"{}")
+        stub: "FakeGitHubServer" = self.server.stub
+        if route == "graphql":
+            repository = {}
+            for alias, value in _GRAPHQL_FIELD.findall(body.get("query", "")):
+                repository[alias] = stub.graphql_node(int(value))
+            for alias, expression in _GRAPHQL_OBJECT.findall(body.get("query", "")):
+                oid = stub.rev_parse(expression)
+                repository[alias] = {"oid": oid} if oid else None
+            self._json(200, {"data": {"repository": repository}})
+        elif route == "pulls":
+            number = stub.add_pull(body["head"], body.get("base", "main"), body.get("title", ""), body.get("body", ""))
+            self._json(201, stub.pull_json(number))
+        elif route == "issue_comments":
+            self._json(201, stub.add_comment(number, body.get("body", ""), stub.token_user()))
+        elif route == "pull_reviews" and number in stub.pulls:
+            # Так GitHub отвечает на одобрение или отклонение собственного PR
+            if body.get("event") not in _REVIEW_STATES or body["event"] in stub.rejected_events:
+                self._json(422, {"message": "Unprocessable Entity", "errors": [f"Can not {body.get('event')}"]})
+                return
+            with stub._lock:
+                review = {"id": len(stub.reviews.get(number, [])) + 1, **body, "state": _REVIEW_STATES[body["event"]]}
+                stub.reviews.setdefault(number, []).append(review)
+            self._json(200, review)
+        else:
+            self._json(404, {"message": "Not Found"})
+
+    def do_PATCH(self):
+        route, number = _route(self.path)
+        body = json.loads(self._read_body(f"PATCH {route}") or b"{}")
+        stub: "FakeGitHubServer" = self.server.stub
+        comment = stub.find_comment(number) if route == "comment" else None
+        if comment is None:
+            self._json(404, {"message": "Not Found"})
+            return
+        comment["body"] = body.get("body", comment["body"])
+        self._json(200, comment)
+
+
+class FakeGitHubServer:
+    """Заглушка GitHub REST API поверх локального bare-репозитория.
+
+    Поддерживает ровно те вызовы, которые делают агенты: issue, PR (JSON и raw
+    diff, с ETag и 304), создание PR, список, создание и правку комментариев,
+    публикацию ревью (сохраняются в reviews), пользователя токена (token_login;
+    None — как у токена GitHub Actions: /user отвечает 403, а комментарии
+    пишет github-actions[bot]), а для batch-режима —
+    постраничные списки issue/PR, поиск по меткам и GraphQL issueOrPullRequest
+    (и object(expression:) для SHA файлов).
+    Diff PR считается из bare-репозитория командой `git diff base...head`.
+    """
+
+    def __init__(self, bare_repo: Union[str, Path], repo_name: str = "bench/repo"):
+        self.bare_repo = Path(bare_repo)
+        self.repo_name = repo_name
+        self.issues: Dict[int, Dict[str, str]] = {}
+        self.pulls: Dict[int, Dict[str, str]] = {}
+        self.comments: Dict[int, list] = {}
+        self.reviews: Dict[int, list] = {}
+        # События ревью, которые сервер отклоняет с 422 (как ревью собственного PR)
+        self.rejected_events: set = set()
+        self.token_login: Optional[str] = None
+        self._next_comment_id = 0
+        self._diffs: Dict[Tuple[str, str], str] = {}
+        self._heads: Dict[str, str] = {}
+        self._next_number = 1000
+        self._lock = threading.Lock()
+        self.httpd = _StubServer(_GitHubHandler)
+        self.httpd.stub = self
+        self.httpd.remaining = 5000
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def html_url(self) -> str:
+        return f"https://github.invalid/{self.repo_name}"
+
+    def issue_json(self, number: int) -> dict:
+        issue = self.issues.get(number, {"title": f"Synthetic issue {number}", "body": ""})
+        return {
+            "number": number,
+            "title": issue["title"],
+            "body": issue["body"],
+            "state": "open",
+            "labels": [{"name": name} for name in issue.get("labels", [])],
+            "url": f"{self.api_url}/repos/{self.repo_name}/issues/{number}",
+            "html_url": f"{self.html_url}/issues/{number}",
+        }
+
+    def add_pull(self, head: str, base: str = "main", title: str = "", body: str = "", labels=()) -> int:
+        with self._lock:
+            self._next_number += 1
+            number = self._next_number
+            self.pulls[number] = {"head": head, "base": base, "title": title, "body": body, "labels": list(labels)}
+        return number
+
+    def token_user(self) -> dict:
+        """Автор комментариев, которые пишутся через API."""
+        if self.token_login is None:
+            return {"login": "github-actions[bot]", "type": "Bot"}
+        return {"login": self.token_login, "type": "User"}
+
+    def add_comment(self, number: int, body: str, user: Optional[dict] = None) -> dict:
+        """Добавляет комментарий; без user — от имени пользователя-человека."""
+        with self._lock:
+            self._next_comment_id += 1
+            comment_id = self._next_comment_id
+            comment = {
+                "id": comment_id,
+                "body": body,
+                "user": user or {"login": "octocat", "type": "User"},
+                "url": f"{self.api_url}/repos/{self.repo_name}/issues/comments/{comment_id}",
+                "html_url": f"{self.html_url}/issues/{number}#issuecomment-{comment_id}",
+            }
+            self.comments.setdefault(number, []).append(comment)
+        return comment
+
+    def find_comment(self, comment_id: int) -> Optional[dict]:
+        return next((c for comments in self.comments.values() for c in comments if c["id"] == comment_id), None)
+
+    def pull_json(self, number: int) -> dict:
+        pull = self.pulls[number]
+        return {
+            "number": number,
+            "title": pull["title"],
+            "body": pull["body"],
+            "state": "open",
+            "labels": [{"name": name} for name in pull.get("labels", [])],
+            "head": {"ref": pull["head"], "sha": self.head_sha(pull["head"])},
+            "base": {"ref": pull["base"]},
+            "url": f"{self.api_url}/repos/{self.repo_name}/pulls/{number}",
+            "html_url": f"{self.html_url}/pull/{number}",
+        }
+
+    def graphql_node(self, number: int) -> Optional[dict]:
+        """Узел issueOrPullRequest в формате GraphQL API; None для несуществующего номера."""
+        if number in self.pulls:
+            pull = self.pull_json(number)
+            return {
+                "__typename": "PullRequest", "number": number, "title": pull["title"], "body": pull["body"],
+                "url": pull["html_url"], "state": "OPEN",
+                "headRefName": pull["head"]["ref"], "headRefOid": "0" * 40, "baseRefName": pull["base"]["ref"],
+            }
+        if number in self.issues:
+            issue = self.issue_json(number)
+            return {
+                "__typename": "Issue", "number": number, "title": issue["title"], "body": issue["body"],
+                "url": issue["html_url"], "state": "OPEN",
+            }
+        return None
+
+    def head_sha(self, ref: str) -> str:
+        """SHA ветки PR; запоминается, чтобы списки PR не запускали git на каждый элемент."""
+        if ref not in self._heads:
+            self._heads[ref] = self.rev_parse(ref) or "0" * 40
+        return self._heads[ref]
+
+    def rev_parse(self, expression: str) -> Optional[str]:
+        """SHA объекта в bare-репозитории (`ref`, `sha:path`); None, если объекта нет."""
+        result = subprocess.run(
+            ["git", "-C", str(self.bare_repo), "rev-parse", "--verify", "--quiet", expression],
+            capture_output=True, text=True,
+        )
+        return result.stdout.strip() or None
+
+    def pull_diff(self, number: int) -> str:
+        pull = self.pulls[number]
+        key = (pull["base"], pull["head"])
+        if key not in self._diffs:
+            self._diffs[key] = subprocess.run(
+                ["git", "-C", str(self.bare_repo), "diff", "--full-index", f"{pull['base']}...{pull['head']}"],
+                check=True, capture_output=True, text=True,
+            ).stdout
+        return self._diffs[key]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "requests": self.httpd.requests,
+            "bytes_in": self.httpd.bytes_in,
+            "bytes_out": self.httpd.bytes_out,
+            "calls": dict(self.httpd.calls),
+        }
+
+    def __enter__(self) -> "FakeGitHubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
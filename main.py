@@ -5,12 +5,12 @@ import sys
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
 
-from core.config import AppConfig, config
-from agents.code_agent import CodeAgent
-from agents.reviewer_agent import ReviewerAgent
+# Агенты, PyGithub, GitPython и requests импортируются внутри подкоманд:
+# `--help` и `enqueue` не должны платить за их загрузку
+from core.config import get_config
 
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -21,29 +21,70 @@ def main():
 
     solve_parser = subparsers.add_parser('solve', help='Решение для issue')
     solve_parser.add_argument('--issue-id', type=int, required=True, help='Issue ID to solve')
+    solve_parser.add_argument('--sparse-clone', default=os.getenv("AGENT_SPARSE_CLONE_DIR"),
+                              help='Работать в частичном (blobless, shallow, sparse) клоне в этом каталоге')
 
     review_parser = subparsers.add_parser('review', help='Review Pull Request')
     review_parser.add_argument('--pr-number', type=int, required=True, help='PR Number to review')
-    
+
+    for name, kind, noun in (('solve-batch', 'solve', 'issue'), ('review-batch', 'review', 'PR')):
+        batch_parser = subparsers.add_parser(name, help=f'Обработать несколько {noun} за один запуск')
+        batch_parser.set_defaults(kind=kind)
+        batch_parser.add_argument('numbers', type=int, nargs='*', help=f'Номера {noun}')
+        batch_parser.add_argument('--query', help=f'Поиск GitHub, например "label:bug created:>2024-01-01" (repo и тип {noun} добавляются сами)')
+        batch_parser.add_argument('--label', action='append', default=[], help=f'Все открытые {noun} с меткой (можно повторять)')
+        batch_parser.add_argument('--limit', type=int, default=None, help='Не больше N задач')
+        batch_parser.add_argument('--workers', type=int, default=int(os.getenv("AGENT_WORKERS", "2")), help='Число одновременных задач')
+        batch_parser.add_argument('--json', dest='json_path', help='Сохранить результаты в JSON-файл')
+
+    serve_parser = subparsers.add_parser('serve', help='Долгоживущий worker: задачи из локальной очереди или webhook')
+    serve_parser.add_argument('--workers', type=int, default=int(os.getenv("AGENT_WORKERS", "2")), help='Число одновременных задач')
+    serve_parser.add_argument('--queue', default=os.getenv("AGENT_QUEUE_PATH"), help='Путь к SQLite-очереди')
+    serve_parser.add_argument('--webhook-port', type=int, default=None, help='Порт для приема GitHub webhook (по умолчанию выключен)')
+    serve_parser.add_argument('--webhook-host', default='127.0.0.1', help='Адрес для приема webhook')
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='Добавить задачу в очередь worker-а')
+    enqueue_parser.add_argument('kind', choices=['solve', 'review'], help='Тип задачи')
+    enqueue_parser.add_argument('target', type=int, help='Номер Issue или PR')
+    enqueue_parser.add_argument('--queue', default=os.getenv("AGENT_QUEUE_PATH"), help='Путь к SQLite-очереди')
+
     args = parser.parse_args()
 
+    if args.command == 'enqueue':
+        from core.job_queue import JobQueue
+        from core.paths import agent_cache_dir
+
+        queue = JobQueue(args.queue or agent_cache_dir() / "jobs.sqlite")
+        queue.enqueue(args.kind, args.target)
+        return
+
     try:
-        AppConfig.load()
+        config = get_config()
     except Exception as e:
         logger.critical(f"Config загрузка провалилась {e}")
         sys.exit(1)
 
     if args.command == 'solve':
         logger.info(f"Запуск Code Agent для Issue #{args.issue_id}")
+        from agents.code_agent import CodeAgent
+
         try:
-            agent = CodeAgent(config)
-            agent.run(args.issue_id)
+            if args.sparse_clone:
+                from core.git_utils import GitHubManager
+
+                github = GitHubManager.partial_clone(config.github_token, config.repo_name, args.sparse_clone)
+                CodeAgent(config, github=github).run(args.issue_id, workdir=args.sparse_clone)
+            else:
+                agent = CodeAgent(config)
+                agent.run(args.issue_id)
         except Exception as e:
             logger.error(f"Code Agent остановился {e}", exc_info=True)
             sys.exit(1)
 
     elif args.command == 'review':
         logger.info(f"Старт Reviewer Agent для PR #{args.pr_number}")
+        from agents.reviewer_agent import ReviewerAgent
+
         try:
             agent = ReviewerAgent(config)
             agent.run_review(args.pr_number)
@@ -51,5 +92,45 @@ def main():
             logger.error(f"Reviewer Agent остановился {e}", exc_info=True)
             sys.exit(1)
 
+    elif args.command in ('solve-batch', 'review-batch'):
+        import time
+
+        from service.batch import resolve_targets, run_batch
+        from service.worker import Worker
+
+        if not (args.numbers or args.query or args.label):
+            parser.error(f"{args.command}: укажите номера, --query или --label")
+
+        # Один Worker без очереди: клиенты GitHub/LLM и пул worktree общие для всех задач пакета
+        worker = Worker(config, queue=None, concurrency=args.workers)
+        started = time.monotonic()
+        targets = resolve_targets(worker.github, args.kind, args.numbers, args.query, args.label, args.limit)
+        prefetch_seconds = time.monotonic() - started
+
+        report = run_batch(args.kind, targets, worker.execute, concurrency=args.workers)
+        report.prefetch_seconds = prefetch_seconds
+        if worker.worktrees is not None:
+            worker.worktrees.close()
+        print(report.format())
+        logger.info(f"GitHub API: {worker.github.api_stats()}")
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                f.write(report.to_json())
+        if report.failed:
+            sys.exit(1)
+
+    elif args.command == 'serve':
+        from core.job_queue import JobQueue
+        from core.paths import agent_cache_dir
+        from service.worker import Worker
+
+        queue = JobQueue(args.queue or agent_cache_dir() / "jobs.sqlite")
+        worker = Worker(config, queue, concurrency=args.workers)
+        worker.serve(
+            webhook_host=args.webhook_host,
+            webhook_port=args.webhook_port,
+            webhook_secret=os.getenv("WEBHOOK_SECRET"),
+        )
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
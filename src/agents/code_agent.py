@@ -1,29 +1,67 @@
 import os
+import contextvars
 import json
 import logging
 import re
-from typing import Dict, Any
-
-import click
-from core.config import config
-from core.git_utils import GitHubManager
-from core.llm_client import LLMClient
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
-)
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
+
+from git import Repo
+
+from core.config import get_config
+from core.context_index import ContextIndex
+from core.git_utils import GitHubManager, WorktreePool
+from core.llm_client import AsyncLLMClient
+from core.llm_router import TASK_GENERATE, ModelRouter
+from core.patching import PatchError, apply_edits, hunks_to_edits, verify_source
+from core.stream_parser import ChangesStreamParser
+from core.tokens import PRIORITY_NORMAL, PRIORITY_REQUIRED, PromptPacker, PromptSection, estimate_tokens, prompt_budget
+from core.tracing import current_span, span, traced
+from core.validation import ValidationReport, validate
+
 logger = logging.getLogger(__name__)
 
+# Ветка, в которую открываются PR с решениями
+BASE_BRANCH = "main"
+
+
+@dataclass
+class Candidate:
+    """Один из параллельно сгенерированных вариантов решения."""
+    index: int
+    temperature: float
+    # путь -> содержимое файла после применения изменений кандидата
+    files: Dict[str, str] = field(default_factory=dict)
+    report: Optional[ValidationReport] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def valid(self) -> bool:
+        return bool(self.files) and self.error is None and (self.report is None or self.report.ok)
+
+
 class CodeAgent:
-    def __init__(self, config):
+    def __init__(
+        self,
+        config,
+        stream: Optional[bool] = None,
+        github: Optional[GitHubManager] = None,
+        llm: Optional[Union[AsyncLLMClient, ModelRouter]] = None,
+    ):
         self.config = config
-        self.github = GitHubManager(
+        # Потоковый режим: файлы пишутся на диск по мере генерации ответа
+        self.stream = stream if stream is not None else os.environ.get("CODE_AGENT_STREAM", "1") == "1"
+        # Клиенты можно передать снаружи, чтобы переиспользовать их между задачами (режим serve)
+        self.github = github or GitHubManager(
             token=config.github_token,
             repo_name=config.repo_name
         )
-        self.llm = LLMClient()
+        self.llm = llm or ModelRouter.from_config(config)
         if hasattr(self.llm, 'init'):
             try:
                 self.llm.init()
@@ -31,20 +69,43 @@ class CodeAgent:
                 self.llm.init(api_key=config.llm_api_key)
 
         self.excluded_dirs = {".git", "venv", "__pycache__", "node_modules", ".idea"}
+        self.context_index = ContextIndex(".", excluded_dirs=self.excluded_dirs)
+        self._worktree_indexes: Dict[Path, ContextIndex] = {}
+        # Необязательный верхний предел контекста; по умолчанию заполняется всё окно модели
+        self.context_budget = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "0"))
+        # Правки существующих файлов фрагментами search/replace вместо полного содержимого
+        self.patch_edits = os.environ.get("CODE_AGENT_PATCH_EDITS", "1") == "1"
+        # Сколько самых релевантных файлов выгружать в sparse-checkout для контекста
+        self.sparse_context_files = int(os.environ.get("SPARSE_CONTEXT_FILES", "20"))
+        # Проверка записанных файлов (ast, ruff, mypy, затронутые тесты) до коммита и число попыток исправления
+        self.validate_changes = os.environ.get("CODE_AGENT_VALIDATE", "1") == "1"
+        self.repair_attempts = int(os.environ.get("CODE_AGENT_REPAIR_ATTEMPTS", "2"))
+        # Спекулятивный режим: K решений параллельно с разной температурой, побеждает первое прошедшее проверку
+        self.candidates = int(os.environ.get("CODE_AGENT_CANDIDATES", "1"))
+        self.candidate_temperatures = [
+            float(t) for t in os.environ.get("CODE_AGENT_CANDIDATE_TEMPERATURES", "0.2,0.5,0.8").split(",") if t.strip()
+        ]
+        self._scratch: Optional[WorktreePool] = None
+        self._scratch_lock = threading.Lock()
+
+    def _llm(self, task: str) -> AsyncLLMClient:
+        """Клиент LLM для типа промпта (модель выбирает ModelRouter)."""
+        return self.llm.for_task(task) if hasattr(self.llm, "for_task") else self.llm
 
-    def _get_project_context(self) -> str:
-        """Собирает контекст существующих файлов."""
-        context = []
-        for root, dirs, files in os.walk("."):
-            dirs[:] = [d for d in dirs if d not in self.excluded_dirs]
-            for file in files:
-                if file.endswith((".py", ".md")):
-                    path = os.path.join(root, file)
-                    try:
-                        with open(path, "r", encoding="utf-8") as f:
-                            context.append(f"FILE: {path}\n{f.read()}\n---\n")
-                    except: continue
-        return "\n".join(context)
+    def _index_for(self, root: Path) -> ContextIndex:
+        """Индекс контекста для рабочей копии; индексы worktree-ов пула переиспользуются между задачами."""
+        if root == Path("."):
+            return self.context_index
+        root = root.resolve()
+        if root not in self._worktree_indexes:
+            self._worktree_indexes[root] = ContextIndex(str(root), excluded_dirs=self.excluded_dirs)
+        return self._worktree_indexes[root]
+
+    def _get_project_context(self, query: str, token_budget: int, root: Path = Path(".")) -> str:
+        """Собирает контекст релевантных задаче файлов в пределах бюджета токенов."""
+        if self.context_budget:
+            token_budget = min(token_budget, self.context_budget)
+        return self._index_for(root).build_context(query, token_budget)
 
     def _parse_json_response(self, text: str) -> Dict[str, Any]:
         """Извлекает JSON из ответа YandexGPT."""
@@ -53,16 +114,332 @@ class CodeAgent:
         try:
             match = re.search(r"(\{[\s\S]*\})", text)
             json_str = match.group(1) if match else text
-            return json.loads(json_str.strip())
+            return json.loads(json_str.strip(), strict=False)
         except Exception as e:
             logger.error(f"Ошибка парсинга JSON: {e}. Сырой текст: {text}")
             return {"files_to_create": [], "files_to_modify": []}
 
-    def run(self, issue_number: int):
+    @staticmethod
+    def _resolve_path(root: Path, rel_path: str) -> Optional[Path]:
+        """Путь внутри рабочей копии; пути, выходящие за ее пределы, отклоняются."""
+        root = root.resolve()
+        path = (root / rel_path).resolve()
+        if path != root and root not in path.parents:
+            logger.error(f"Путь вне рабочей копии отклонен: {rel_path}")
+            return None
+        return path
+
+    def _apply_change(self, kind: str, entry: Dict[str, Any], root: Path = Path(".")) -> bool:
+        """Записывает на диск одну запись из files_to_create/files_to_modify."""
+        path = self._resolve_path(root, entry["path"])
+        if path is None:
+            return False
+        if kind == "files_to_create":
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(entry["content"], encoding="utf-8")
+            logger.info(f"Файл создан: {entry['path']}")
+            return True
+
+        if not path.exists():
+            return False
+        if "edits" in entry or "diff" in entry:
+            # PatchError пробрасывается: вызывающий код откатывается на полную перезапись файла
+            edits = entry.get("edits") or hunks_to_edits(entry.get("diff", ""))
+            updated = apply_edits(path.read_text(encoding="utf-8"), edits)
+            verify_source(entry["path"], updated)
+            path.write_text(updated, encoding="utf-8")
+            logger.info(f"Файл изменен патчем: {entry['path']} ({len(edits)} правок)")
+            return True
+
+        path.write_text(entry["content"], encoding="utf-8")
+        logger.info(f"Файл обновлен: {entry['path']}")
+        return True
+
+    def _apply_or_defer(
+        self, kind: str, entry: Dict[str, Any], root: Path, written: List[str], failed: List[Tuple[Dict[str, Any], str]]
+    ) -> None:
+        try:
+            if self._apply_change(kind, entry, root):
+                written.append(entry["path"])
+        except PatchError as e:
+            logger.warning(f"Патч для {entry['path']} не применился: {e}")
+            failed.append((entry, str(e)))
+
+    def _apply_response(self, changes: Dict[str, Any], task: str, root: Path) -> List[str]:
+        """Применяет разобранный ответ LLM; непримененные патчи запрашиваются файлом целиком."""
+        written: List[str] = []
+        failed: List[Tuple[Dict[str, Any], str]] = []
+        for kind in ("files_to_create", "files_to_modify"):
+            for f in changes.get(kind, []):
+                self._apply_or_defer(kind, f, root, written, failed)
+        for entry, error in failed:
+            with span("code_agent.rewrite_fallback", path=entry["path"]):
+                if self._rewrite_file(entry, error, task, root):
+                    written.append(entry["path"])
+        return written
+
+    def _rewrite_file(self, entry: Dict[str, Any], error: str, task: str, root: Path) -> bool:
+        """Запасной путь: просит LLM прислать файл целиком, если патч не применился."""
+        path = self._resolve_path(root, entry["path"])
+        if path is None or not path.exists():
+            return False
+        system_role = (
+            "Ты — Senior Python Developer. Верни JSON вида {\"path\": \"...\", \"content\": \"...\"} "
+            "с полным новым содержимым файла."
+        )
+        prompt = (
+            f"{task}\n"
+            f"Правки к файлу {entry['path']} не применились ({error}):\n"
+            f"{json.dumps(entry.get('edits') or entry.get('diff'), ensure_ascii=False)}\n\n"
+            f"Текущее содержимое файла:\n{path.read_text(encoding='utf-8')}"
+        )
+        logger.info(f"Запрос полного содержимого {entry['path']} вместо патча...")
+        response = self._parse_json_response(self._llm(TASK_GENERATE).get_response(prompt, system_role=system_role))
+        if "content" not in response:
+            response = next(iter(response.get("files_to_modify", [])), {})
+        content = response.get("content")
+        if content is None:
+            logger.error(f"LLM не вернул содержимое {entry['path']}")
+            return False
+        try:
+            verify_source(entry["path"], content)
+        except PatchError as e:
+            logger.error(f"Полная версия {entry['path']} тоже не прошла проверку: {e}")
+            return False
+        path.write_text(content, encoding="utf-8")
+        logger.info(f"Файл перезаписан целиком: {entry['path']}")
+        return True
+
+    def _stream_changes(
+        self, prompt: str, system_role: str, root: Path = Path("."), failed: Optional[List[Tuple[Dict[str, Any], str]]] = None
+    ) -> List[str]:
+        """Применяет записи файлов по мере их поступления из потока LLM; возвращает записанные пути."""
+        parser = ChangesStreamParser()
+        written: List[str] = []
+        failed = failed if failed is not None else []
+        for chunk in self._llm(TASK_GENERATE).stream_response(prompt, system_role=system_role):
+            for kind, entry in parser.feed(chunk):
+                self._apply_or_defer(kind, entry, root, written, failed)
+        if not parser.started:
+            logger.error("В ответе LLM не найден JSON с изменениями.")
+        return written
+
+    @staticmethod
+    def _excerpts(report: ValidationReport, root: Path, radius: int = 5, max_whole_lines: int = 300) -> str:
+        """Фрагменты файлов вокруг строк с замечаниями — по ним LLM составляет search/replace правки.
+
+        Упавшие тесты не указывают строку в измененном файле, поэтому при них небольшие
+        измененные файлы без других замечаний передаются целиком.
+        """
+        lines_by_path: Dict[str, List[int]] = {}
+        for d in report.diagnostics:
+            if d.line and d.path in report.paths:
+                lines_by_path.setdefault(d.path, []).append(d.line)
+        blocks = []
+        if any(d.check == "tests" for d in report.diagnostics):
+            for path in report.paths:
+                text = (root / path).read_text(encoding="utf-8")
+                if path not in lines_by_path and text.count("\n") <= max_whole_lines:
+                    blocks.append(f"{path}:\n{text}")
+        for path, lines in lines_by_path.items():
+            text = (root / path).read_text(encoding="utf-8").splitlines()
+            ranges: List[List[int]] = []
+            for line in sorted(set(lines)):
+                start, end = max(1, line - radius), min(len(text), line + radius)
+                if ranges and start <= ranges[-1][1] + 1:
+                    ranges[-1][1] = max(ranges[-1][1], end)
+                else:
+                    ranges.append([start, end])
+            for start, end in ranges:
+                blocks.append(f"{path}, строки {start}-{end}:\n" + "\n".join(text[start - 1:end]))
+        return "\n\n".join(blocks)
+
+    def _validate_and_repair(
+        self, task: str, system_role: str, written: List[str], root: Path, report: Optional[ValidationReport] = None
+    ) -> ValidationReport:
+        """Проверяет записанные файлы; при замечаниях отправляет LLM только их (и фрагменты кода вокруг)
+        и применяет исправления — не более repair_attempts раз. report — уже полученный результат проверки."""
+        report = report or validate(root, written)
+        for attempt in range(1, self.repair_attempts + 1):
+            if report.ok:
+                break
+            logger.warning(
+                f"Проверка не пройдена ({len(report.diagnostics)} замечаний), исправление {attempt}/{self.repair_attempts}"
+            )
+            prompt = (
+                f"{task}\n"
+                f"Твои изменения не прошли автоматическую проверку. Замечания:\n{report.format_for_prompt()}\n\n"
+                f"Текущий код вокруг замечаний:\n{self._excerpts(report, root)}\n\n"
+                "Исправь только эти ошибки, остальной код не меняй."
+            )
+            with span("code_agent.repair", attempt=attempt):
+                changes = self._parse_json_response(self._llm(TASK_GENERATE).get_response(prompt, system_role=system_role))
+                fixed = self._apply_response(changes, task, root)
+            if not fixed:
+                logger.warning("LLM не прислал исправлений, проверка остается непройденной.")
+                break
+            current_span().add("repairs")
+            written.extend(p for p in fixed if p not in written)
+            report = validate(root, written)
+        if report.ok:
+            logger.info(f"Проверка пройдена: {report.summary()}")
+        return report
+
+    def _scratch_pool(self) -> WorktreePool:
+        """Пул черновых worktree для кандидатов; отдельный от пула задач воркера."""
+        with self._scratch_lock:
+            if self._scratch is None:
+                repo = self.github.local_repo
+                self._scratch = WorktreePool(
+                    repo, max_size=self.candidates, root=Path(repo.git_dir) / "agent-scratch"
+                )
+            return self._scratch
+
+    def _run_candidate(
+        self, index: int, temperature: float, prompt: str, system_role: str, task: str, base_ref: str,
+        stop: threading.Event, awaiting_llm: Optional[Set[int]] = None,
+    ) -> Candidate:
+        """Генерирует, применяет и проверяет одно решение в черновом worktree.
+
+        stop проверяется перед каждым шагом (запрос к LLM, worktree, проверка):
+        после выбора победителя кандидат прекращает работу на ближайшей границе шага.
+        Worktree берется только после ответа LLM, поэтому проигравший кандидат,
+        ждущий ответа, не держит черновую копию; пока идет запрос, index лежит
+        в awaiting_llm.
+        """
+        awaiting_llm = set() if awaiting_llm is None else awaiting_llm
+        candidate = Candidate(index, temperature)
+        started = time.monotonic()
+
+        def cancelled() -> bool:
+            if stop.is_set():
+                candidate.error = "отменен: выбран другой кандидат"
+            return stop.is_set()
+
+        with span("code_agent.candidate", index=index, temperature=temperature):
+            try:
+                # Отметка ставится до проверки stop: иначе _solve_speculative может не
+                # дождаться кандидата, который после проверки уйдет в долгий запрос
+                awaiting_llm.add(index)
+                try:
+                    if cancelled():
+                        return candidate
+                    client = self._llm(TASK_GENERATE)
+                    if hasattr(client, "with_temperature"):
+                        client = client.with_temperature(temperature)
+                    response = client.get_response(prompt, system_role=system_role)
+                finally:
+                    awaiting_llm.discard(index)
+                changes = self._parse_json_response(response)
+                if cancelled():
+                    return candidate
+                with self._scratch_pool().lease(base_ref) as scratch:
+                    if cancelled():
+                        return candidate
+                    written = self._apply_response(changes, task, scratch)
+                    if not written:
+                        candidate.error = "ответ не разобран или не содержит применимых изменений"
+                        return candidate
+                    if self.validate_changes:
+                        if cancelled():
+                            return candidate
+                        candidate.report = validate(scratch, written)
+                    if cancelled():
+                        return candidate
+                    candidate.files = {p: (scratch / p).read_text(encoding="utf-8") for p in dict.fromkeys(written)}
+            except Exception as e:
+                candidate.error = f"{type(e).__name__}: {e}"
+            finally:
+                candidate.seconds = time.monotonic() - started
+        return candidate
+
+    def _solve_speculative(
+        self, prompt: str, system_role: str, task: str, root: Path
+    ) -> Tuple[List[str], Optional[ValidationReport]]:
+        """Запускает candidates решений параллельно и записывает в root первое, прошедшее проверку.
+
+        Все кандидаты стартуют сразу, по потоку на каждого. После выбора
+        победителя остальные бросают работу на ближайшей проверке stop (см.
+        _run_candidate). Кандидаты, успевшие взять черновой worktree, дожидаются
+        до возврата из метода; уже отправленный запрос к LLM не прерывается, и
+        кандидат, ждущий ответа (без worktree), может завершиться позже. Если
+        ни один не прошел проверку, берется применившийся кандидат с наименьшим
+        числом замечаний.
+        """
+        temperatures = [self.candidate_temperatures[i % len(self.candidate_temperatures)] for i in range(self.candidates)]
+        base_ref = Repo(root).head.commit.hexsha
+        stop = threading.Event()
+        awaiting_llm: Set[int] = set()
+        executor = ThreadPoolExecutor(max_workers=self.candidates, thread_name_prefix="candidate")
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                self._run_candidate, i, t, prompt, system_role, task, base_ref, stop, awaiting_llm,
+            )
+            for i, t in enumerate(temperatures)
+        ]
+        finished: List[Candidate] = []
+        winner: Optional[Candidate] = None
+        try:
+            for future in as_completed(futures):
+                candidate = future.result()
+                finished.append(candidate)
+                if candidate.valid:
+                    winner = candidate
+                    break
+                diagnostics = candidate.report.diagnostics if candidate.report else []
+                reason = candidate.error or f"{len(diagnostics)} замечаний проверки"
+                logger.warning(f"Кандидат {candidate.index} (t={candidate.temperature}) отклонен: {reason}")
+        finally:
+            stop.set()
+            # Кандидатов с черновым worktree доводим до ближайшей проверки stop, чтобы они
+            # вернули его в пул; ждущие ответа LLM worktree не держат, их не ждем
+            wait([f for i, f in enumerate(futures) if i not in awaiting_llm])
+            executor.shutdown(wait=False)
+
+        current_span().add("candidates_finished", len(finished))
+        if winner is None:
+            applied = [c for c in finished if c.files]
+            if not applied:
+                return [], None
+            winner = min(applied, key=lambda c: len(c.report.diagnostics) if c.report else 0)
+            logger.warning(f"Ни один кандидат не прошел проверку, берем кандидата {winner.index} с наименьшим числом замечаний")
+        else:
+            logger.info(
+                f"Выбран кандидат {winner.index} (t={winner.temperature}) за {winner.seconds:.1f} с, "
+                f"проверено {len(finished)} из {len(futures)}"
+            )
+        current_span().set("winner", winner.index)
+        for rel_path, text in winner.files.items():
+            path = self._resolve_path(root, rel_path)
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(text, encoding="utf-8")
+        return list(winner.files), winner.report
+
+    def _prepare_sparse_checkout(self, github: GitHubManager, query: str, root: Path) -> None:
+        """В sparse-checkout выгружает только файлы, которые попадут в контекст задачи."""
+        if not github.is_sparse:
+            return
+        started = time.perf_counter()
+        index = self._index_for(root)
+        index.tracked_blobs = github.tracked_blobs()
+        github.sparse_add(index.candidates(query, self.sparse_context_files))
+        logger.info(f"Рабочая копия подготовлена за {time.perf_counter() - started:.2f} с")
+
+    @traced("code_agent.run")
+    def run(self, issue_number: int, workdir: Optional[Union[str, Path]] = None) -> Optional[int]:
+        """Решает issue и возвращает номер созданного PR (None при ошибке).
+
+        workdir — рабочая копия (например, worktree из WorktreePool), в которую
+        пишутся файлы и из которой делается коммит; по умолчанию текущий каталог.
+        """
+        root = Path(workdir) if workdir else Path(".")
+        github = self.github.for_local_path(root) if workdir else self.github
         try:
             logger.info(f"=== [START] Code Agent | Issue #{issue_number} ===")
 
-            issue_data = self.github.get_issue(issue_number)
+            issue_data = github.get_issue(issue_number)
             if isinstance(issue_data, dict):
                 title = issue_data.get("title", "No Title")
                 body = issue_data.get("body", "")
@@ -72,70 +449,120 @@ class CodeAgent:
 
             logger.info(f"Задача: {title}")
 
-            context = self._get_project_context()
-
             system_role = (
                 "Ты — Senior Python Developer. \n"
                 "Весь программный код внутри JSON-полей должен быть представлен как одна строка, где все переносы строк заменены на символ \n, а внутренние двойные кавычки экранированы как \"."
-                "Формат: {\"files_to_create\": [{\"path\": \"...\", \"content\": \"...\"}], \"files_to_modify\": []}"
             )
-            prompt = (
+            if self.patch_edits:
+                system_role += (
+                    "Формат: {\"files_to_create\": [{\"path\": \"...\", \"content\": \"...\"}], "
+                    "\"files_to_modify\": [{\"path\": \"...\", \"edits\": [{\"search\": \"...\", \"replace\": \"...\"}]}]}. "
+                    "Существующие файлы не присылай целиком: search — точный фрагмент текущего файла "
+                    "(несколько строк, однозначно находимых в файле), replace — его новая версия."
+                )
+            else:
+                system_role += "Формат: {\"files_to_create\": [{\"path\": \"...\", \"content\": \"...\"}], \"files_to_modify\": []}"
+            task = (
                 f"Реши задачу: {title}\n"
-                f"Описание: {body}\n\n"
-                f"Контекст проекта:\n{context}"
+                f"Описание: {body}\n"
             )
 
-            logger.info("Запрос к YandexGPT за решением...")
-            raw_response = self.llm.get_response(prompt, system_role=system_role)
-            logger.info("Ответ от LLM получен.")
+            current_span().set("issue", issue_number)
+            with span("code_agent.context") as trace:
+                self._prepare_sparse_checkout(github, f"{title}\n{body}", root)
+                llm = self._llm(TASK_GENERATE)
+                budget = prompt_budget(llm.model_name, llm.max_tokens, system_role)
+                context = self._get_project_context(f"{title}\n{body}", budget - estimate_tokens(task), root)
+                prompt = PromptPacker(budget).pack([
+                    PromptSection("task", task, PRIORITY_REQUIRED),
+                    PromptSection("context", f"Контекст проекта:\n{context}", PRIORITY_NORMAL),
+                ]).text
+                trace.add("prompt_tokens", estimate_tokens(prompt))
 
-            changes = self._parse_json_response(raw_response)
-            
             branch_name = f"fix/issue-{issue_number}"
-            self.github.create_branch(branch_name)
-
-            applied_any = False
-            for f in changes.get("files_to_create", []):
-                path = f["path"]
-                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-                with open(path, "w", encoding="utf-8") as fd:
-                    fd.write(f["content"])
-                logger.info(f"Файл создан: {path}")
-                applied_any = True
-
-            for f in changes.get("files_to_modify", []):
-                path = f["path"]
-                if os.path.exists(path):
-                    with open(path, "w", encoding="utf-8") as fd:
-                        fd.write(f["content"])
-                    logger.info(f"Файл обновлен: {path}")
-                    applied_any = True
-
-            if not applied_any:
-                logger.warning("Изменения не были применены. Проверь ответ LLM.")
+            failed: List[Tuple[Dict[str, Any], str]] = []
+
+            report: Optional[ValidationReport] = None
+            if self.candidates > 1:
+                github.create_branch(branch_name)
+                logger.info(f"Генерация {self.candidates} кандидатов решения параллельно...")
+                with span("code_agent.speculative", candidates=self.candidates):
+                    written, report = self._solve_speculative(prompt, system_role, task, root)
+            elif self.stream:
+                github.create_branch(branch_name)
+                logger.info("Потоковый запрос к YandexGPT за решением...")
+                with span("code_agent.generate_and_apply", stream=True):
+                    written = self._stream_changes(prompt, system_role, root, failed)
+                logger.info("Ответ от LLM получен.")
+            else:
+                logger.info("Запрос к YandexGPT за решением...")
+                raw_response = self._llm(TASK_GENERATE).get_response(prompt, system_role=system_role)
+                logger.info("Ответ от LLM получен.")
+
+                with span("code_agent.parse_json"):
+                    changes = self._parse_json_response(raw_response)
+                github.create_branch(branch_name)
+
+                written = []
+                with span("code_agent.apply"):
+                    for kind in ("files_to_create", "files_to_modify"):
+                        for f in changes.get(kind, []):
+                            self._apply_or_defer(kind, f, root, written, failed)
+
+            for entry, error in failed:
+                with span("code_agent.rewrite_fallback", path=entry["path"]):
+                    if self._rewrite_file(entry, error, task, root):
+                        written.append(entry["path"])
+            current_span().add("files_written", len(written))
+            current_span().add("patch_fallbacks", len(failed))
+
+            if not written:
+                # Пустой коммит и PR без изменений только тратят время ревьюера
+                logger.error("Изменения не были применены, коммит и PR не создаются. Проверь ответ LLM.")
+                current_span().error = "no changes"
+                return None
+
+            pr_body = f"Automated fix for #{issue_number}"
+            if self.validate_changes:
+                if report is None or not report.ok:
+                    with span("code_agent.validate"):
+                        report = self._validate_and_repair(task, system_role, written, root, report)
+                if not report.ok:
+                    # После всех попыток PR все равно создается, но ревьюер сразу видит замечания
+                    pr_body += f"\n\nАвтоматическая проверка не пройдена:\n```\n{report.format_for_prompt()}\n```"
 
             commit_message = f"Fix #{issue_number}: {title}"
             logger.info(f"Коммит и пуш в ветку {branch_name}...")
-            self.github.commit_and_push(branch_name, commit_message)
+            github.commit_and_push(branch_name, commit_message, paths=written)
 
             logger.info("Создание Pull Request...")
-            pr_url = self.github.create_pull_request(
+            pr_number = github.create_pull_request(
                 f"Fix: {title}",
-                f"Automated fix for #{issue_number}",
+                pr_body,
                 branch_name,
-                "main"
+                BASE_BRANCH
             )
-            
-            logger.info(f"Прошло успешно! PR: {pr_url}")
+
+            logger.info(f"Прошло успешно! PR #{pr_number}")
+            return pr_number
 
         except Exception as e:
             logger.error(f"Критическая ошибка: {e}", exc_info=True)
+            current_span().error = f"{type(e).__name__}: {e}"
+            return None
+
+def main():
+    # click нужен только при прямом запуске модуля
+    import click
+
+    @click.command()
+    @click.option("--issue-number", type=int, required=True)
+    def cli(issue_number: int):
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+        agent = CodeAgent(get_config())
+        agent.run(issue_number)
 
-@click.command()
-@click.option("--issue-number", type=int, required=True)
-def main(issue_number: int):
-    agent = CodeAgent()
-    agent.run(issue_number)
+    cli()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
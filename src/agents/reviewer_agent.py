@@ -1,91 +1,577 @@
 import argparse
+import hashlib
+import json
 import logging
+import os
 import re
-from typing import Optional
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
 
-from core.config import config
-from core.git_utils import GitHubManager
-from core.llm_client import LLMClient
+from core.config import get_config
+from core.diff_parser import diff_positions
+from core.git_utils import GitHubManager, ReviewComment
+from core.llm_client import AsyncLLMClient
+from core.llm_router import TASK_REDUCE, TASK_REVIEW_CHUNK, ModelRouter
+from core.review_state import ReviewStateStore, same_blob
+from core.compression import CompressionStats, Deduplicator, compress_diff
+from core.impact import run_impacted_tests
+from core.tokens import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    PRIORITY_REQUIRED,
+    PromptPacker,
+    PromptSection,
+    estimate_tokens,
+    path_priority,
+    prompt_budget,
+)
+from core.tracing import current_span, span, traced
 
 logger = logging.getLogger(__name__)
 
+# Замечание к строке в отчете: "- `path/to/file.py:42` — текст"
+_INLINE_FINDING_RE = re.compile(
+    r"^\s*[-*]\s+`?(?P<path>[^\s`:]+):(?P<line>\d+)(?:-\d+)?`?\s*(?:—|–|-|:)\s*(?P<body>.+)$", re.MULTILINE
+)
+_VERDICT_RE = re.compile(r"Вердикт\W*(APPROVE|REQUEST_CHANGES)")
+_VERDICT_LINE_RE = re.compile(r"^\W*Вердикт", re.MULTILINE)
+
+
+def parse_verdict(report: str) -> str:
+    """Событие ревью GitHub по строке "Вердикт: ..." отчета; без вердикта — COMMENT.
+
+    Упоминание REQUEST_CHANGES вне строки вердикта не блокирует PR: ревью с
+    этим событием мешает слиянию, поэтому нужен явный вердикт модели.
+    """
+    verdicts = _VERDICT_RE.findall(report)
+    return verdicts[-1] if verdicts else "COMMENT"
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
 class ReviewerAgent:
-    def __init__(self,config):
+    def __init__(
+        self,
+        config,
+        gh_manager: Optional[GitHubManager] = None,
+        llm: Optional[Union[AsyncLLMClient, ModelRouter]] = None,
+    ):
         self.config = config
-        self.gh_manager = GitHubManager(
+        self.gh_manager = gh_manager or GitHubManager(
             token=config.github_token,
             repo_name=config.repo_name
         )
-        self.llm = LLMClient()
+        self.llm = llm or ModelRouter.from_config(config)
+        self.max_concurrency = int(os.environ.get("REVIEW_MAX_CONCURRENCY", "4"))
+        # Повторное ревью на synchronize проверяет только файлы с новым blob SHA
+        self.incremental = os.environ.get("REVIEW_INCREMENTAL", "1") == "1"
+        # Прогон тестов, зависящих от измененных файлов; результаты попадают в промпт
+        self.run_tests = os.environ.get("REVIEW_RUN_TESTS", "0") == "1"
+        self.state_store = ReviewStateStore(config.repo_name)
+        # review — одно ревью с inline-комментариями и сводный комментарий, обновляемый на месте;
+        # comment — новый комментарий к PR на каждый запуск
+        self.publish_mode = os.environ.get("REVIEW_PUBLISH", "review")
+        # Сколько строк неизмененного контекста оставлять вокруг правок в diff (-1 — не сворачивать)
+        self.diff_context = int(os.environ.get("REVIEW_DIFF_CONTEXT", "1"))
+        # Фильтры и лимиты при получении diff: REVIEW_EXCLUDE="*.lock,docs/*"
+        max_file_bytes = os.environ.get("REVIEW_MAX_FILE_BYTES")
+        max_total_bytes = os.environ.get("REVIEW_MAX_DIFF_BYTES")
+        self.diff_filters = {
+            "exclude": [p for p in os.environ.get("REVIEW_EXCLUDE", "").split(",") if p] or None,
+            "max_file_bytes": int(max_file_bytes) if max_file_bytes else None,
+            "max_total_bytes": int(max_total_bytes) if max_total_bytes else None,
+        }
+
+    def _llm(self, task: str) -> AsyncLLMClient:
+        """Клиент LLM для типа промпта (модель выбирает ModelRouter)."""
+        return self.llm.for_task(task) if hasattr(self.llm, "for_task") else self.llm
 
     def _extract_issue_number(self, pr_body: str) -> Optional[int]:
         match = re.search(r'#(\d+)', pr_body)
         return int(match.group(1)) if match else None
 
-    def run_review(self, pr_number: int, issue_number: Optional[int] = None):
-        try:
-            logger.info(f"Начало ревью для PR #{pr_number}")
-            
-            pr = self.gh_manager.get_pull_request(pr_number)
-            diff = self.gh_manager.get_pr_diff(pr_number)
-            
-            if len(diff) > 20000:
-                logger.warning("Diff слишком большой для анализа.")
-                self.gh_manager.post_comment_to_pr(pr_number, "Diff слишком большой для анализа. ")
-                return
-
-            target_issue_id = issue_number or self._extract_issue_number(pr.body or "")
-            issue_text = "Описание задачи отсутствует."
-            if target_issue_id:
-                issue_data = self.gh_manager.get_issue(target_issue_id)
-                issue_text = f"Title: {issue_data['title']}\nBody: {issue_data['body']}"
+    @staticmethod
+    def _split_diff(diff: str) -> List[Tuple[str, str]]:
+        """Делит diff из get_pr_diff на пары (путь файла, текст секции)."""
+        parts = re.split(r"^File: ", diff, flags=re.MULTILINE)
+        sections = []
+        for part in parts[1:]:
+            path = part.split("\n", 1)[0].strip()
+            sections.append((path, f"File: {part.rstrip()}"))
+        return sections
 
-            system_prompt = "Ты — Senior Code Reviewer. Ты должен провести тщательный анализ кода."
-            prompt = f"""
+    @staticmethod
+    def _split_file_by_hunks(path: str, text: str, budget: int) -> List[Tuple[str, str]]:
+        """Режет diff одного файла по хункам (@@) на части не больше budget токенов."""
+        body = text.split("\n", 1)[1] if "\n" in text else ""
+        hunks = re.split(r"(?=^@@ )", body, flags=re.MULTILINE)
+        parts: List[Tuple[str, str]] = []
+        current: List[str] = []
+        used = 0
+        for hunk in hunks:
+            cost = estimate_tokens(hunk)
+            if current and used + cost > budget:
+                parts.append((path, "".join(current)))
+                current, used = [], 0
+            current.append(hunk)
+            used += cost
+        if current:
+            parts.append((path, "".join(current)))
+        if len(parts) == 1:
+            return [(path, text)]
+        return [
+            (path, f"File: {path} (часть {i}/{len(parts)})\n{hunk_text}")
+            for i, (_, hunk_text) in enumerate(parts, start=1)
+        ]
+
+    def _chunk_diff(self, files: List[Tuple[str, str]], budget: int) -> List[List[Tuple[str, str]]]:
+        """Группирует файлы diff в чанки, каждый из которых помещается в budget токенов."""
+        chunks: List[List[Tuple[str, str]]] = []
+        current: List[Tuple[str, str]] = []
+        used = 0
+        for path, text in files:
+            pieces = [(path, text)]
+            if estimate_tokens(text) > budget:
+                pieces = self._split_file_by_hunks(path, text, budget)
+            for piece in pieces:
+                cost = estimate_tokens(piece[1])
+                if current and used + cost > budget:
+                    chunks.append(current)
+                    current, used = [], 0
+                current.append(piece)
+                used += cost
+        if current:
+            chunks.append(current)
+        return chunks
+
+    @staticmethod
+    def _parse_file_findings(text: str, paths: List[str], strict: bool = False) -> Dict[str, str]:
+        """Раскладывает ответ по файлам по заголовкам вида "#### path"; строка вердикта в замечания не входит.
+
+        Если модель не соблюла формат, весь ответ относится к каждому файлу части.
+        strict=True — только файлы с собственным разделом, без подстановок.
+        """
+        findings: Dict[str, str] = {}
+        for block in re.split(r"^#{2,4}\s+", text, flags=re.MULTILINE)[1:]:
+            title, _, body = block.partition("\n")
+            title = title.strip().strip("`*").strip()
+            body = _VERDICT_LINE_RE.split(body, maxsplit=1)[0]
+            for path in paths:
+                if title == path or title.endswith(path) or path.endswith(title):
+                    findings[path] = body.strip() or "Замечаний нет."
+                    break
+        if strict:
+            return findings
+        if not findings:
+            return {path: text.strip() for path in paths}
+        return {path: findings.get(path, "Замечаний нет.") for path in paths}
+
+    @traced("reviewer.map")
+    def _map_files(
+        self, files: List[Tuple[str, str]], issue_text: str, system_prompt: str
+    ) -> Tuple[Dict[str, str], Set[str]]:
+        """Map-шаг: параллельно проверяет чанки diff и возвращает замечания по файлам и непроверенные файлы."""
+        chunk_header = f"""
+                Ты проверяешь часть большого Pull Request.
+
+                ЗАДАЧА (ISSUE):
+                {issue_text}
+
+                ЧАСТЬ ИЗМЕНЕНИЙ (DIFF):
+                """
+        chunk_footer = """
+                Найди в этой части явные баги, проблемы с безопасностью и нарушения стиля Python.
+                Для каждого файла напиши заголовок "#### <путь файла>" и под ним список замечаний.
+                Если замечаний по файлу нет, напиши под заголовком "Замечаний нет".
+                """
+        files = [
+            (path, text if path_priority(path) > PRIORITY_LOW else f"File: {path}\n[lockfile или сгенерированный файл, diff опущен]")
+            for path, text in files
+        ]
+        llm = self._llm(TASK_REVIEW_CHUNK)
+        full_budget = prompt_budget(llm.model_name, llm.max_tokens, system_prompt)
+        chunk_budget = full_budget - estimate_tokens(chunk_header) - estimate_tokens(chunk_footer)
+        chunks = self._chunk_diff(files, chunk_budget)
+        prompts = [
+            PromptPacker(full_budget).pack(
+                [PromptSection("header", chunk_header, PRIORITY_REQUIRED)]
+                + [PromptSection(path, text, PRIORITY_NORMAL) for path, text in chunk]
+                + [PromptSection("footer", chunk_footer, PRIORITY_REQUIRED)]
+            ).text
+            for chunk in chunks
+        ]
+
+        logger.info(f"Diff разбит на {len(chunks)} чанков, параллельность {self.max_concurrency}")
+        started = time.monotonic()
+        results = llm.get_responses(
+            prompts, system_prompt, max_concurrency=self.max_concurrency, return_exceptions=True
+        )
+        logger.info(f"Ревью чанков заняло {time.monotonic() - started:.1f} с")
+
+        findings: Dict[str, str] = {}
+        failed: Set[str] = set()
+        for i, (chunk, result) in enumerate(zip(chunks, results), start=1):
+            # Файл, разрезанный по хункам, может попасть в несколько чанков
+            paths = list(dict.fromkeys(path for path, _ in chunk))
+            if isinstance(result, Exception):
+                logger.error(f"Чанк {i} не проверен: {result}")
+                failed.update(paths)
+                for path in paths:
+                    findings[path] = f"Файл не был проверен из-за ошибки: {result}"
+                continue
+            for path, text in self._parse_file_findings(result, paths).items():
+                findings[path] = f"{findings[path]}\n{text}" if path in findings and path not in failed else text
+        return findings, failed
+
+    @traced("reviewer.reduce")
+    def _reduce_findings(
+        self, findings: Dict[str, str], issue_text: str, system_prompt: str, tests: Optional["Future[str]"] = None
+    ) -> str:
+        """Reduce-шаг: сводит замечания по файлам в один отчет с общим вердиктом."""
+        reduce_header = f"""
+                Ниже — замечания, найденные при проверке файлов одного Pull Request.
+                Сведи их в единый отчет без повторов.
+
+                ЗАДАЧА (ISSUE):
+                {issue_text}
+
+                ЗАМЕЧАНИЯ ПО ФАЙЛАМ:
+                """
+        reduce_footer = """
+                ВЕРНИ ОТЧЕТ В ФОРМАТЕ:
+                ### Отчет ревьюера
+                [Сводный анализ]
+
+                Вердикт: APPROVE или REQUEST_CHANGES
+                Если хотя бы один файл требует изменений или не был проверен, вердикт — REQUEST_CHANGES.
+                Если падают тесты, затронутые изменениями, вердикт — REQUEST_CHANGES.
+                Замечания к конкретным строкам перечисли в конце отчета, каждое с новой строки:
+                - `путь/к/файлу:номер строки в новой версии` — замечание
+                """
+        # Одинаковые замечания (например, общий ответ на весь чанк) отправляем один раз
+        grouped: Dict[str, List[str]] = {}
+        for path, text in findings.items():
+            grouped.setdefault(text, []).append(path)
+
+        sections = [PromptSection("header", reduce_header, PRIORITY_REQUIRED)]
+        for text, paths in grouped.items():
+            sections.append(PromptSection(", ".join(paths), f"#### {', '.join(paths)}\n{text}", PRIORITY_NORMAL))
+        sections += self._tests_sections(tests)
+        sections.append(PromptSection("footer", reduce_footer, PRIORITY_REQUIRED))
+
+        llm = self._llm(TASK_REDUCE)
+        full_budget = prompt_budget(llm.model_name, llm.max_tokens, system_prompt)
+        reduce_prompt = PromptPacker(full_budget).pack(sections).text
+        return llm.get_response(reduce_prompt, system_prompt)
+
+    def _review_chunked(
+        self, files: List[Tuple[str, str]], issue_text: str, system_prompt: str, tests: Optional["Future[str]"] = None
+    ) -> str:
+        """Map-reduce ревью: чанки diff проверяются параллельно, затем итоги сводятся в один отчет."""
+        findings, _ = self._map_files(files, issue_text, system_prompt)
+        return self._reduce_findings(findings, issue_text, system_prompt, tests)
+
+    @staticmethod
+    def _single_prompt_parts(issue_text: str) -> Tuple[str, str]:
+        """Заголовок и критерии промпта ревью всего diff за один запрос."""
+        header = f"""
                 Проверь Pull Request на соответствие задаче.
 
                 ЗАДАЧА (ISSUE):
                 {issue_text}
 
                 ИЗМЕНЕНИЯ (DIFF):
-                {diff}
-
+                """
+        footer = """
                 КРИТЕРИИ ПРОВЕРКИ:
                 1. Соответствует ли код задаче?
                 2. Нет ли в коде явных багов или проблем с безопасностью?
                 3. Соответствует ли код стилю Python (Type hints, логирование, именование)?
+                4. Проходят ли тесты, затронутые изменениями (если результаты приведены)?
 
                 ВЕРНИ ОТЧЕТ В ФОРМАТЕ:
                 ### Отчет ревьюера
-                [Твой анализ]
+                [Общий анализ]
+
+                #### <путь файла>
+                [Замечания к файлу или "Замечаний нет"; раздел для каждого файла diff.
+                Замечания к конкретным строкам — каждое с новой строки в формате:
+                - `путь/к/файлу:номер строки в новой версии` — замечание]
 
                 Вердикт: APPROVE или REQUEST_CHANGES
                 """
+        return header, footer
 
-            # Запрос к LLM
-            review_report = self.llm.get_response(prompt, system_prompt)
+    def _fits_single(self, files: List[Tuple[str, str]], issue_text: str, system_prompt: str) -> bool:
+        """Помещается ли diff в один запрос к модели уровня reduce."""
+        llm = self._llm(TASK_REDUCE)
+        header, footer = self._single_prompt_parts(issue_text)
+        budget = prompt_budget(llm.model_name, llm.max_tokens, system_prompt, header, footer)
+        return sum(estimate_tokens(text) for _, text in files) <= budget
 
-            self.gh_manager.post_comment_to_pr(pr_number, review_report)
-            
-            # Логика изменения статуса PR (Review Verdict)
-            if "REQUEST_CHANGES" in review_report:
-                logger.warning(f"PR #{pr_number} отклонен ревьюером.")
+    def _review_single(
+        self, files: List[Tuple[str, str]], issue_text: str, system_prompt: str, tests: Optional["Future[str]"] = None
+    ) -> str:
+        """Ревью всего diff одним запросом; его выполняет модель уровня reduce, она же выносит вердикт."""
+        header, footer = self._single_prompt_parts(issue_text)
+        diff = "\n".join(text for _, text in files)
+        prompt = self._pack_prompt(header, diff, footer, system_prompt, tests)
+        return self._llm(TASK_REDUCE).get_response(prompt, system_prompt)
+
+    def _review_incremental(
+        self,
+        pr_number: int,
+        pr_files: List[Dict[str, Optional[str]]],
+        issue_text: str,
+        system_prompt: str,
+        tests: Optional["Future[str]"] = None,
+    ) -> str:
+        """Ревью только файлов, чей blob SHA изменился с прошлого запуска; остальное берется из состояния.
+
+        Если переиспользовать нечего (первое ревью или изменились все файлы) и
+        diff помещается в окно модели, ревью идет одним запросом; map/reduce
+        остается для больших diff и повторных ревью с замечаниями из состояния.
+        """
+        state = self.state_store.load(pr_number)
+        cached = state.get("files", {})
+        current = {f["filename"]: f["sha"] for f in pr_files}
+
+        changed = self._file_diffs([
+            f for f in pr_files if not same_blob(cached.get(f["filename"], {}).get("sha"), f["sha"])
+        ])
+        if not changed and state.get("report") and set(cached) == set(current):
+            logger.info("Файлы PR не изменились с прошлого ревью, используем прошлый отчет.")
+            return state["report"]
+
+        logger.info(f"Инкрементальное ревью: {len(changed)} файлов на проверку, {len(current) - len(changed)} из кэша")
+        current_span().add("diff_tokens", sum(estimate_tokens(text) for _, text in changed))
+        changed_paths = {path for path, _ in changed}
+        findings = {path: cached[path]["findings"] for path in current if path not in changed_paths}
+        failed: Set[str] = set()
+        if not findings and self._fits_single(changed, issue_text, system_prompt):
+            current_span().set("mode", "single")
+            report = self._review_single(changed, issue_text, system_prompt, tests)
+            # В состояние попадают только разделы отчета по файлам; файлы без своего
+            # раздела не сохраняются и будут проверены заново при следующем ревью
+            ordered = self._parse_file_findings(report, list(current), strict=True)
+            if len(ordered) < len(current):
+                logger.warning(f"В отчете нет разделов для {len(current) - len(ordered)} файлов, они не кэшируются")
+        else:
+            if changed:
+                new_findings, failed = self._map_files(changed, issue_text, system_prompt)
+                findings.update(new_findings)
+            ordered = {path: findings[path] for path in current if path in findings}
+            report = self._reduce_findings(ordered, issue_text, system_prompt, tests)
+
+        self.state_store.save(pr_number, {
+            "files": {
+                path: {"sha": current[path], "findings": text}
+                for path, text in ordered.items()
+                if path not in failed
+            },
+            "report": report if not failed else None,
+            "published": state.get("published"),
+        })
+        return report
+
+    @staticmethod
+    def _format_file_diff(file: Dict[str, Optional[str]]) -> str:
+        patch = file.get("patch")
+        if patch is None:
+            return f"File: {file['filename']}\n[бинарный файл или diff недоступен]"
+        return f"File: {file['filename']}\n{patch}"
+
+    def _file_diffs(self, pr_files: List[Dict[str, Optional[str]]]) -> List[Tuple[str, str]]:
+        """Diff файлов для промпта: неизмененный контекст свернут, повторяющиеся блоки заменены ссылками."""
+        stats = CompressionStats()
+        dedupe = Deduplicator()
+        result = []
+        for f in pr_files:
+            raw = self._format_file_diff(f)
+            text = raw if self.diff_context < 0 else compress_diff(raw, self.diff_context)
+            text = dedupe(f["filename"], text)
+            stats.add(raw, text)
+            result.append((f["filename"], text))
+        if result:
+            stats.record("diff")
+        return result
+
+    @staticmethod
+    def _tests_sections(tests: Optional["Future[str]"]) -> List[PromptSection]:
+        """Результаты затронутых тестов для промпта; ждет завершения прогона, если он еще идет."""
+        if tests is None:
+            return []
+        return [PromptSection("tests", f"РЕЗУЛЬТАТЫ ТЕСТОВ:\n{tests.result()}\n", PRIORITY_HIGH)]
+
+    def _run_tests(self, pr_files: List[Dict[str, Optional[str]]], root: Path) -> str:
+        try:
+            with span("reviewer.tests"):
+                report = run_impacted_tests([f["filename"] for f in pr_files], root)
+        except Exception as e:
+            logger.error(f"Не удалось запустить тесты: {e}")
+            return f"Тесты запустить не удалось: {e}"
+        logger.info(f"Тесты: {report.count('passed')} passed, {report.count('failed')} failed за {report.seconds:.1f} с")
+        return report.format_for_prompt()
+
+    def _pack_prompt(
+        self, header: str, diff: str, footer: str, system_prompt: str, tests: Optional["Future[str]"] = None
+    ) -> str:
+        """Собирает промпт ревью, урезая сначала наименее важные файлы diff."""
+        llm = self._llm(TASK_REDUCE)
+        budget = prompt_budget(llm.model_name, llm.max_tokens, system_prompt)
+        sections = [PromptSection("header", header, PRIORITY_REQUIRED)]
+        for path, text in self._split_diff(diff):
+            sections.append(PromptSection(path, text, path_priority(path), summary=f"File: {path}\n[diff опущен из-за размера]"))
+        sections += self._tests_sections(tests)
+        sections.append(PromptSection("footer", footer, PRIORITY_REQUIRED))
+
+        packed = PromptPacker(budget).pack(sections)
+        if not packed.complete:
+            logger.warning(
+                f"Diff не помещается в окно модели целиком: обрезано {packed.truncated}, "
+                f"опущено {packed.summarized}"
+            )
+        return packed.text
+
+    @staticmethod
+    def _inline_comments(report: str, pr_files: List[Dict[str, Optional[str]]]) -> List[ReviewComment]:
+        """Inline-комментарии из строк отчета "- `path:line` — текст".
+
+        Номер строки переводится в позицию в diff файла; замечания к строкам
+        вне diff остаются только в сводном отчете.
+        """
+        positions = {f["filename"]: diff_positions(f.get("patch")) for f in pr_files}
+        comments = []
+        for match in _INLINE_FINDING_RE.finditer(report):
+            name = match.group("path")
+            path = name if name in positions else next((p for p in positions if p.endswith(f"/{name}")), None)
+            position = positions[path].get(int(match.group("line"))) if path else None
+            if position is not None:
+                comments.append(ReviewComment(path, position, match.group("body").strip()))
+        return comments
+
+    @traced("reviewer.publish")
+    def _publish(self, pr_number: int, pr: Dict, pr_files: List[Dict[str, Optional[str]]], report: str) -> str:
+        """Публикует отчет и возвращает вердикт.
+
+        Вердикт и замечания к строкам уходят одним ревью, затем сводный
+        комментарий бота обновляется на месте. Что уже опубликовано, запоминается
+        в состоянии ревью после каждого успешного шага: ревью с тем же вердиктом,
+        замечаниями и коммитом не повторяется, неизменный отчет не переписывается,
+        а упавший шаг повторится при следующем запуске.
+        """
+        verdict = parse_verdict(report)
+        if self.publish_mode == "comment":
+            self.gh_manager.post_comment_to_pr(pr_number, report)
+            return verdict
+
+        published = dict(self.state_store.load(pr_number).get("published") or {})
+        commit_id = (pr.get("head") or {}).get("sha")
+        comments = self._inline_comments(report, pr_files)
+        review_key = _digest(verdict, commit_id, [(c.path, c.position, c.body) for c in comments])
+        summary_key = _digest(report)
+
+        if published.get("review") != review_key:
+            link = f" Полный отчет: {published['url']}" if published.get("url") else ""
+            self.gh_manager.publish_review(pr_number, f"Вердикт: {verdict}.{link}", verdict, comments, commit_id)
+            published["review"] = review_key
+            self.state_store.update(pr_number, published=published)
+
+        if published.get("summary") != summary_key:
+            summary, _ = self.gh_manager.upsert_pr_comment(
+                pr_number, report, comment_id=published.get("comment_id")
+            )
+            published.update(summary=summary_key, comment_id=summary.get("id"), url=summary.get("html_url"))
+            self.state_store.update(pr_number, published=published)
+        else:
+            logger.info(f"Отчет по PR #{pr_number} не изменился, сводный комментарий не обновляется.")
+        return verdict
+
+    @traced("reviewer.run_review")
+    def run_review(
+        self, pr_number: int, issue_number: Optional[int] = None, workdir: Optional[Union[str, Path]] = None
+    ) -> str:
+        """Проводит ревью PR и публикует его; возвращает отчет.
+
+        workdir — рабочая копия с кодом PR (например, worktree на head SHA из
+        WorktreePool), в которой запускаются затронутые тесты; по умолчанию —
+        рабочая копия gh_manager.
+        """
+        current_span().set("pr", pr_number)
+        tests: Optional["Future[str]"] = None
+        # Свой поток на каждое ревью: воркер ведет несколько ревью параллельно,
+        # и тесты одного PR не должны стоять в очереди за тестами другого
+        tests_executor: Optional[ThreadPoolExecutor] = None
+        try:
+            logger.info(f"Начало ревью для PR #{pr_number}")
+
+            pr = self.gh_manager.get_pull_request_data(pr_number)
+            pr_files = self.gh_manager.get_pr_files(pr_number, **self.diff_filters)
+            # В sparse-checkout выгружаем только затронутые PR файлы (для тестов и контекста)
+            self.gh_manager.sparse_add([f["filename"] for f in pr_files if f["status"] != "removed"])
+
+            # Затронутые тесты идут в фоне, пока LLM проверяет diff
+            if self.run_tests:
+                tests_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"review-tests-{pr_number}")
+                tests = tests_executor.submit(
+                    self._run_tests, pr_files, Path(workdir) if workdir else self.gh_manager.local_path
+                )
+
+            target_issue_id = issue_number or self._extract_issue_number(pr.get("body") or "")
+            issue_text = "Описание задачи отсутствует."
+            if target_issue_id:
+                issue_data = self.gh_manager.get_issue(target_issue_id)
+                issue_text = f"Title: {issue_data['title']}\nBody: {issue_data['body']}"
+
+            system_prompt = "Ты — Senior Code Reviewer. Ты должен провести тщательный анализ кода."
+            if self.incremental:
+                with span("reviewer.review", mode="incremental"):
+                    review_report = self._review_incremental(pr_number, pr_files, issue_text, system_prompt, tests)
             else:
+                file_diffs = self._file_diffs(pr_files)
+                current_span().add("diff_tokens", sum(estimate_tokens(text) for _, text in file_diffs))
+                if not self._fits_single(file_diffs, issue_text, system_prompt):
+                    with span("reviewer.review", mode="chunked"):
+                        review_report = self._review_chunked(file_diffs, issue_text, system_prompt, tests)
+                else:
+                    with span("reviewer.review", mode="single"):
+                        review_report = self._review_single(file_diffs, issue_text, system_prompt, tests)
+
+            verdict = self._publish(pr_number, pr, pr_files, review_report)
+
+            if verdict == "REQUEST_CHANGES":
+                logger.warning(f"PR #{pr_number} отклонен ревьюером.")
+            elif verdict == "APPROVE":
                 logger.info(f"PR #{pr_number} одобрен.")
+            else:
+                logger.warning(f"В отчете по PR #{pr_number} нет вердикта, ревью опубликовано как комментарий.")
+            logger.info(f"GitHub API: {self.gh_manager.api_stats()}")
+            return review_report
 
         except Exception as e:
             logger.error(f"Ошибка при ревью PR #{pr_number}: {e}")
             raise
+        finally:
+            # Отчет мог обойтись без результатов тестов (например, взят из состояния), но workdir
+            # вызывающий код переиспользует сразу после возврата: прогон не должен его пережить
+            if tests_executor is not None:
+                tests_executor.shutdown(wait=True)
 
 def main():
     parser = argparse.ArgumentParser(description="AI Reviewer Agent")
     parser.add_argument("--pr-number", type=int, required=True, help="Номер Pull Request")
     parser.add_argument("--issue-number", type=int, help="Номер Issue (опционально)")
-    
+
     args = parser.parse_args()
-    
-    agent = ReviewerAgent()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+
+    agent = ReviewerAgent(get_config())
     agent.run_review(args.pr_number, args.issue_number)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,274 @@
+import ast
+import hashlib
+import io
+import logging
+import re
+import tokenize
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.tokens import estimate_tokens
+from core.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# Уровни детализации файла в промпте, от самого подробного к самому краткому
+FULL = "full"
+COMPACT = "compact"
+OUTLINE = "outline"
+SIGNATURES = "signatures"
+LEVELS = (FULL, COMPACT, OUTLINE, SIGNATURES)
+
+LEVEL_LABELS = {
+    FULL: "",
+    COMPACT: " (без комментариев и docstring)",
+    OUTLINE: " (сигнатуры и docstring)",
+    SIGNATURES: " (только сигнатуры)",
+}
+
+_BLANK_RUNS = re.compile(r"\n\s*\n(\s*\n)+")
+
+
+def _collapse_blank_lines(text: str) -> str:
+    text = "\n".join(line.rstrip() for line in text.splitlines())
+    return _BLANK_RUNS.sub("\n\n", text).strip("\n") + "\n"
+
+
+def _docstring_node(node: ast.AST) -> Optional[ast.Expr]:
+    body = getattr(node, "body", None)
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        return body[0]
+    return None
+
+
+def _compact_python(text: str) -> str:
+    """Код без комментариев, docstring и пустых строк; логика файла сохраняется построчно."""
+    tree = ast.parse(text)
+    lines = text.splitlines()
+    replaced: Dict[int, Optional[str]] = {}
+
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        doc = _docstring_node(node)
+        if doc is None or doc.end_lineno is None or (not isinstance(node, ast.Module) and doc.lineno == node.lineno):
+            continue
+        # Если docstring — все тело, на его месте остается "...", чтобы блок не выглядел оборванным
+        placeholder = " " * doc.col_offset + "..." if len(node.body) == 1 and not isinstance(node, ast.Module) else None
+        for number in range(doc.lineno, doc.end_lineno + 1):
+            replaced[number] = None
+        replaced[doc.lineno] = placeholder
+
+    for token in tokenize.generate_tokens(io.StringIO(text).readline):
+        if token.type != tokenize.COMMENT:
+            continue
+        number, col = token.start
+        if number in replaced:
+            continue
+        before = lines[number - 1][:col].rstrip()
+        replaced[number] = before or None
+
+    result = []
+    for number, line in enumerate(lines, start=1):
+        kept = replaced[number] if number in replaced else line
+        if kept is not None and kept.strip():
+            result.append(kept.rstrip())
+    return "\n".join(result) + "\n"
+
+
+def _outline_python(text: str, docstrings: bool) -> str:
+    """Классы, функции и поля классов с сигнатурами (и docstring) без тел."""
+    tree = ast.parse(text)
+    lines: List[str] = []
+
+    def add_doc(node: ast.AST, indent: str) -> bool:
+        doc = ast.get_docstring(node) if docstrings else None
+        if not doc:
+            return False
+        doc_lines = doc.strip().splitlines()
+        lines.append(f'{indent}"""{doc_lines[0]}' + ('"""' if len(doc_lines) == 1 else ""))
+        if len(doc_lines) > 1:
+            lines.extend(f"{indent}{line}".rstrip() for line in doc_lines[1:])
+            lines.append(f'{indent}"""')
+        return True
+
+    def visit(body: Sequence[ast.stmt], indent: str, in_class: bool) -> int:
+        emitted = 0
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                lines.extend(f"{indent}@{ast.unparse(d)}" for d in node.decorator_list)
+                if isinstance(node, ast.ClassDef):
+                    bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+                    lines.append(f"{indent}class {node.name}({', '.join(bases)}):" if bases else f"{indent}class {node.name}:")
+                    has_doc = add_doc(node, indent + "    ")
+                    if not visit(node.body, indent + "    ", True) and not has_doc:
+                        lines.append(f"{indent}    ...")
+                else:
+                    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+                    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+                    lines.append(f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}:")
+                    if not add_doc(node, indent + "    "):
+                        lines[-1] += " ..."
+                emitted += 1
+            elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name) and (in_class or not indent):
+                # Поля dataclass и аннотированные атрибуты — часть интерфейса
+                lines.append(f"{indent}{node.target.id}: {ast.unparse(node.annotation)}")
+                emitted += 1
+            elif isinstance(node, ast.Assign) and not indent:
+                names = [t.id for t in node.targets if isinstance(t, ast.Name) and t.id.isupper()]
+                if names and len(names) == len(node.targets):
+                    lines.append(f"{' = '.join(names)} = ...")
+                    emitted += 1
+        return emitted
+
+    add_doc(tree, "")
+    visit(tree.body, "", False)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def render(path: str, text: str, level: str) -> Optional[str]:
+    """Текст файла на уровне детализации level; None, если для файла этот уровень недоступен."""
+    if level == FULL:
+        return text
+    if path.endswith(".py"):
+        try:
+            if level == COMPACT:
+                return _compact_python(text)
+            return _outline_python(text, docstrings=level == OUTLINE) or None
+        except (SyntaxError, ValueError, tokenize.TokenError) as e:
+            logger.debug(f"{path} не разобран для сжатия: {e}")
+            return _collapse_blank_lines(text) if level == COMPACT else None
+    if level == COMPACT:
+        return _collapse_blank_lines(text)
+    if path.endswith(".md"):
+        headings = [line for line in text.splitlines() if line.startswith("#")]
+        return "\n".join(headings) + "\n" if headings else None
+    return None
+
+
+def compress_diff(patch: str, context: int = 1) -> str:
+    """Сворачивает неизмененные строки контекста в хунках, оставляя по context строк у каждого изменения.
+
+    Заголовки хунков сохраняются, так что номера строк по-прежнему вычислимы:
+    свернутый участок заменяется строкой с числом пропущенных строк.
+    """
+    out: List[str] = []
+    run: List[str] = []
+    seen_change = False
+
+    def flush(trailing: bool) -> None:
+        nonlocal run
+        keep_head = context if seen_change else 0
+        keep_tail = 0 if trailing else context
+        if len(run) > keep_head + keep_tail + 1:
+            skipped = len(run) - keep_head - keep_tail
+            out.extend(run[:keep_head])
+            out.append(f" ... ({skipped} строк без изменений)")
+            out.extend(run[len(run) - keep_tail:] if keep_tail else [])
+        else:
+            out.extend(run)
+        run = []
+
+    in_hunk = False
+    for line in patch.splitlines():
+        if line.startswith(("@@", "diff --git ")):
+            if in_hunk:
+                flush(trailing=True)
+            in_hunk, seen_change = line.startswith("@@"), False
+            out.append(line)
+        elif not in_hunk:
+            if not line.startswith("index "):
+                out.append(line)
+        elif line.startswith(" ") or line == "":
+            run.append(line)
+        elif line.startswith("\\"):
+            continue
+        else:
+            flush(trailing=False)
+            seen_change = True
+            out.append(line)
+    if in_hunk:
+        flush(trailing=True)
+    return "\n".join(out)
+
+
+_BLOCK_START = re.compile(r"^(@@ |def |async def |class |@|File: )")
+
+
+class Deduplicator:
+    """Заменяет блоки, уже встречавшиеся в промпте, ссылкой на первое вхождение.
+
+    Блоки — участки между пустыми строками, заголовками хунков и определениями
+    верхнего уровня; учитываются блоки не короче min_lines строк. Строка
+    заголовка хунка в ключ не входит: одна и та же правка в разных файлах
+    отличается только номерами строк.
+    """
+
+    def __init__(self, min_lines: int = 4):
+        self.min_lines = min_lines
+        self._seen: Dict[str, str] = {}
+
+    def _blocks(self, text: str) -> List[Tuple[List[str], int, Optional[str]]]:
+        """Блоки текста: (строки, число значимых строк, ключ или None для коротких блоков)."""
+        blocks: List[List[str]] = [[]]
+        for line in text.splitlines():
+            if not line.strip() or _BLOCK_START.match(line):
+                blocks.append([])
+            blocks[-1].append(line)
+        result: List[Tuple[List[str], int, Optional[str]]] = []
+        for block in blocks:
+            body = [line.rstrip() for line in block if line.strip() and not line.startswith("@@")]
+            key = hashlib.sha1("\n".join(body).encode("utf-8")).hexdigest() if len(body) >= self.min_lines else None
+            result.append((block, len(body), key))
+        return result
+
+    def register(self, name: str, text: str) -> None:
+        """Запоминает блоки текста, попавшего в промпт."""
+        for _, _, key in self._blocks(text):
+            if key:
+                self._seen.setdefault(key, name)
+
+    def __call__(self, name: str, text: str, register: bool = True) -> str:
+        """Текст с замененными повторами; register=False — только примерить, не запоминая блоки."""
+        out: List[str] = []
+        for block, size, key in self._blocks(text):
+            first = self._seen.get(key, name) if key else name
+            if first == name:
+                out.extend(block)
+            else:
+                kept = [line for line in block[:1] if line.startswith(("@@", "File: "))]
+                out.extend(kept + [f"[повтор: {size} строк, как в {first}]"])
+        if register:
+            self.register(name, text)
+        return "\n".join(out) + ("\n" if text.endswith("\n") else "")
+
+
+@dataclass
+class CompressionStats:
+    """Сколько токенов было до сжатия и сколько ушло в промпт."""
+    raw_tokens: int = 0
+    compressed_tokens: int = 0
+    levels: Counter = field(default_factory=Counter)
+
+    def add(self, raw: str, compressed: str, level: Optional[str] = None) -> None:
+        self.raw_tokens += estimate_tokens(raw)
+        self.compressed_tokens += estimate_tokens(compressed)
+        if level:
+            self.levels[level] += 1
+
+    @property
+    def ratio(self) -> float:
+        return self.raw_tokens / self.compressed_tokens if self.compressed_tokens else 1.0
+
+    def record(self, what: str) -> None:
+        """Пишет итог в лог и в счетчики текущего span."""
+        trace = current_span()
+        trace.add("tokens_raw", self.raw_tokens)
+        trace.add("tokens_compressed", self.compressed_tokens)
+        levels = ", ".join(f"{level}: {self.levels[level]}" for level in LEVELS if self.levels[level])
+        logger.info(
+            f"Сжатие {what}: ~{self.raw_tokens} -> ~{self.compressed_tokens} токенов (x{self.ratio:.2f})"
+            + (f"; уровни: {levels}" if levels else "")
+        )
@@ -1,38 +1,54 @@
 import os
 import logging
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
-from dotenv import load_dotenv
+from typing import Dict, Optional, Tuple
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
-load_dotenv(dotenv_path=BASE_DIR / ".env")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 logger = logging.getLogger(__name__)
 
+_config_lock = threading.Lock()
+_config: Optional["AppConfig"] = None
+
 @dataclass(frozen=True)
 class AppConfig:
     github_token: str
     llm_api_key: str
     repo_name: str
     log_level: str = "INFO"
+    # Бэкенд LLM (yandex | openai) и модели по типам промптов: {"review-chunk": "yandexgpt-lite"}
+    llm_backend: str = "yandex"
+    model_tiers: Dict[str, str] = field(default_factory=dict)
+    # Типы промптов с хеджированными запросами и порог до накопления статистики, сек.
+    hedge_tasks: Tuple[str, ...] = ()
+    hedge_after: Optional[float] = None
 
     @classmethod
     def load(cls) -> "AppConfig":
         logger.info("Загрузка config")
+        # dotenv импортируется здесь, чтобы импорт модуля не имел побочных эффектов
+        from dotenv import load_dotenv
+
+        load_dotenv(dotenv_path=BASE_DIR / ".env")
 
         github_token = os.getenv("GITHUB_TOKEN")
-        llm_api_key = os.getenv("YANDEX_API_KEY")
+        llm_backend = os.getenv("LLM_BACKEND", "yandex").lower()
+        # Локальному OpenAI-совместимому серверу ключ не нужен
+        llm_api_key = os.getenv("YANDEX_API_KEY") if llm_backend == "yandex" else os.getenv("OPENAI_API_KEY", "")
         repo_name = os.getenv("REPO_NAME")
         log_level = os.getenv("LOG_LEVEL", "INFO")
+        # LLM_MODEL_TIERS="review-chunk=yandexgpt-lite,reduce=yandexgpt"
+        model_tiers = dict(
+            item.split("=", 1) for item in os.getenv("LLM_MODEL_TIERS", "").replace(" ", "").split(",") if "=" in item
+        )
+        hedge_tasks = tuple(t for t in os.getenv("LLM_HEDGE", "").replace(" ", "").split(",") if t)
+        hedge_after = os.getenv("LLM_HEDGE_AFTER")
 
         missing_vars = []
         if not github_token: missing_vars.append("GITHUB_TOKEN")
-        if not llm_api_key: missing_vars.append("YANDEX_API_KEY")
+        if llm_backend == "yandex" and not llm_api_key: missing_vars.append("YANDEX_API_KEY")
         if not repo_name: missing_vars.append("REPO_NAME")
 
         if missing_vars:
@@ -46,11 +62,29 @@ class AppConfig:
             github_token=github_token, 
             llm_api_key=llm_api_key,   
             repo_name=repo_name,       
-            log_level=log_level
+            log_level=log_level,
+            llm_backend=llm_backend,
+            model_tiers=model_tiers,
+            hedge_tasks=hedge_tasks,
+            hedge_after=float(hedge_after) if hedge_after else None,
         )
 
-try:
-    config = AppConfig.load()
-except ValueError as e:
-    logger.critical(f"Ошибка загрузки config {e}")
-    raise
\ No newline at end of file
+
+def get_config() -> AppConfig:
+    """Загружает конфигурацию при первом обращении и дальше возвращает тот же объект."""
+    global _config
+    with _config_lock:
+        if _config is None:
+            try:
+                _config = AppConfig.load()
+            except ValueError as e:
+                logger.critical(f"Ошибка загрузки config {e}")
+                raise
+        return _config
+
+
+def __getattr__(name: str):
+    # Совместимость с `from core.config import config`: загрузка при первом обращении
+    if name == "config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
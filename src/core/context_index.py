@@ -0,0 +1,330 @@
+import ast
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.compression import COMPACT, FULL, LEVEL_LABELS, OUTLINE, SIGNATURES, CompressionStats, Deduplicator, render
+from core.paths import agent_cache_dir
+from core.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+DEFAULT_EXCLUDED_DIRS = {".git", "venv", ".venv", "__pycache__", "node_modules", ".idea"}
+
+_WORD_RE = re.compile(r"[A-Za-zА-Яа-яЁё_][A-Za-zА-Яа-яЁё0-9_]*")
+_CAMEL_RE = re.compile(r"[A-ZА-ЯЁ]?[a-zа-яё0-9]+|[A-ZА-ЯЁ]+(?![a-zа-яё])")
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на термы: слова, части snake_case и camelCase в нижнем регистре."""
+    terms = []
+    for word in _WORD_RE.findall(text):
+        lowered = word.lower()
+        terms.append(lowered)
+        parts = [p.lower() for chunk in word.split("_") for p in _CAMEL_RE.findall(chunk)]
+        if len(parts) > 1:
+            terms.extend(p for p in parts if len(p) > 1)
+    return terms
+
+
+def git_blob_sha(data: bytes) -> str:
+    """SHA блоба в том же формате, что и `git hash-object`."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def extract_symbols(path: str, text: str) -> List[str]:
+    """Сигнатуры модуля: классы, функции и методы для .py, заголовки для .md."""
+    if path.endswith(".md"):
+        return [line.strip() for line in text.splitlines() if line.startswith("#")][:50]
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+
+    symbols = []
+    doc = ast.get_docstring(tree)
+    if doc:
+        symbols.append(f'"""{doc.strip().splitlines()[0]}"""')
+
+    def signature(node, indent: str) -> str:
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+        return f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append(signature(node, ""))
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(b) for b in node.bases)
+            symbols.append(f"class {node.name}({bases}):" if bases else f"class {node.name}:")
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append(signature(item, "    "))
+    return symbols
+
+
+@dataclass
+class IndexedFile:
+    path: str
+    mtime: float
+    size: int
+    blob_sha: str
+    tokens: int
+    symbols: List[str] = field(default_factory=list)
+    terms: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def length(self) -> int:
+        return sum(self.terms.values())
+
+
+class ContextIndex:
+    """Персистентный индекс файлов проекта для сборки контекста под задачу.
+
+    Файл перечитывается только если изменились mtime/размер, а при совпадении
+    blob SHA сохраненные символы и термы переиспользуются. Файлы ранжируются по
+    BM25 относительно текста задачи и укладываются в бюджет токенов: первые
+    full_files самых релевантных — целиком, следующие — на самом подробном
+    уровне сжатия, который помещается (без комментариев, сигнатуры с docstring,
+    только сигнатуры), остальные — сохраненными сигнатурами.
+
+    В sparse-checkout часть файлов отсутствует на диске. Если задан
+    tracked_blobs (путь -> blob SHA из git), такие файлы остаются в индексе:
+    по сохраненным данным при совпадении SHA или по одному пути, — и их
+    можно ранжировать до выгрузки (см. candidates()).
+    """
+
+    def __init__(
+        self,
+        root: str = ".",
+        extensions: Iterable[str] = (".py", ".md"),
+        excluded_dirs: Optional[Iterable[str]] = None,
+        index_path: Optional[Path] = None,
+        full_files: Optional[int] = None,
+    ):
+        self.root = Path(root).resolve()
+        self.extensions = tuple(extensions)
+        self.excluded_dirs = set(excluded_dirs or DEFAULT_EXCLUDED_DIRS)
+        if index_path is None:
+            digest = hashlib.sha1(str(self.root).encode("utf-8")).hexdigest()[:16]
+            index_path = agent_cache_dir("context_index") / f"{digest}.json"
+        self.index_path = Path(index_path)
+        self.files: Dict[str, IndexedFile] = {}
+        self.tracked_blobs: Optional[Dict[str, str]] = None
+        # Сколько самых релевантных файлов отдавать без сжатия: их LLM правит фрагментами search/replace
+        self.full_files = full_files if full_files is not None else int(os.environ.get("CONTEXT_FULL_FILES", "3"))
+        # Сжатые представления по (blob SHA, уровень): индекс переиспользуется между задачами
+        self._rendered: Dict[Tuple[str, str], Optional[str]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.index_path.exists():
+            return
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if data.get("version") != INDEX_VERSION:
+                return
+            self.files = {p: IndexedFile(**entry) for p, entry in data["files"].items()}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Индекс контекста поврежден, строим заново: {e}")
+            self.files = {}
+
+    def save(self) -> None:
+        data = {"version": INDEX_VERSION, "files": {p: asdict(f) for p, f in self.files.items()}}
+        tmp_path = self.index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.index_path)
+
+    def _wanted(self, rel_path: str) -> bool:
+        parts = Path(rel_path).parts
+        return rel_path.endswith(self.extensions) and not self.excluded_dirs.intersection(parts[:-1])
+
+    def _iter_paths(self) -> Iterable[str]:
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d not in self.excluded_dirs]
+            for name in files:
+                if name.endswith(self.extensions):
+                    yield os.path.relpath(os.path.join(root, name), self.root)
+
+    def refresh(self) -> Dict[str, int]:
+        """Синхронизирует индекс с диском, перечитывая только измененные файлы."""
+        stats = {"unchanged": 0, "updated": 0, "removed": 0}
+        seen = set()
+        for rel_path in self._iter_paths():
+            seen.add(rel_path)
+            try:
+                st = os.stat(self.root / rel_path)
+            except OSError:
+                continue
+            cached = self.files.get(rel_path)
+            if cached and cached.size < 0:
+                # заглушка файла, который раньше не был выгружен
+                cached = None
+            if cached and cached.mtime == st.st_mtime and cached.size == st.st_size:
+                stats["unchanged"] += 1
+                continue
+
+            try:
+                data = (self.root / rel_path).read_bytes()
+            except OSError:
+                continue
+            blob_sha = git_blob_sha(data)
+            if cached and cached.blob_sha == blob_sha:
+                cached.mtime, cached.size = st.st_mtime, st.st_size
+                stats["unchanged"] += 1
+                continue
+
+            text = data.decode("utf-8", errors="replace")
+            self.files[rel_path] = IndexedFile(
+                path=rel_path,
+                mtime=st.st_mtime,
+                size=st.st_size,
+                blob_sha=blob_sha,
+                tokens=estimate_tokens(text),
+                symbols=extract_symbols(rel_path, text),
+                terms=dict(Counter(tokenize(rel_path) * 3 + tokenize(text))),
+            )
+            stats["updated"] += 1
+
+        for rel_path, blob_sha in (self.tracked_blobs or {}).items():
+            if rel_path in seen or not self._wanted(rel_path):
+                continue
+            seen.add(rel_path)
+            cached = self.files.get(rel_path)
+            if cached and cached.blob_sha == blob_sha:
+                stats["unchanged"] += 1
+                continue
+            # содержимого нет на диске: индексируем только путь (size=-1 — заглушка)
+            self.files[rel_path] = IndexedFile(
+                path=rel_path,
+                mtime=0.0,
+                size=-1,
+                blob_sha=blob_sha,
+                tokens=0,
+                terms=dict(Counter(tokenize(rel_path) * 3)),
+            )
+            stats["updated"] += 1
+
+        for rel_path in set(self.files) - seen:
+            del self.files[rel_path]
+            stats["removed"] += 1
+
+        self.save()
+        logger.info(
+            f"Индекс контекста: {stats['updated']} обновлено, "
+            f"{stats['unchanged']} без изменений, {stats['removed']} удалено"
+        )
+        return stats
+
+    def search(self, query: str, k1: float = 1.5, b: float = 0.75) -> List[Tuple[str, float]]:
+        """BM25-ранжирование файлов по тексту запроса (по убыванию релевантности)."""
+        query_terms = set(tokenize(query))
+        if not self.files or not query_terms:
+            return []
+
+        n_docs = len(self.files)
+        avg_len = sum(f.length for f in self.files.values()) / n_docs or 1
+        doc_freq = Counter()
+        for f in self.files.values():
+            doc_freq.update(t for t in query_terms if t in f.terms)
+
+        scores = []
+        for f in self.files.values():
+            score = 0.0
+            for term in query_terms:
+                tf = f.terms.get(term)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * f.length / avg_len))
+            if score > 0:
+                scores.append((f.path, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+    def candidates(self, query: str, limit: int) -> List[str]:
+        """Самые релевантные запросу пути, в том числе еще не выгруженные на диск."""
+        self.refresh()
+        return [path for path, _ in self.search(query)[:limit]]
+
+    def build_context(self, query: str, token_budget: int) -> str:
+        """Собирает контекст под задачу в пределах token_budget."""
+        self.refresh()
+        live = {f.blob_sha for f in self.files.values()}
+        self._rendered = {key: text for key, text in self._rendered.items() if key[0] in live}
+        ranked = [path for path, _ in self.search(query)]
+        rest = sorted(set(self.files) - set(ranked))
+
+        parts: List[str] = []
+        remaining = token_budget
+        summarized: List[str] = []
+        stats = CompressionStats()
+        dedupe = Deduplicator()
+        for rank, path in enumerate(ranked):
+            entry = self.files[path]
+            try:
+                text = (self.root / path).read_text(encoding="utf-8") if entry.size >= 0 else None
+            except (OSError, UnicodeDecodeError):
+                text = None
+            if text is None:
+                summarized.append(path)
+                continue
+            levels = (FULL, COMPACT, OUTLINE, SIGNATURES) if rank < self.full_files else (COMPACT, OUTLINE, SIGNATURES)
+            for level in levels:
+                rendered = self._render(entry, text, level)
+                if rendered is None:
+                    continue
+                # Файл без комментариев и docstring на уровне compact не меняется — метка не нужна
+                label = "" if rendered == text else LEVEL_LABELS[level]
+                block = f"FILE: {path}{label}\n{dedupe(path, rendered, register=False)}\n---\n"
+                cost = estimate_tokens(block)
+                if cost <= remaining:
+                    dedupe.register(path, rendered)
+                    parts.append(block)
+                    remaining -= cost
+                    stats.add(f"FILE: {path}\n{text}\n---\n", block, level)
+                    break
+            else:
+                summarized.append(path)
+
+        omitted = []
+        for path in summarized + rest:
+            symbols = self.files[path].symbols
+            block = f"FILE: {path}{LEVEL_LABELS[SIGNATURES]}\n" + "\n".join(symbols) + "\n---\n"
+            cost = estimate_tokens(block)
+            if symbols and cost <= remaining:
+                parts.append(block)
+                remaining -= cost
+                stats.raw_tokens += self.files[path].tokens
+                stats.compressed_tokens += cost
+                stats.levels[SIGNATURES] += 1
+            else:
+                omitted.append(path)
+
+        if omitted:
+            listing = "Другие файлы проекта: " + ", ".join(omitted)
+            if estimate_tokens(listing) <= remaining:
+                parts.append(listing)
+
+        logger.info(
+            f"Контекст: {len(self.files)} файлов в индексе, "
+            f"использовано ~{token_budget - remaining} из {token_budget} токенов"
+        )
+        stats.record("контекста")
+        return "\n".join(parts)
+
+    def _render(self, entry: IndexedFile, text: str, level: str) -> Optional[str]:
+        if level == FULL:
+            return text
+        key = (entry.blob_sha, level)
+        if key not in self._rendered:
+            self._rendered[key] = render(entry.path, text, level)
+        return self._rendered[key]
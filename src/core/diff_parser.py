@@ -0,0 +1,162 @@
+import fnmatch
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+_DIFF_GIT_RE = re.compile(r"^diff --git a/(.+?) b/(.+)$")
+_INDEX_RE = re.compile(r"^index ([0-9a-f]+)\.\.([0-9a-f]+)")
+_HUNK_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
+
+@dataclass
+class DiffHunk:
+    header: str
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join([self.header] + self.lines)
+
+
+@dataclass
+class DiffFile:
+    path: str
+    old_path: Optional[str] = None
+    status: str = "modified"
+    old_sha: Optional[str] = None
+    # Сокращенный blob SHA новой версии из строки `index old..new`. Без изменения содержимого
+    # (переименование без правок, смена режима) строки index нет и SHA остается None
+    new_sha: Optional[str] = None
+    is_binary: bool = False
+    truncated: bool = False
+    hunks: List[DiffHunk] = field(default_factory=list)
+
+    @property
+    def patch(self) -> Optional[str]:
+        """Текст хунков как в поле `patch` GitHub API; None для бинарных файлов."""
+        if self.is_binary:
+            return None
+        return "\n".join(h.text for h in self.hunks)
+
+
+def path_matches(path: str, patterns: Optional[Sequence[str]]) -> bool:
+    return bool(patterns) and any(fnmatch.fnmatch(path, p) for p in patterns)
+
+
+def iter_diff_files(
+    lines: Iterable[str],
+    include: Optional[Sequence[str]] = None,
+    exclude: Optional[Sequence[str]] = None,
+    max_file_bytes: Optional[int] = None,
+    max_total_bytes: Optional[int] = None,
+) -> Iterator[DiffFile]:
+    """Потоково разбирает unified diff (формат `git diff`) на файлы и хунки.
+
+    Файлы отдаются по одному по мере разбора. Отфильтрованные по include/exclude
+    файлы пропускаются без накопления строк. При превышении max_file_bytes
+    оставшиеся строки файла отбрасываются (truncated=True), а после
+    max_total_bytes разбор останавливается.
+    """
+    current: Optional[DiffFile] = None
+    skipping = False
+    file_bytes = 0
+    total_bytes = 0
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.rstrip("\r\n")
+
+        match = _DIFF_GIT_RE.match(line)
+        if match:
+            if current is not None:
+                yield current
+            old_path, new_path = match.group(1), match.group(2)
+            skipping = (include and not path_matches(new_path, include)) or path_matches(new_path, exclude)
+            current = None if skipping else DiffFile(path=new_path, old_path=old_path if old_path != new_path else None)
+            file_bytes = 0
+            continue
+
+        if current is None or skipping:
+            continue
+
+        if not current.hunks:
+            if line.startswith("new file mode"):
+                current.status = "added"
+                continue
+            if line.startswith("deleted file mode"):
+                current.status = "removed"
+                continue
+            if line.startswith("rename from") or line.startswith("rename to"):
+                current.status = "renamed"
+                continue
+            index_match = _INDEX_RE.match(line)
+            if index_match:
+                current.old_sha, current.new_sha = index_match.group(1), index_match.group(2)
+                continue
+            if line.startswith("Binary files") or line.startswith("GIT binary patch"):
+                current.is_binary = True
+                continue
+            if line.startswith("--- ") or line.startswith("+++ "):
+                continue
+
+        if current.truncated:
+            continue
+
+        size = len(line) + 1
+        if max_total_bytes is not None and total_bytes + size > max_total_bytes:
+            current.truncated = True
+            yield current
+            return
+        if max_file_bytes is not None and file_bytes + size > max_file_bytes:
+            current.truncated = True
+            continue
+
+        if line.startswith("@@"):
+            current.hunks.append(DiffHunk(header=line))
+        elif current.hunks:
+            current.hunks[-1].lines.append(line)
+        else:
+            continue
+        file_bytes += size
+        total_bytes += size
+
+    if current is not None:
+        yield current
+
+
+def render_diff_file(diff_file: DiffFile) -> str:
+    """Текстовое представление файла diff для промптов."""
+    if diff_file.is_binary:
+        return f"File: {diff_file.path}\n[бинарный файл]"
+    text = f"File: {diff_file.path}\n{diff_file.patch}"
+    if diff_file.truncated:
+        text += "\n[... diff файла обрезан по размеру ...]"
+    return text
+
+
+def diff_positions(patch: Optional[str]) -> Dict[int, int]:
+    """Номер строки новой версии файла -> позиция в patch для inline-комментария ревью.
+
+    Позиция считается как в GitHub API: 1 — строка сразу после первого
+    заголовка хунка, дальше счет идет подряд через все хунки файла (следующие
+    заголовки @@ тоже занимают позицию). Удаленных строк в новой версии нет,
+    поэтому они в результат не попадают.
+    """
+    positions: Dict[int, int] = {}
+    position = 0
+    line_no: Optional[int] = None
+    for line in (patch or "").split("\n"):
+        match = _HUNK_RE.match(line)
+        if match:
+            if line_no is not None:
+                position += 1
+            line_no = int(match.group(1))
+            continue
+        if line_no is None:
+            continue
+        position += 1
+        if line.startswith((" ", "+")):
+            positions[line_no] = position
+            line_no += 1
+    return positions
@@ -1,16 +1,77 @@
+import base64
+import json
 import os
+import copy
 import logging
-from typing import Optional, Dict, Tuple, Union
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional, Dict, Iterator, List, Sequence, Tuple, Union
 from pathlib import Path
 
+import requests
 from git import Repo, GitCommandError, InvalidGitRepositoryError
 from github import Github, GithubException, Auth
 from github.Repository import Repository
 from github.PullRequest import PullRequest
 
-# Настройка логирования
+from core.diff_parser import DiffFile, iter_diff_files, render_diff_file
+from core.github_http import GitHubHTTP
+from core.tracing import current_span, traced
+
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+# Сколько issue/PR запрашивать одним GraphQL-запросом (алиасы в одном запросе)
+GRAPHQL_BATCH = 50
+
+_ISSUE_OR_PR_FIELDS = """
+    __typename
+    ... on Issue { number title body url state }
+    ... on PullRequest { number title body url state headRefName headRefOid baseRefName }
+"""
+
+# Скрытая метка сводного комментария ревьюера: по ней комментарий находится и обновляется
+SUMMARY_MARKER = "<!-- coding-agent:review-summary -->"
+
+
+def git_auth_env(token: str) -> Dict[str, str]:
+    """Окружение git-команды с токеном в заголовке Authorization для сервера GitHub.
+
+    Токен не попадает ни в URL origin и .git/config, общие для всех worktree,
+    ни в аргументы команды, которые GitPython выводит в тексте ошибок.
+    """
+    server = os.environ.get("GITHUB_SERVER_URL", "https://github.com").rstrip("/")
+    credentials = base64.b64encode(f"x-access-token:{token}".encode("utf-8")).decode("ascii")
+    return {
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": f"http.{server}/.extraheader",
+        "GIT_CONFIG_VALUE_0": f"AUTHORIZATION: basic {credentials}",
+    }
+
+
+@dataclass
+class ReviewComment:
+    """Inline-комментарий ревью: position — позиция строки в diff файла (см. diff_positions)."""
+    path: str
+    position: int
+    body: str
+
+
+def _from_graphql(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Приводит узел GraphQL к виду ответа REST API (поля, которые читают агенты)."""
+    item = {
+        "number": node["number"],
+        "title": node["title"],
+        "body": node.get("body") or "",
+        "html_url": node["url"],
+        "state": node["state"].lower(),
+    }
+    if node["__typename"] == "PullRequest":
+        item["head"] = {"ref": node["headRefName"], "sha": node["headRefOid"]}
+        item["base"] = {"ref": node["baseRefName"]}
+        item["pull_request"] = {"html_url": node["url"]}
+    return item
 
 
 class GitHubManager:
@@ -19,18 +80,34 @@ class GitHubManager:
         self.repo_name = repo_name
         self.local_path = Path(local_path).resolve()
 
+        started = time.perf_counter()
+        self.http = GitHubHTTP(token)
+        # Данные issue/PR, полученные пакетно (batch-режим): ("issue" | "pull", номер) -> JSON
+        self._prefetched: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._prefetched_lock = threading.Lock()
+        # Загрузки веток origin обновляют общие ссылки refs/agent/base/*
+        self._fetch_lock = threading.Lock()
+        # Логин пользователя токена: None — еще не запрашивался, "" — токен его не раскрывает
+        self._token_login: Optional[str] = None
+
         try:
             auth = Auth.Token(token)
-            self.github_client = Github(auth=auth)
+            # lazy=True: объекты (репозиторий, PR, issue) создаются без запроса к API,
+            # данные подтягиваются при первом обращении к полям
+            self.github_client = Github(auth=auth, base_url=self.http.api_url, lazy=True)
             self.remote_repo: Repository = self.github_client.get_repo(repo_name)
-            logger.info(f"Успешное подключение к удаленному репозиторию: {repo_name}")
+            logger.info(f"Клиент GitHub для репозитория {repo_name} инициализирован")
         except GithubException as e:
             logger.error(f"Ошибка подключения к GitHub API: {e}")
             raise
 
         try:
             self.local_repo = Repo(self.local_path)
-            logger.info(f"Локальный репозиторий инициализирован в: {self.local_path}")
+            self.local_repo.git.update_environment(**git_auth_env(token))
+            logger.info(
+                f"Локальный репозиторий инициализирован в: {self.local_path} "
+                f"({time.perf_counter() - started:.2f} с)"
+            )
             self._configure_git_user()
         except InvalidGitRepositoryError:
             logger.error(f"Директория {self.local_path} не является Git-репозиторием.")
@@ -39,6 +116,83 @@ class GitHubManager:
             logger.error(f"Ошибка инициализации локального Git: {e}")
             raise
 
+    @classmethod
+    @traced("github.partial_clone")
+    def partial_clone(
+        cls,
+        token: str,
+        repo_name: str,
+        local_path: Union[str, Path],
+        paths: Sequence[str] = (),
+        branch: Optional[str] = None,
+        depth: int = 1,
+    ) -> "GitHubManager":
+        """Клонирует репозиторий без блобов (--filter=blob:none), с ограниченной историей и sparse-checkout.
+
+        В рабочую копию попадают только файлы корня и paths; остальные блобы
+        скачиваются по требованию, когда путь добавляется через sparse_add().
+        Токен передается заголовком (git_auth_env), URL origin остается без него.
+        """
+        started = time.perf_counter()
+        server = os.environ.get("GITHUB_SERVER_URL", "https://github.com").rstrip("/")
+        url = f"{server}/{repo_name}.git"
+        options = ["--filter=blob:none", "--sparse", "--no-tags"]
+        if depth:
+            options.append(f"--depth={depth}")
+        if branch:
+            options.append(f"--branch={branch}")
+        Repo.clone_from(url, str(local_path), multi_options=options, env=git_auth_env(token))
+        logger.info(f"Частичный клон {repo_name} в {local_path}: {time.perf_counter() - started:.2f} с")
+
+        manager = cls(token, repo_name, str(local_path))
+        if paths:
+            manager.sparse_add(paths)
+        return manager
+
+    def _git_flag(self, key: str, default: bool) -> bool:
+        # git config, а не config_reader: sparse-настройки могут лежать в config.worktree
+        try:
+            return self.local_repo.git.config("--type=bool", "--get", key) == "true"
+        except GitCommandError:
+            return default
+
+    @property
+    def is_sparse(self) -> bool:
+        return self._git_flag("core.sparseCheckout", False)
+
+    @traced("github.sparse_add")
+    def sparse_add(self, paths: Sequence[str]) -> None:
+        """Расширяет sparse-checkout путями, нужными задаче (в cone-режиме — их каталогами)."""
+        if not paths or not self.is_sparse:
+            return
+        started = time.perf_counter()
+        if self._git_flag("core.sparseCheckoutCone", False):
+            patterns = sorted({str(Path(p).parent) for p in paths} - {"."})
+        else:
+            patterns = sorted({"/" + p.lstrip("/") for p in paths})
+        if patterns:
+            self.local_repo.git.sparse_checkout("add", *patterns)
+        logger.info(f"Sparse-checkout расширен на {len(patterns)} путей: {time.perf_counter() - started:.2f} с")
+
+    @traced("github.tracked_blobs")
+    def tracked_blobs(self) -> Dict[str, str]:
+        """Путь -> blob SHA для всех файлов HEAD, включая не выгруженные в sparse-checkout."""
+        blobs = {}
+        for line in self.local_repo.git.ls_tree("-r", "HEAD").splitlines():
+            meta, _, path = line.partition("\t")
+            _mode, kind, sha = meta.split()
+            if kind == "blob":
+                blobs[path] = sha
+        return blobs
+
+    def for_local_path(self, local_path: Union[str, Path]) -> "GitHubManager":
+        """Копия менеджера с теми же API-клиентами, но работающая с другой рабочей копией (worktree)."""
+        clone = copy.copy(self)
+        clone.local_path = Path(local_path).resolve()
+        clone.local_repo = Repo(clone.local_path)
+        clone.local_repo.git.update_environment(**git_auth_env(self.token))
+        return clone
+
     def _configure_git_user(self) -> None:
         with self.local_repo.config_writer() as git_config:
             if not git_config.has_option("user", "email"):
@@ -46,31 +200,148 @@ class GitHubManager:
             if not git_config.has_option("user", "name"):
                 git_config.set_value("user", "name", "AI Coding Agent")
 
-    def _update_remote_url_with_token(self) -> None:
-        origin = self.local_repo.remote(name="origin")
-        url = origin.url
-        if url.startswith("https://") and "@" not in url:
-            new_url = url.replace("https://", f"https://{self.token}@")
-            origin.set_url(new_url)
-            logger.debug("Remote origin URL обновлен с использованием токена аутентификации.")
+    def _prefetch(self, kind: str, item: Dict[str, Any]) -> None:
+        with self._prefetched_lock:
+            self._prefetched[(kind, item["number"])] = item
+
+    def is_prefetched(self, kind: str, number: int) -> bool:
+        with self._prefetched_lock:
+            return (kind, number) in self._prefetched
+
+    def _take_prefetched(self, kind: str, number: int) -> Optional[Dict[str, Any]]:
+        """Данные из пакетной выборки; используются один раз, повторный вызов идет в API."""
+        with self._prefetched_lock:
+            return self._prefetched.pop((kind, number), None)
 
+    @traced("github.fetch_many")
+    def fetch_many(self, numbers: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        """Получает issue и PR по номерам GraphQL-запросами по GRAPHQL_BATCH штук.
+
+        Результаты запоминаются для get_issue/get_pull_request_data. Несуществующие
+        номера в ответ не попадают.
+        """
+        owner, name = self.repo_name.split("/", 1)
+        found: Dict[int, Dict[str, Any]] = {}
+        numbers = list(dict.fromkeys(numbers))
+        for start in range(0, len(numbers), GRAPHQL_BATCH):
+            batch = numbers[start:start + GRAPHQL_BATCH]
+            fields = "\n".join(
+                f"n{number}: issueOrPullRequest(number: {int(number)}) {{{_ISSUE_OR_PR_FIELDS}}}" for number in batch
+            )
+            data = self.http.graphql(
+                f"query($owner: String!, $name: String!) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}",
+                {"owner": owner, "name": name},
+            )
+            for node in (data.get("repository") or {}).values():
+                if node:
+                    item = _from_graphql(node)
+                    self._prefetch("pull" if "pull_request" in item else "issue", item)
+                    found[item["number"]] = item
+        current_span().add("items", len(found))
+        logger.info(f"Пакетно получено {len(found)} из {len(numbers)} issue/PR")
+        return found
+
+    @traced("github.list_issues")
+    def list_issues(self, labels: Sequence[str] = (), state: str = "open", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Issue репозитория (без PR) постранично; результаты запоминаются для get_issue."""
+        params = {"state": state}
+        if labels:
+            params["labels"] = ",".join(labels)
+        items = [
+            item for item in self.http.get_pages(f"repos/{self.repo_name}/issues", params)
+            if "pull_request" not in item
+        ][:limit]
+        for item in items:
+            self._prefetch("issue", item)
+        current_span().add("items", len(items))
+        return items
+
+    @traced("github.list_pulls")
+    def list_pulls(self, labels: Sequence[str] = (), state: str = "open", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """PR репозитория постранично (метки фильтруются на клиенте: /pulls их не принимает)."""
+        wanted = set(labels)
+        items = [
+            item for item in self.http.get_pages(f"repos/{self.repo_name}/pulls", {"state": state})
+            if wanted <= {label["name"] for label in item.get("labels", [])}
+        ][:limit]
+        for item in items:
+            self._prefetch("pull", item)
+        current_span().add("items", len(items))
+        return items
+
+    @traced("github.search_numbers")
+    def search_numbers(self, query: str, kind: str, limit: Optional[int] = None) -> List[int]:
+        """Номера issue (kind="issue") или PR (kind="pr") по запросу в синтаксисе поиска GitHub."""
+        items = self.http.get_pages(
+            "search/issues", {"q": f"repo:{self.repo_name} is:{kind} {query}"}, items_key="items", limit=limit
+        )
+        if kind == "issue":
+            for item in items:
+                self._prefetch("issue", item)
+        current_span().add("items", len(items))
+        return [item["number"] for item in items]
+
+    @traced("github.get_issue")
     def get_issue(self, issue_number: int) -> Dict[str, str]:
         try:
-            issue = self.remote_repo.get_issue(number=issue_number)
-            logger.info(f"Получен Issue #{issue_number}: {issue.title}")
+            issue = self._take_prefetched("issue", issue_number) or self.http.get_json(
+                f"repos/{self.repo_name}/issues/{issue_number}"
+            )
+            logger.info(f"Получен Issue #{issue_number}: {issue['title']}")
             return {
-                "title": issue.title,
-                "body": issue.body or "",
-                "url": issue.html_url
+                "title": issue["title"],
+                "body": issue.get("body") or "",
+                "url": issue["html_url"]
             }
-        except GithubException as e:
+        except requests.HTTPError as e:
             logger.error(f"Не удалось получить Issue #{issue_number}: {e}")
             raise
 
+    @traced("github.fetch_pull_head")
+    def fetch_pull_head(self, pr_number: int) -> str:
+        """Загружает head-коммит PR (в том числе из форка) и возвращает его SHA.
+
+        Коммит сохраняется в собственную ссылку refs/agent/pull/<номер>, а не в
+        общий FETCH_HEAD, поэтому параллельные задачи не мешают друг другу.
+        """
+        ref = f"refs/agent/pull/{pr_number}"
+        try:
+            started = time.perf_counter()
+            self.local_repo.git.fetch("--no-tags", "origin", f"+pull/{pr_number}/head:{ref}")
+            sha = self.local_repo.git.rev_parse(ref)
+            logger.info(f"Head PR #{pr_number}: {sha[:12]} ({time.perf_counter() - started:.2f} с)")
+            return sha
+        except GitCommandError as e:
+            logger.error(f"Не удалось загрузить head PR #{pr_number}: {e}")
+            raise
+
+    @traced("github.fetch_branch")
+    def fetch_branch(self, branch: str) -> str:
+        """Загружает текущий коммит ветки origin и возвращает его SHA.
+
+        Коммит сохраняется в ссылку refs/agent/base/<ветка>; параллельные задачи
+        обновляют ее по очереди, и каждая получает SHA своей загрузки.
+        """
+        ref = f"refs/agent/base/{branch}"
+        try:
+            started = time.perf_counter()
+            with self._fetch_lock:
+                self.local_repo.git.fetch("--no-tags", "origin", f"+refs/heads/{branch}:{ref}")
+                sha = self.local_repo.git.rev_parse(ref)
+            logger.info(f"origin/{branch}: {sha[:12]} ({time.perf_counter() - started:.2f} с)")
+            return sha
+        except GitCommandError as e:
+            logger.error(f"Не удалось загрузить ветку {branch}: {e}")
+            raise
+
+    @traced("github.create_branch")
     def create_branch(self, branch_name: str) -> None:
         try:
-            current = self.local_repo.active_branch
-            logger.info(f"Текущая ветка: {current.name}")
+            if self.local_repo.head.is_detached:
+                # worktree из пула выдается в состоянии detached HEAD
+                logger.info(f"Текущий коммит: {self.local_repo.head.commit.hexsha[:12]}")
+            else:
+                logger.info(f"Текущая ветка: {self.local_repo.active_branch.name}")
 
             # Проверяем, существует ли ветка
             if branch_name in self.local_repo.heads:
@@ -86,31 +357,49 @@ class GitHubManager:
             logger.error(f"Git ошибка при создании ветки {branch_name}: {e}")
             raise
 
-    def commit_and_push(self, branch_name: str, commit_message: str) -> None:
+    @traced("github.commit_and_push")
+    def commit_and_push(self, branch_name: str, commit_message: str, paths: Optional[Sequence[str]] = None) -> None:
+        """Коммитит и пушит изменения.
+
+        С paths индексируются только эти файлы, без обхода всего дерева
+        (is_dirty/`git add -A`), что на больших и sparse-репозиториях занимает минуты.
+        """
         try:
-            if not self.local_repo.is_dirty(untracked_files=True):
-                logger.warning("Нет изменений для коммита.")
-                return
+            started = time.perf_counter()
+            if paths is not None:
+                current_span().add("files", len(paths))
+                if not paths:
+                    logger.warning("Нет изменений для коммита.")
+                    return
+                add_args = ["--sparse"] if self.is_sparse else []
+                self.local_repo.git.add(*add_args, "--", *paths)
+                if not self.local_repo.git.diff("--cached", "--name-only", "--", *paths):
+                    logger.warning("Нет изменений для коммита.")
+                    return
+                self.local_repo.git.commit("-m", commit_message, "--", *paths)
+            else:
+                if not self.local_repo.is_dirty(untracked_files=True):
+                    logger.warning("Нет изменений для коммита.")
+                    return
 
-            # git add .
-            self.local_repo.git.add(A=True)
-            
-            # git commit -m "..."
-            self.local_repo.index.commit(commit_message)
-            logger.info(f"Сделан коммит: {commit_message}")
+                # git add .
+                self.local_repo.git.add(A=True)
 
-            # Обновляем URL для доступа по токену
-            self._update_remote_url_with_token()
+                # git commit -m "..."
+                self.local_repo.index.commit(commit_message)
+            logger.info(f"Сделан коммит: {commit_message} ({time.perf_counter() - started:.2f} с)")
 
             # git push origin <branch_name>
+            started = time.perf_counter()
             origin = self.local_repo.remote(name="origin")
             origin.push(refspec=f"{branch_name}:{branch_name}")
-            logger.info(f"Изменения отправлены в remote origin/{branch_name}")
+            logger.info(f"Изменения отправлены в remote origin/{branch_name} ({time.perf_counter() - started:.2f} с)")
 
         except GitCommandError as e:
             logger.error(f"Ошибка при выполнении git commit/push: {e}")
             raise
 
+    @traced("github.create_pull_request")
     def create_pull_request(
         self, title: str, body: str, head_branch: str, base_branch: str = "main"
     ) -> Optional[int]:
@@ -129,6 +418,7 @@ class GitHubManager:
                 logger.error("Вероятно, PR для этой ветки уже существует.")
             raise
 
+    @traced("github.post_comment_to_pr")
     def post_comment_to_pr(self, pr_number: int, comment: str) -> None:
         try:
             issue = self.remote_repo.get_issue(number=pr_number)
@@ -138,6 +428,116 @@ class GitHubManager:
             logger.error(f"Ошибка при добавлении комментария к PR #{pr_number}: {e}")
             raise
 
+    def token_login(self) -> str:
+        """Логин пользователя токена; пустая строка, если токен его не раскрывает.
+
+        Токен GitHub Actions (GITHUB_TOKEN) получает на /user ответ 403, а его
+        комментарии подписаны github-actions[bot].
+        """
+        if self._token_login is None:
+            try:
+                self._token_login = self.http.get_json("user").get("login") or ""
+            except requests.HTTPError as e:
+                logger.debug(f"Пользователь токена недоступен: {e}")
+                self._token_login = ""
+        return self._token_login
+
+    def _is_own_comment(self, comment: Dict[str, Any]) -> bool:
+        user = comment.get("user") or {}
+        login = self.token_login()
+        return user.get("login") == login if login else user.get("type") == "Bot"
+
+    @traced("github.upsert_pr_comment")
+    def upsert_pr_comment(
+        self, pr_number: int, body: str, marker: str = SUMMARY_MARKER, comment_id: Optional[int] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Обновляет комментарий бота с меткой marker или создает его, если такого нет.
+
+        Возвращает (комментарий, была ли запись): если текст не изменился,
+        запрос на запись не выполняется. Известный comment_id правится сразу,
+        без чтения списка комментариев. Учитываются только комментарии,
+        написанные пользователем токена: цитата метки в чужом комментарии не трогается.
+        """
+        text = f"{marker}\n{body}"
+        try:
+            if comment_id is not None:
+                try:
+                    comment = self.http.send_json(
+                        "PATCH", f"repos/{self.repo_name}/issues/comments/{comment_id}", {"body": text}
+                    )
+                    logger.info(f"Сводный комментарий PR #{pr_number} обновлен: {comment.get('html_url')}")
+                    return comment, True
+                except requests.HTTPError as e:
+                    if e.response is None or e.response.status_code != 404:
+                        raise
+                    logger.info(f"Сводный комментарий {comment_id} PR #{pr_number} удален, ищем заново")
+
+            comments = self.http.get_pages(f"repos/{self.repo_name}/issues/{pr_number}/comments")
+            existing = next(
+                (c for c in reversed(comments) if marker in (c.get("body") or "") and self._is_own_comment(c)),
+                None,
+            )
+            if existing is not None and existing.get("body") == text:
+                logger.info(f"Сводный комментарий PR #{pr_number} не изменился")
+                return existing, False
+            if existing is not None:
+                comment = self.http.send_json(
+                    "PATCH", f"repos/{self.repo_name}/issues/comments/{existing['id']}", {"body": text}
+                )
+                logger.info(f"Сводный комментарий PR #{pr_number} обновлен: {comment.get('html_url')}")
+            else:
+                comment = self.http.send_json(
+                    "POST", f"repos/{self.repo_name}/issues/{pr_number}/comments", {"body": text}
+                )
+                logger.info(f"Сводный комментарий добавлен к PR #{pr_number}: {comment.get('html_url')}")
+            return comment, True
+        except requests.HTTPError as e:
+            logger.error(f"Ошибка при обновлении комментария PR #{pr_number}: {e}")
+            raise
+
+    @traced("github.publish_review")
+    def publish_review(
+        self,
+        pr_number: int,
+        body: str,
+        event: str = "COMMENT",
+        comments: Sequence[ReviewComment] = (),
+        commit_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Публикует ревью PR одним запросом: текст, вердикт (event) и все inline-комментарии.
+
+        На ответ 422 ревью публикуется повторно с event=COMMENT и без
+        inline-комментариев: GitHub так отвечает и на одобрение собственного PR,
+        и на позицию вне diff, а по ответу причину не различить.
+        """
+        current_span().add("comments", len(comments))
+        path = f"repos/{self.repo_name}/pulls/{pr_number}/reviews"
+        payload: Dict[str, Any] = {
+            "body": body,
+            "event": event,
+            "comments": [{"path": c.path, "position": c.position, "body": c.body} for c in comments],
+        }
+        if commit_id:
+            payload["commit_id"] = commit_id
+        try:
+            try:
+                review = self.http.send_json("POST", path, payload)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 422 or (event == "COMMENT" and not comments):
+                    raise
+                logger.warning(
+                    f"GitHub отклонил ревью ({event}, {len(comments)} inline-комментариев): {e}; "
+                    f"публикуем как COMMENT без inline-комментариев"
+                )
+                review = self.http.send_json("POST", path, {**payload, "event": "COMMENT", "comments": []})
+                comments = ()
+            logger.info(f"Ревью опубликовано в PR #{pr_number}: {review.get('state')}, {len(comments)} inline-комментариев")
+            return review
+        except requests.HTTPError as e:
+            logger.error(f"Ошибка при публикации ревью PR #{pr_number}: {e}")
+            raise
+
+    @traced("github.get_pull_request")
     def get_pull_request(self, pr_number: int) -> PullRequest:
         try:
             return self.remote_repo.get_pull(pr_number)
@@ -145,14 +545,210 @@ class GitHubManager:
             logger.error(f"Ошибка при получении PR #{pr_number}: {e}")
             raise
 
-    def get_pr_diff(self, pr_number: int) -> str:
+    def iter_pr_diff(
+        self,
+        pr_number: int,
+        include: Optional[Sequence[str]] = None,
+        exclude: Optional[Sequence[str]] = None,
+        max_file_bytes: Optional[int] = None,
+        max_total_bytes: Optional[int] = None,
+    ) -> Iterator[DiffFile]:
+        """Получает полный unified diff PR одним запросом и разбирает его потоково."""
+        lines = self.http.stream_lines(f"repos/{self.repo_name}/pulls/{pr_number}")
+        return iter_diff_files(
+            lines,
+            include=include,
+            exclude=exclude,
+            max_file_bytes=max_file_bytes,
+            max_total_bytes=max_total_bytes,
+        )
+
+    @traced("github.get_pr_files")
+    def get_pr_files(self, pr_number: int, **diff_filters) -> List[Dict[str, Optional[str]]]:
+        """Файлы PR с blob SHA новой версии и patch (None для бинарных файлов).
+
+        Быстрый путь — один запрос raw diff (SHA в нем сокращенный); при ошибке
+        используется постраничный pr.get_files().
+        """
+        try:
+            files = [
+                {
+                    "filename": f.path,
+                    "sha": f.new_sha,
+                    "status": f.status,
+                    "patch": f.patch if not f.truncated else f"{f.patch}\n[... diff файла обрезан по размеру ...]",
+                }
+                for f in self.iter_pr_diff(pr_number, **diff_filters)
+            ]
+            self._resolve_unchanged_blobs(pr_number, files)
+            current_span().add("files", len(files))
+            return files
+        except Exception as e:
+            logger.warning(f"Не удалось получить raw diff PR #{pr_number}, используем get_files: {e}")
+
         try:
             pr = self.get_pull_request(pr_number)
-            files = pr.get_files()
-            diff_text = ""
-            for file in files:
-                diff_text += f"\nFile: {file.filename}\n{file.patch}\n"
-            return diff_text
+            return [
+                {
+                    "filename": file.filename,
+                    "sha": file.sha,
+                    "status": file.status,
+                    "patch": file.patch,
+                }
+                for file in pr.get_files()
+            ]
+        except GithubException as e:
+            logger.error(f"Ошибка при получении файлов PR #{pr_number}: {e}")
+            raise
+
+    def _resolve_unchanged_blobs(self, pr_number: int, files: List[Dict[str, Optional[str]]]) -> None:
+        """Дописывает SHA файлам, у которых в raw diff нет строки index.
+
+        Так выглядят переименование без правок и смена режима: blob не изменился,
+        и его SHA берется из head PR GraphQL-запросами по GRAPHQL_BATCH файлов.
+        """
+        missing = [f for f in files if f["sha"] is None and f["status"] != "removed"]
+        if not missing:
+            return
+        head = self.get_pull_request_data(pr_number)["head"]["sha"]
+        owner, name = self.repo_name.split("/", 1)
+        for start in range(0, len(missing), GRAPHQL_BATCH):
+            batch = missing[start:start + GRAPHQL_BATCH]
+            fields = "\n".join(
+                f"f{i}: object(expression: {json.dumps(head + ':' + f['filename'])}) {{ oid }}"
+                for i, f in enumerate(batch)
+            )
+            data = self.http.graphql(
+                f"query($owner: String!, $name: String!) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}",
+                {"owner": owner, "name": name},
+            )
+            repository = data.get("repository") or {}
+            for i, f in enumerate(batch):
+                node = repository.get(f"f{i}")
+                if node:
+                    f["sha"] = node["oid"]
+        logger.info(f"SHA файлов без изменения содержимого: {len(missing)} в PR #{pr_number}")
+
+    @traced("github.get_pull_request_data")
+    def get_pull_request_data(self, pr_number: int) -> Dict[str, Any]:
+        """JSON PR через условный запрос (без лишнего расхода квоты)."""
+        try:
+            return self._take_prefetched("pull", pr_number) or self.http.get_json(
+                f"repos/{self.repo_name}/pulls/{pr_number}"
+            )
+        except requests.HTTPError as e:
+            logger.error(f"Ошибка при получении PR #{pr_number}: {e}")
+            raise
+
+    def api_stats(self) -> Dict[str, Any]:
+        """Счетчики запросов к GitHub API: всего, 304 из кэша, израсходованная квота, ожидания лимита."""
+        return self.http.stats()
+
+    @traced("github.get_pr_diff")
+    def get_pr_diff(self, pr_number: int, **diff_filters) -> str:
+        try:
+            return "\n".join(render_diff_file(f) for f in self.iter_pr_diff(pr_number, **diff_filters))
+        except Exception as e:
+            logger.warning(f"Не удалось получить raw diff PR #{pr_number}, используем get_files: {e}")
+
+        try:
+            pr = self.get_pull_request(pr_number)
+            parts = []
+            for file in pr.get_files():
+                patch = file.patch if file.patch is not None else "[бинарный файл]"
+                parts.append(f"File: {file.filename}\n{patch}")
+            return "\n".join(parts)
         except Exception as e:
             logger.error(f"Ошибка при получении diff для PR #{pr_number}: {e}")
-            raise
\ No newline at end of file
+            raise
+
+
+class WorktreePool:
+    """Пул `git worktree` поверх одного репозитория для параллельных задач.
+
+    Каждая задача получает изолированную рабочую копию, разделяющую объекты с
+    основным репозиторием, поэтому N задач не требуют N полных клонов. Перед
+    выдачей worktree сбрасывается на base_ref и очищается от лишних файлов, а
+    после задачи возвращается в пул. Размер пула ограничен max_size.
+    """
+
+    def __init__(self, repo: Repo, max_size: int = 4, root: Optional[Union[str, Path]] = None):
+        self.repo = repo
+        self.max_size = max_size
+        self.root = Path(root) if root else Path(repo.git_dir) / "agent-worktrees"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # git worktree add пишет в общий .git/worktrees: параллельные вызовы мешают друг другу
+        self._add_lock = threading.Lock()
+        self._free: List[Path] = sorted(p for p in self.root.iterdir() if (p / ".git").exists())
+        self._created = len(self._free)
+
+    def _new_path(self) -> Path:
+        with self._lock:
+            self._created += 1
+            index = self._created
+        path = self.root / f"wt-{index}"
+        while path.exists():
+            index += 1
+            path = self.root / f"wt-{index}"
+        return path
+
+    def _reset(self, path: Path, base_ref: str) -> None:
+        worktree = Repo(path)
+        # В частичном клоне checkout догружает блобы из origin: нужен тот же токен
+        worktree.git.update_environment(**self.repo.git.environment())
+        worktree.git.checkout("--detach", "--force", base_ref)
+        worktree.git.clean("-f", "-d", "-x")
+
+    @contextmanager
+    def lease(self, base_ref: Optional[str] = None) -> Iterator[Path]:
+        """Выдает чистый worktree на время задачи (блокируется, если пул исчерпан)."""
+        base_ref = base_ref or self.repo.head.commit.hexsha
+        self._slots.acquire()
+        # В пул возвращается только worktree, который удалось создать или сбросить
+        ready: Optional[Path] = None
+        try:
+            with self._lock:
+                free = self._free.pop() if self._free else None
+            # Путь известен до первой git-команды: в _discard попадает только реальный worktree
+            path = free if free is not None else self._new_path()
+            try:
+                if free is None:
+                    with self._add_lock:
+                        self.repo.git.worktree("add", "--detach", str(path), base_ref)
+                    logger.info(f"Создан worktree {path}")
+                else:
+                    self._reset(path, base_ref)
+            except Exception:
+                self._discard(path)
+                raise
+            ready = path
+            yield path
+        finally:
+            if ready is not None:
+                with self._lock:
+                    self._free.append(ready)
+            self._slots.release()
+
+    def _discard(self, path: Path) -> None:
+        """Убирает неудавшийся worktree, чтобы он не попал в следующие выдачи."""
+        logger.warning(f"Worktree {path} исключен из пула")
+        with self._add_lock:
+            try:
+                if path.exists():
+                    self.repo.git.worktree("remove", "--force", str(path))
+                self.repo.git.worktree("prune")
+            except GitCommandError as e:
+                logger.warning(f"Не удалось удалить worktree {path}: {e}")
+
+    def close(self) -> None:
+        """Удаляет все worktree пула."""
+        with self._lock:
+            paths, self._free = self._free, []
+        for path in paths:
+            try:
+                self.repo.git.worktree("remove", "--force", str(path))
+            except GitCommandError as e:
+                logger.warning(f"Не удалось удалить worktree {path}: {e}")
+        self.repo.git.worktree("prune")
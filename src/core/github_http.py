@@ -0,0 +1,308 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from core.http_pool import get_shared_session
+from core.paths import agent_cache_dir
+from core.resilience import parse_retry_after
+from core.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.github.com"
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+JSON_MEDIA_TYPE = "application/vnd.github+json"
+
+
+class ConditionalCache:
+    """Хранит ETag/Last-Modified и тело последнего ответа по URL для условных запросов."""
+
+    def __init__(self, path, max_body_bytes: int = 5 * 1024 * 1024):
+        self.max_body_bytes = max_body_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " body TEXT NOT NULL,"
+            " stored_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[Optional[str], Optional[str], str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT etag, last_modified, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+    def set(self, key: str, etag: Optional[str], last_modified: Optional[str], body: str) -> None:
+        if not (etag or last_modified) or len(body) > self.max_body_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, last_modified, body, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (key, etag, last_modified, body, time.time()),
+            )
+            self._conn.commit()
+
+
+class RateLimitScheduler:
+    """Отслеживает X-RateLimit-* и задерживает запросы вместо того, чтобы упираться в лимит.
+
+    Когда остаток квоты опускается до reserve, следующий запрос ждет сброса окна.
+    Ответы 403/429 с Retry-After или нулевым остатком (в том числе вторичные
+    лимиты) приводят к паузе и повтору.
+    """
+
+    def __init__(self, reserve: int = 50, max_wait: float = 900.0):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.remaining: Optional[int] = None
+        self.limit: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, seconds: float, reason: str) -> None:
+        seconds = min(max(seconds, 0.0), self.max_wait)
+        if seconds <= 0:
+            return
+        logger.warning(f"GitHub API: {reason}, пауза {seconds:.0f} с")
+        with self._lock:
+            self.waits += 1
+            self.waited_seconds += seconds
+        time.sleep(seconds)
+
+    def before_request(self) -> None:
+        with self._lock:
+            remaining, reset_at = self.remaining, self.reset_at
+        if remaining is not None and reset_at and remaining <= self.reserve:
+            self.wait(reset_at - time.time() + 1, f"осталось {remaining} запросов до сброса лимита")
+
+    def update(self, response: requests.Response) -> None:
+        headers = response.headers
+        with self._lock:
+            if "X-RateLimit-Remaining" in headers:
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Limit" in headers:
+                self.limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Reset" in headers:
+                self.reset_at = float(headers["X-RateLimit-Reset"])
+
+    def retry_delay(self, response: requests.Response) -> Optional[float]:
+        """Пауза перед повтором, если ответ — срабатывание лимита; иначе None."""
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            # Retry-After бывает и HTTP-датой; нераспознанное значение — как вторичный лимит
+            delay = parse_retry_after(retry_after)
+            return 60.0 if delay is None else delay
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset_at = float(response.headers.get("X-RateLimit-Reset", time.time() + 60))
+            return reset_at - time.time() + 1
+        if response.status_code == 429 or "secondary rate limit" in response.text.lower():
+            # Вторичный лимит без Retry-After: GitHub советует подождать минуту
+            return 60.0
+        return None
+
+
+class GitHubHTTP:
+    """Тонкий клиент GitHub REST API поверх общего пула соединений.
+
+    GET-запросы отправляются условно (If-None-Match / If-Modified-Since) с
+    сохраненными ETag и телом ответа: 304 не расходует квоту. Запросы
+    притормаживаются по заголовкам лимитов вместо того, чтобы падать.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        api_url: Optional[str] = None,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ConditionalCache] = None,
+    ):
+        self.api_url = (api_url or os.environ.get("GITHUB_API_URL", DEFAULT_API_URL)).rstrip("/")
+        self.session = session or get_shared_session()
+        self.timeout = int(os.environ.get("GITHUB_TIMEOUT", "30"))
+        self.retries = int(os.environ.get("GITHUB_RETRIES", "3"))
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if cache is None and os.environ.get("GITHUB_HTTP_CACHE", "1") == "1":
+            cache = ConditionalCache(agent_cache_dir() / "github_http.sqlite")
+        self.cache = cache
+        self.scheduler = RateLimitScheduler(
+            reserve=int(os.environ.get("GITHUB_RATE_RESERVE", "50")),
+            max_wait=float(os.environ.get("GITHUB_MAX_RATE_WAIT", "900")),
+        )
+        self.counters = {"requests": 0, "not_modified": 0, "quota_used": 0}
+        self._counters_lock = threading.Lock()
+
+    def _url(self, path: str) -> str:
+        return path if path.startswith("http") else f"{self.api_url}/{path.lstrip('/')}"
+
+    def _count(self, name: str) -> None:
+        with self._counters_lock:
+            self.counters[name] += 1
+        current_span().add(f"github.{name}")
+
+    def _get(self, url: str, accept: str, params: Optional[Dict[str, Any]], cached, stream: bool) -> requests.Response:
+        headers = {**self.headers, "Accept": accept}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return self._send(lambda: self.session.get(url, headers=headers, params=params, timeout=self.timeout, stream=stream))
+
+    def _send(self, request: Callable[[], requests.Response]) -> requests.Response:
+        """Выполняет запрос с учетом лимитов: ждет сброса окна и повторяет ответы 403/429 с паузой."""
+        for attempt in range(1, self.retries + 1):
+            self.scheduler.before_request()
+            response = request()
+            self._count("requests")
+            self.scheduler.update(response)
+            if response.status_code != 304:
+                self._count("quota_used")
+
+            delay = self.scheduler.retry_delay(response)
+            if delay is None or attempt == self.retries:
+                return response
+            response.close()
+            self.scheduler.wait(delay, f"сработал лимит ({response.status_code})")
+        return response
+
+    def _cache_key(self, url: str, accept: str, params: Optional[Dict[str, Any]]) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+        return f"{accept} {url}?{query}"
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        url = self._url(path)
+        key = self._cache_key(url, JSON_MEDIA_TYPE, params)
+        cached = self.cache.get(key) if self.cache else None
+
+        response = self._get(url, JSON_MEDIA_TYPE, params, cached, stream=False)
+        if response.status_code == 304 and cached:
+            self._count("not_modified")
+            return json.loads(cached[2])
+        response.raise_for_status()
+        if self.cache:
+            self.cache.set(key, response.headers.get("ETag"), response.headers.get("Last-Modified"), response.text)
+        return response.json()
+
+    def send_json(self, method: str, path: str, payload: Dict[str, Any]) -> Any:
+        """Запрос на запись (POST/PATCH/PUT) с JSON-телом; ответ не кэшируется."""
+        url = self._url(path)
+        headers = {**self.headers, "Accept": JSON_MEDIA_TYPE}
+        response = self._send(
+            lambda: self.session.request(method, url, headers=headers, json=payload, timeout=self.timeout)
+        )
+        response.raise_for_status()
+        return response.json() if response.content else None
+
+    def get_pages(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        items_key: Optional[str] = None,
+        limit: Optional[int] = None,
+        per_page: int = 100,
+    ) -> List[Any]:
+        """Собирает постраничный список (page=1, 2, ...) до неполной страницы или limit.
+
+        items_key — поле со списком, если ответ — объект (например, "items" у search).
+        Каждая страница запрашивается условно, как в get_json.
+        """
+        items: List[Any] = []
+        page = 1
+        while True:
+            data = self.get_json(path, {**(params or {}), "per_page": per_page, "page": page})
+            batch = data[items_key] if items_key else data
+            items.extend(batch)
+            if len(batch) < per_page or (limit is not None and len(items) >= limit):
+                break
+            page += 1
+        return items[:limit] if limit is not None else items
+
+    @property
+    def graphql_url(self) -> str:
+        # GitHub Enterprise: https://host/api/v3 -> https://host/api/graphql
+        if self.api_url.endswith("/api/v3"):
+            return self.api_url[: -len("/v3")] + "/graphql"
+        return f"{self.api_url}/graphql"
+
+    def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Выполняет GraphQL-запрос. Ошибки по отдельным полям (например, NOT_FOUND у
+        несуществующего номера) только логируются: их поля в ответе равны None."""
+        headers = {**self.headers, "Accept": JSON_MEDIA_TYPE}
+        payload = {"query": query, "variables": variables or {}}
+        response = self._send(
+            lambda: self.session.post(self.graphql_url, headers=headers, json=payload, timeout=self.timeout)
+        )
+        response.raise_for_status()
+        result = response.json()
+        errors = result.get("errors")
+        if errors and not result.get("data"):
+            raise requests.HTTPError(f"GraphQL: {errors[0].get('message')}", response=response)
+        for error in errors or []:
+            logger.warning(f"GraphQL: {error.get('message')}")
+        return result["data"]
+
+    def stream_lines(self, path: str, accept: str = DIFF_MEDIA_TYPE) -> Iterator[str]:
+        """Построчно читает тело ответа, не загружая его целиком в память.
+
+        Тело, уложившееся в лимит кэша, сохраняется для условных запросов.
+        """
+        url = self._url(path)
+        key = self._cache_key(url, accept, None)
+        cached = self.cache.get(key) if self.cache else None
+
+        response = self._get(url, accept, None, cached, stream=True)
+        with response:
+            if response.status_code == 304 and cached:
+                self._count("not_modified")
+                yield from cached[2].split("\n")
+                return
+            response.raise_for_status()
+            response.encoding = response.encoding or "utf-8"
+
+            keep: Optional[List[str]] = [] if self.cache else None
+            kept_bytes = 0
+            received = 0
+            for line in response.iter_lines(decode_unicode=True):
+                received += len(line) + 1
+                if keep is not None:
+                    kept_bytes += len(line) + 1
+                    if kept_bytes > self.cache.max_body_bytes:
+                        keep = None
+                    else:
+                        keep.append(line)
+                yield line
+
+            current_span().add("response_bytes", received)
+            if keep is not None:
+                self.cache.set(key, response.headers.get("ETag"), response.headers.get("Last-Modified"), "\n".join(keep))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            stats: Dict[str, Any] = dict(self.counters)
+        stats.update({
+            "rate_remaining": self.scheduler.remaining,
+            "rate_limit": self.scheduler.limit,
+            "rate_waits": self.scheduler.waits,
+            "rate_wait_seconds": round(self.scheduler.waited_seconds, 1),
+        })
+        return stats
@@ -0,0 +1,42 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_session_lock = threading.Lock()
+_shared_session: Optional[requests.Session] = None
+
+
+def get_shared_session() -> requests.Session:
+    """Возвращает общий для процесса requests.Session с пулом keep-alive соединений.
+
+    Размер пула настраивается через LLM_POOL_CONNECTIONS (число хостов),
+    LLM_POOL_MAXSIZE (соединений на хост) и LLM_POOL_BLOCK (ждать свободное
+    соединение вместо открытия лишнего).
+    """
+    global _shared_session
+    with _session_lock:
+        if _shared_session is None:
+            pool_connections = int(os.environ.get("LLM_POOL_CONNECTIONS", "4"))
+            pool_maxsize = int(os.environ.get("LLM_POOL_MAXSIZE", "16"))
+            pool_block = os.environ.get("LLM_POOL_BLOCK", "0") == "1"
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Connection": "keep-alive"})
+            _shared_session = session
+            logger.debug(
+                f"Создан пул HTTP-соединений: hosts={pool_connections}, per_host={pool_maxsize}"
+            )
+        return _shared_session
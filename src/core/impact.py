@@ -0,0 +1,395 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from core.paths import agent_cache_dir
+from core.tracing import current_span, traced
+
+logger = logging.getLogger(__name__)
+
+# Изменение этих файлов может повлиять на любой тест — запускается весь набор
+GLOBAL_FILES = {
+    "conftest.py", "pytest.ini", "pyproject.toml", "setup.cfg", "setup.py", "tox.ini",
+    "requirements.txt", "requirements-dev.txt", "Pipfile.lock", "poetry.lock",
+}
+
+
+def is_test_file(rel_path: str) -> bool:
+    name = Path(rel_path).name
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _module_names(rel_path: str, roots: Sequence[str]) -> List[str]:
+    """Имена модуля файла относительно каждого корня импорта ("" — корень репозитория)."""
+    parts = list(Path(rel_path).with_suffix("").parts)
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    names = []
+    for root in roots:
+        root_parts = list(Path(root).parts) if root else []
+        if parts[: len(root_parts)] == root_parts and len(parts) > len(root_parts):
+            names.append(".".join(parts[len(root_parts):]))
+    return names
+
+
+def extract_imports(source: str, module_names: Sequence[str], is_package: bool = False) -> Set[str]:
+    """Абсолютные имена модулей, которые импортирует файл, вместе с родительскими пакетами.
+
+    `from a.b import c` дает a, a.b и a.b.c (c может оказаться модулем). Относительные
+    импорты разрешаются от каждого из имен файла.
+    """
+    tree = ast.parse(source)
+    found: Set[str] = set()
+
+    def add(name: str) -> None:
+        parts = name.split(".")
+        for i in range(1, len(parts) + 1):
+            found.add(".".join(parts[:i]))
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                add(alias.name)
+        elif isinstance(node, ast.ImportFrom):
+            bases = []
+            if node.level == 0:
+                bases = [node.module]
+            else:
+                for own in module_names:
+                    package = own.split(".")
+                    # Для модуля пакет — родитель, для __init__ — он сам
+                    drop = node.level - 1 if is_package else node.level
+                    if drop > len(package) or (drop == len(package) and not node.module):
+                        continue
+                    prefix = package[: len(package) - drop]
+                    bases.append(".".join(prefix + ([node.module] if node.module else [])))
+            for base in bases:
+                if not base:
+                    continue
+                add(base)
+                for alias in node.names:
+                    if alias.name != "*":
+                        found.add(f"{base}.{alias.name}")
+    return found
+
+
+class ImportGraph:
+    """Граф импортов Python-файлов репозитория для выбора затронутых тестов.
+
+    roots — каталоги, от которых считаются имена модулей (корень репозитория
+    всегда, плюс src и подобные, которые тесты добавляют в sys.path). Импорт
+    одиночного имени, не найденного ни в одном корне, сопоставляется файлу с
+    таким же именем (модули из каталогов, добавленных в sys.path вручную).
+    Динамические импорты (importlib) не отслеживаются.
+    """
+
+    def __init__(self, imports: Dict[str, List[str]], roots: Sequence[str]):
+        self.imports = imports
+        self.roots = list(roots)
+        self._by_name: Dict[str, Set[str]] = {}
+        known: Set[str] = set()
+        for path in imports:
+            known.update(_module_names(path, self.roots))
+        for path, names in imports.items():
+            for name in names:
+                key = name if name in known or "." in name else f"~{name}"
+                self._by_name.setdefault(key, set()).add(path)
+
+    def importers(self, rel_path: str) -> Set[str]:
+        keys = _module_names(rel_path, self.roots)
+        if Path(rel_path).name != "__init__.py":
+            keys.append(f"~{Path(rel_path).stem}")
+        found: Set[str] = set()
+        for key in keys:
+            found |= self._by_name.get(key, set())
+        return found
+
+    def dependents(self, changed: Iterable[str]) -> Set[str]:
+        """Изменившиеся файлы и все файлы, которые транзитивно их импортируют."""
+        seen: Set[str] = set()
+        stack = [p for p in changed if p.endswith(".py")]
+        while stack:
+            path = stack.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+            stack.extend(self.importers(path) - seen)
+        return seen
+
+
+def _git(root: Path, *args: str) -> str:
+    return subprocess.run(["git", "-C", str(root), *args], check=True, capture_output=True, text=True).stdout
+
+
+def _read_blobs(root: Path, blobs: Sequence[str]) -> Dict[str, bytes]:
+    """Содержимое blob-ов одним вызовом `git cat-file --batch` (в blobless-клоне догружаются пачкой)."""
+    if not blobs:
+        return {}
+    output = subprocess.run(
+        ["git", "-C", str(root), "cat-file", "--batch"],
+        input="\n".join(blobs).encode() + b"\n", check=True, capture_output=True,
+    ).stdout
+    contents: Dict[str, bytes] = {}
+    pos = 0
+    while pos < len(output):
+        header_end = output.index(b"\n", pos)
+        header = output[pos:header_end].split()
+        pos = header_end + 1
+        if len(header) < 3 or header[1] == b"missing":
+            continue
+        size = int(header[2])
+        contents[header[0].decode()] = output[pos:pos + size]
+        pos += size + 1
+    return contents
+
+
+def default_roots(root: Path) -> List[str]:
+    configured = os.environ.get("TEST_IMPACT_ROOTS")
+    extra = configured.split(",") if configured is not None else ["src"]
+    return [""] + [r.strip("/") for r in extra if r and (root / r).is_dir()]
+
+
+@traced("test_impact.build_graph")
+def build_graph(root: Union[str, Path] = ".", roots: Optional[Sequence[str]] = None) -> ImportGraph:
+    """Строит граф импортов для HEAD; граф кэшируется по коммиту.
+
+    Разобранные импорты хранятся по blob SHA файла, поэтому граф нового
+    коммита пересчитывает только изменившиеся файлы.
+    """
+    root = Path(root).resolve()
+    roots = list(roots) if roots is not None else default_roots(root)
+    cache_dir = agent_cache_dir("test_impact")
+    commit = _git(root, "rev-parse", "HEAD").strip()
+    # Имена модулей (и относительные импорты) зависят от корней, поэтому они входят в ключ
+    roots_key = hashlib.sha1(",".join(roots).encode()).hexdigest()[:8]
+    graph_file = cache_dir / f"graph-{commit}-{roots_key}.json"
+    # В рабочей копии с незакоммиченными правками blob из индекса не совпадает с файлом
+    dirty = set(_git(root, "diff", "--name-only", "HEAD").splitlines())
+    if graph_file.exists() and not dirty:
+        cached = json.loads(graph_file.read_text(encoding="utf-8"))
+        current_span().set("cache", "commit")
+        return ImportGraph({p: entry["imports"] for p, entry in cached.items()}, roots)
+
+    # blob SHA -> импорты из самого свежего графа другого коммита
+    by_blob: Dict[str, List[str]] = {}
+    previous = sorted(cache_dir.glob(f"graph-*-{roots_key}.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    if previous:
+        by_blob = {e["blob"]: e["imports"] for e in json.loads(previous[0].read_text(encoding="utf-8")).values()}
+
+    entries: Dict[str, Dict[str, object]] = {}
+    to_parse: Dict[str, str] = {}
+    for line in _git(root, "ls-files", "-s", "--", "*.py").splitlines():
+        meta, rel_path = line.split("\t", 1)
+        blob = meta.split()[1]
+        if blob in by_blob and rel_path not in dirty:
+            entries[rel_path] = {"blob": blob, "imports": by_blob[blob]}
+        else:
+            to_parse[rel_path] = blob
+
+    # Файлы вне sparse-checkout читаются из объектов git
+    absent = {path: blob for path, blob in to_parse.items() if not (root / path).exists()}
+    blobs = _read_blobs(root, sorted(set(absent.values())))
+    for rel_path, blob in to_parse.items():
+        try:
+            raw = blobs.get(blob, b"") if rel_path in absent else (root / rel_path).read_bytes()
+            imports = sorted(extract_imports(
+                raw.decode("utf-8"), _module_names(rel_path, roots), rel_path.endswith("__init__.py")
+            ))
+        except (OSError, SyntaxError, UnicodeDecodeError, ValueError) as e:
+            logger.debug(f"Импорты {rel_path} не разобраны: {e}")
+            imports = []
+        entries[rel_path] = {"blob": blob, "imports": imports}
+    parsed = len(to_parse)
+
+    current_span().add("files_parsed", parsed)
+    if not dirty:
+        graph_file.write_text(json.dumps(entries), encoding="utf-8")
+        for stale in previous[int(os.environ.get("TEST_IMPACT_KEEP_GRAPHS", "5")):]:
+            stale.unlink(missing_ok=True)
+    logger.info(f"Граф импортов: {len(entries)} файлов, разобрано заново {parsed}")
+    return ImportGraph({p: e["imports"] for p, e in entries.items()}, roots)
+
+
+def select_tests(graph: ImportGraph, changed: Iterable[str]) -> Tuple[List[str], Optional[str]]:
+    """Тестовые модули, затронутые изменениями, и причина запуска всего набора (если есть)."""
+    changed = list(changed)
+    all_tests = sorted(p for p in graph.imports if is_test_file(p))
+    scoped: Set[str] = set()
+    for path in changed:
+        name = Path(path).name
+        if name == "conftest.py" and Path(path).parent != Path("."):
+            # conftest влияет на тесты своего каталога и подкаталогов
+            scope = Path(path).parent.as_posix() + "/"
+            scoped.update(t for t in all_tests if t.startswith(scope))
+        elif name in GLOBAL_FILES:
+            return all_tests, f"изменен {path}"
+    affected = graph.dependents(changed) | scoped
+    return sorted(p for p in affected if is_test_file(p) and p in graph.imports), None
+
+
+@dataclass
+class CaseResult:
+    nodeid: str
+    outcome: str  # passed | failed | error | skipped
+    seconds: float
+    message: str = ""
+
+
+@dataclass
+class ImpactReport:
+    """Результат выборочного прогона тестов для промпта ревью и CI."""
+    changed: List[str]
+    selected: List[str]
+    total_tests: int
+    run_all_reason: Optional[str] = None
+    cases: List[CaseResult] = field(default_factory=list)
+    seconds: float = 0.0
+    crashed: List[str] = field(default_factory=list)
+
+    def count(self, outcome: str) -> int:
+        return sum(1 for c in self.cases if c.outcome == outcome)
+
+    @property
+    def ok(self) -> bool:
+        return not self.crashed and not any(c.outcome in ("failed", "error") for c in self.cases)
+
+    def format_for_prompt(self, max_failures: int = 10, max_message: int = 600) -> str:
+        if not self.selected:
+            return f"Изменения не затрагивают ни один из {self.total_tests} тестовых модулей, тесты не запускались."
+        scope = f"весь набор ({self.run_all_reason})" if self.run_all_reason else (
+            f"{len(self.selected)} из {self.total_tests} тестовых модулей, зависящих от измененных файлов"
+        )
+        lines = [
+            f"Запущено: {scope}.",
+            f"Итог: {self.count('passed')} passed, {self.count('failed')} failed, {self.count('error')} errors, "
+            f"{self.count('skipped')} skipped за {self.seconds:.1f} с.",
+        ]
+        for module in self.crashed:
+            lines.append(f"Модуль {module} не удалось запустить (ошибка сбора или таймаут).")
+        failures = [c for c in self.cases if c.outcome in ("failed", "error")]
+        for case in failures[:max_failures]:
+            message = case.message.strip()
+            if len(message) > max_message:
+                message = message[:max_message] + " ..."
+            lines.append(f"- {case.outcome.upper()} {case.nodeid} ({case.seconds:.2f} с)\n  {message}")
+        if len(failures) > max_failures:
+            lines.append(f"... и еще {len(failures) - max_failures} упавших тестов")
+        slowest = sorted(self.cases, key=lambda c: c.seconds, reverse=True)[:3]
+        if slowest and slowest[0].seconds >= 1:
+            lines.append("Самые медленные: " + ", ".join(f"{c.nodeid} {c.seconds:.1f} с" for c in slowest))
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "changed": self.changed,
+            "selected": self.selected,
+            "run_all_reason": self.run_all_reason,
+            "seconds": round(self.seconds, 2),
+            "counts": {o: self.count(o) for o in ("passed", "failed", "error", "skipped")},
+            "crashed": self.crashed,
+            "cases": [c.__dict__ for c in self.cases],
+        }
+
+
+def parse_junit(xml_text: str) -> List[CaseResult]:
+    cases = []
+    for case in ET.fromstring(xml_text).iter("testcase"):
+        outcome, message = "passed", ""
+        for child in case:
+            if child.tag in ("failure", "error", "skipped"):
+                outcome = {"failure": "failed"}.get(child.tag, child.tag)
+                message = child.get("message") or ""
+                if child.tag != "skipped" and child.text:
+                    # В тексте — traceback; последние строки содержат сам assert
+                    message = "\n".join(child.text.strip().splitlines()[-8:])
+                break
+        nodeid = f"{case.get('classname', '')}::{case.get('name', '')}"
+        cases.append(CaseResult(nodeid, outcome, float(case.get("time") or 0), message))
+    return cases
+
+
+def _shards(files: Sequence[str], workers: int, durations: Dict[str, float]) -> List[List[str]]:
+    """Делит модули между процессами по известным длительностям (самые долгие — первыми)."""
+    shards: List[Tuple[float, List[str]]] = [(0.0, []) for _ in range(workers)]
+    for path in sorted(files, key=lambda p: durations.get(p, 1.0), reverse=True):
+        load, shard = min(shards, key=lambda s: s[0])
+        shards.remove((load, shard))
+        shards.append((load + durations.get(path, 1.0), shard + [path]))
+    return [shard for _, shard in shards if shard]
+
+
+@traced("test_impact.run")
+def run_tests(
+    files: Sequence[str],
+    root: Union[str, Path] = ".",
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    extra_args: Sequence[str] = (),
+) -> Tuple[List[CaseResult], List[str], float]:
+    """Запускает модули в нескольких процессах pytest (по ядрам) и собирает результаты из JUnit XML.
+
+    Возвращает результаты тестов, модули упавших без отчета процессов и общее время.
+    """
+    root = Path(root).resolve()
+    if not files:
+        return [], [], 0.0
+    workers = workers or int(os.environ.get("TEST_IMPACT_WORKERS", "0")) or os.cpu_count() or 1
+    timeout = timeout or float(os.environ.get("TEST_IMPACT_TIMEOUT", "1200"))
+    durations_file = agent_cache_dir("test_impact") / "durations.json"
+    durations: Dict[str, float] = json.loads(durations_file.read_text(encoding="utf-8")) if durations_file.exists() else {}
+    shards = _shards(files, min(workers, len(files)), durations)
+    current_span().set("workers", len(shards))
+
+    def run_shard(shard: List[str]) -> Tuple[List[CaseResult], List[str]]:
+        with tempfile.TemporaryDirectory(prefix="test-impact-") as tmp:
+            report = Path(tmp) / "junit.xml"
+            command = [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", f"--junitxml={report}",
+                       "-o", "junit_family=xunit1", *extra_args, *shard]
+            try:
+                subprocess.run(command, cwd=root, capture_output=True, text=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                logger.error(f"Тесты не уложились в {timeout:.0f} с: {', '.join(shard)}")
+            if not report.exists():
+                return [], shard
+            return parse_junit(report.read_text(encoding="utf-8")), []
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        results = list(executor.map(run_shard, shards))
+    seconds = time.monotonic() - started
+
+    cases = [case for shard_cases, _ in results for case in shard_cases]
+    crashed = [path for _, shard_crashed in results for path in shard_crashed]
+    for path in files:
+        module = path[:-3].replace("/", ".")
+        spent = sum(c.seconds for c in cases if c.nodeid.startswith((module + "::", module + ".")))
+        if spent:
+            durations[path] = round(spent, 3)
+    durations_file.write_text(json.dumps(durations), encoding="utf-8")
+    current_span().add("tests", len(cases))
+    return cases, crashed, seconds
+
+
+def run_impacted_tests(changed: Sequence[str], root: Union[str, Path] = ".", workers: Optional[int] = None) -> ImpactReport:
+    """Строит граф (или берет из кэша), выбирает затронутые тесты и запускает их."""
+    graph = build_graph(root)
+    selected, reason = select_tests(graph, changed)
+    total = sum(1 for p in graph.imports if is_test_file(p))
+    logger.info(
+        f"Затронуто тестовых модулей: {len(selected)} из {total}"
+        + (f" (весь набор: {reason})" if reason else "")
+    )
+    report = ImpactReport(list(changed), selected, total, reason)
+    report.cases, report.crashed, report.seconds = run_tests(selected, root, workers)
+    return report
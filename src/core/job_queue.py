@@ -0,0 +1,148 @@
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ("solve", "review")
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    target: int
+    attempts: int
+    max_attempts: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.target}"
+
+
+class JobQueue:
+    """Очередь задач solve/review в SQLite, общая для процессов на одной машине.
+
+    Для одного ключа (kind:target) может существовать не больше одной ожидающей
+    задачи: повторные события (например, серия synchronize для одного PR)
+    схлопываются. Задача не выдается, пока задача с тем же ключом выполняется.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " target INTEGER NOT NULL,"
+            " key TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " max_attempts INTEGER NOT NULL,"
+            " run_after REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_pending_key ON jobs(key) WHERE status = 'pending'"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, run_after)")
+
+    def enqueue(self, kind: str, target: int, max_attempts: int = 3) -> Optional[int]:
+        """Добавляет задачу; возвращает None, если такая задача уже ожидает выполнения."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Неизвестный тип задачи: {kind}")
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, target, key, max_attempts, run_after, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, target, f"{kind}:{target}", max_attempts, now, now, now),
+            )
+        if cursor.rowcount == 0:
+            logger.info(f"Задача {kind}:{target} уже в очереди, дубликат пропущен")
+            return None
+        logger.info(f"Задача {kind}:{target} добавлена в очередь (id={cursor.lastrowid})")
+        return cursor.lastrowid
+
+    def claim(self) -> Optional[Job]:
+        """Атомарно берет самую старую готовую к запуску задачу."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, kind, target, attempts, max_attempts FROM jobs"
+                    " WHERE status = 'pending' AND run_after <= ?"
+                    " AND key NOT IN (SELECT key FROM jobs WHERE status = 'running')"
+                    " ORDER BY id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (now, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Job(id=row[0], kind=row[1], target=row[2], attempts=row[3] + 1, max_attempts=row[4])
+
+    def complete(self, job: Job) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', error = NULL, updated_at = ? WHERE id = ?", (time.time(), job.id)
+            )
+
+    def fail(self, job: Job, error: str, retry_delay: float) -> bool:
+        """Помечает попытку неудачной. Возвращает True, если задача будет повторена."""
+        now = time.time()
+        with self._lock:
+            if job.attempts >= job.max_attempts:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?", (error, now, job.id)
+                )
+                return False
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'pending', error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                    (error, now + retry_delay, now, job.id),
+                )
+            except sqlite3.IntegrityError:
+                # Пока задача выполнялась, пришло новое событие для того же ключа — повторит оно
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'superseded', error = ?, updated_at = ? WHERE id = ?", (error, now, job.id)
+                )
+        return True
+
+    def requeue_running(self) -> int:
+        """Возвращает в очередь задачи, оставшиеся в running после аварийной остановки."""
+        now = time.time()
+        requeued = 0
+        with self._lock:
+            for job_id, key in self._conn.execute("SELECT id, key FROM jobs WHERE status = 'running'").fetchall():
+                try:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'pending', run_after = ?, updated_at = ? WHERE id = ?",
+                        (now, now, job_id),
+                    )
+                    requeued += 1
+                except sqlite3.IntegrityError:
+                    self._conn.execute("UPDATE jobs SET status = 'superseded' WHERE id = ?", (job_id,))
+        return requeued
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
@@ -1,35 +1,137 @@
+import copy
 import os
 import time
+import asyncio
 import logging
+import threading
 import requests
 import json
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from core.http_pool import get_shared_session
+from core.llm_cache import ResponseCache
+from core.paths import agent_cache_dir
+from core.resilience import (
+    RETRYABLE_STATUSES,
+    FatalLLMError,
+    Hedger,
+    RetryableLLMError,
+    classify_exception,
+    full_jitter,
+    get_policy,
+    parse_retry_after,
+)
+from core.tracing import Span, current_span, record_usage, span
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_LLM_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+DEFAULT_SYSTEM_ROLE = "Ты — Python разработчик."
+
+_cache_lock = threading.Lock()
+_shared_cache: Optional[ResponseCache] = None
+
+
+def get_shared_cache() -> ResponseCache:
+    """Возвращает общий для процесса кэш ответов (LLM_CACHE_TTL сек., LLM_CACHE_MAX_MB)."""
+    global _shared_cache
+    with _cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache(
+                agent_cache_dir() / "llm_responses.sqlite",
+                ttl_seconds=float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+                max_bytes=int(os.environ.get("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024,
+            )
+        return _shared_cache
+
+
 class LLMClient:
-    def __init__(self):
-        self.api_key = os.environ.get("YANDEX_API_KEY")
-        self.folder_id = os.environ.get("YANDEX_FOLDER_ID")
-        
-        if not self.api_key or not self.folder_id:
-            raise ValueError("Проверьте YANDEX_API_KEY и YANDEX_FOLDER_ID в .env")
+    """Клиент YandexGPT с ретраями, кэшем и потоковым режимом.
+
+    Протокол конкретного API сосредоточен в четырех методах — _configure_backend,
+    _build_payload, _parse_completion и _iter_deltas; другой бэкенд
+    (см. OpenAICompatibleClient) переопределяет только их.
+    """
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        model_name: Optional[str] = None,
+    ):
+        self._configure_backend(model_name)
 
-        self.model_name = os.environ.get("YANDEX_MODEL", "yandexgpt")
         self.temperature = float(os.environ.get("LLM_TEMPERATURE", "0.3"))
         self.max_tokens = int(os.environ.get("LLM_MAX_TOKENS", "2000"))
-        
+
         self.retries = int(os.environ.get("LLM_RETRIES", "3"))
         self.timeout = int(os.environ.get("LLM_TIMEOUT", "60"))
-        self.url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+        self.backoff_base = float(os.environ.get("LLM_BACKOFF_BASE", "1"))
+        self.backoff_max = float(os.environ.get("LLM_BACKOFF_MAX", "30"))
+        # Хеджирование задает ModelRouter для выбранных уровней моделей
+        self.hedger: Optional[Hedger] = None
+
+        self.session = session or get_shared_session()
+        # Лимит частоты и circuit breaker общие для всех клиентов процесса с этим URL
+        self.policy = get_policy(self.url)
+
+        # LLM_CACHE: auto — кэшировать только детерминированные запросы (temperature 0),
+        # always — кэшировать всегда, off — не кэшировать
+        self.cache_mode = os.environ.get("LLM_CACHE", "auto").lower()
+        self.cache = cache
+        if self.cache is None and self._cacheable():
+            self.cache = get_shared_cache()
+
+    def _configure_backend(self, model_name: Optional[str]) -> None:
+        """Адрес, модель и заголовки запросов; всё, что не меняется между запросами, собираем один раз."""
+        self.api_key = os.environ.get("YANDEX_API_KEY")
+        self.folder_id = os.environ.get("YANDEX_FOLDER_ID")
+
+        if not self.api_key or not self.folder_id:
+            raise ValueError("Проверьте YANDEX_API_KEY и YANDEX_FOLDER_ID в .env")
+
+        self.model_name = model_name or os.environ.get("YANDEX_MODEL", "yandexgpt")
+        self.url = os.environ.get("YANDEX_LLM_URL", DEFAULT_LLM_URL)
+        self.model_uri = f"gpt://{self.folder_id}/{self.model_name}/latest"
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Api-Key {self.api_key}",
+            "x-folder-id": self.folder_id
+        }
+
+    def for_task(self, task: str) -> "LLMClient":
+        """Клиент для типа промпта; у одиночного клиента — он сам (уровни моделей — в ModelRouter)."""
+        return self
+
+    def with_temperature(self, temperature: float) -> "LLMClient":
+        """Клиент с другой температурой; сессия, кэш, хеджирование и политика устойчивости общие.
+
+        Клиент с температурой 0 (LLM_CACHE=auto) кэширует ответы в общем кэше,
+        даже если исходный клиент создавался без кэша.
+        """
+        if temperature == self.temperature:
+            return self
+        clone = copy.copy(self)
+        clone.temperature = temperature
+        if clone.cache is None and clone._cacheable():
+            clone.cache = get_shared_cache()
+        return clone
 
-    def get_response(self, prompt: str, system_role: str = "Ты — Python разработчик.") -> str:
-        model_uri = f"gpt://{self.folder_id}/{self.model_name}/latest"
-        
-        payload = {
-            "modelUri": model_uri,
+    def _cacheable(self) -> bool:
+        if self.cache_mode == "always":
+            return True
+        return self.cache_mode == "auto" and self.temperature == 0
+
+    def _cache_key(self, prompt: str, system_role: str) -> Optional[str]:
+        if self.cache is None or not self._cacheable():
+            return None
+        return ResponseCache.make_key(self.model_uri, self.temperature, self.max_tokens, system_role, prompt)
+
+    def _build_payload(self, prompt: str, system_role: str, stream: bool = False) -> Dict[str, Any]:
+        return {
+            "modelUri": self.model_uri,
             "completionOptions": {
-                "stream": False,
+                "stream": stream,
                 "temperature": self.temperature,
                 "maxTokens": str(self.max_tokens)
             },
@@ -39,38 +141,341 @@ class LLMClient:
             ]
         }
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Api-Key {self.api_key}",
-            "x-folder-id": self.folder_id
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full jitter: случайная пауза в [0, min(max, base * 2^attempt)]."""
+        return full_jitter(attempt, self.backoff_base, self.backoff_max)
+
+    def _check_status(self, response: requests.Response) -> None:
+        """Классифицирует неуспешный ответ: RetryableLLMError (429/5xx) или FatalLLMError (4xx)."""
+        if response.status_code == 200:
+            return
+        try:
+            error_data = response.json()
+            error_msg = error_data.get('message') or error_data.get('error', {}).get('message') or response.text
+        except (ValueError, AttributeError):
+            # Страница ошибки балансировщика вместо JSON
+            error_msg = response.text[:500]
+        logger.error(f"Yandex API Error {response.status_code}: {error_msg}")
+
+        if response.status_code in RETRYABLE_STATUSES:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            raise RetryableLLMError(f"HTTP {response.status_code}: {error_msg}", response.status_code, retry_after)
+        if response.status_code == 400:
+            raise FatalLLMError(f"Ошибка в параметрах запроса: {error_msg}", response.status_code)
+        raise FatalLLMError(f"HTTP {response.status_code}: {error_msg}", response.status_code)
+
+    def _handle_error(self, error: Exception, attempt: int) -> Optional[float]:
+        """Учитывает ошибку попытки; возвращает паузу перед повтором или None, если повторять нельзя."""
+        classified = classify_exception(error)
+        self.policy.on_error(classified)
+        if isinstance(classified, FatalLLMError) or attempt >= self.retries:
+            return None
+        delay = self.policy.retry_delay(classified, attempt, self.backoff_base, self.backoff_max)
+        logger.warning(f"LLM: {classified} — повтор {attempt}/{self.retries - 1} через {delay:.1f} с")
+        return delay
+
+    @staticmethod
+    def _raise_classified(error: Exception) -> None:
+        classified = classify_exception(error)
+        if classified is error:
+            raise error
+        raise classified from error
+
+    def resilience_metrics(self) -> Dict[str, Any]:
+        """Состояние circuit breaker, ожидания лимита частоты, повторы и ошибки по эндпоинту."""
+        return self.policy.metrics()
+
+    def _request_once(self, payload: Dict[str, Any]) -> str:
+        response = self.session.post(
+            self.url,
+            headers=self.headers,
+            json=payload,
+            timeout=self.timeout
+        )
+        self._check_status(response)
+
+        text, usage = self._parse_completion(response.json())
+        record_usage(usage)
+        return text
+
+    def _parse_completion(self, result: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        return result['result']['alternatives'][0]['message']['text'], result['result'].get('usage')
+
+    def _stream_once(self, payload: Dict[str, Any], trace: Optional[Span] = None) -> Iterator[str]:
+        with self.session.post(
+            self.url,
+            headers=self.headers,
+            json=payload,
+            timeout=self.timeout,
+            stream=True
+        ) as response:
+            self._check_status(response)
+            yield from self._iter_deltas(response, trace)
+
+    def _iter_deltas(self, response: requests.Response, trace: Optional[Span] = None) -> Iterator[str]:
+        """Читает потоковый ответ построчно и отдает только новые фрагменты текста.
+
+        Yandex присылает по JSON-объекту на строку, и в каждом лежит весь текст,
+        сгенерированный к этому моменту, поэтому храним только предыдущий вариант.
+        """
+        previous = ""
+        usage = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            chunk = json.loads(line)
+            text = chunk['result']['alternatives'][0]['message']['text']
+            usage = chunk['result'].get('usage')
+            if text.startswith(previous):
+                delta = text[len(previous):]
+            else:
+                delta = text
+            previous = text
+            if delta:
+                yield delta
+        # usage в каждом фрагменте накопительный, учитываем последний
+        record_usage(usage, trace)
+
+    def stream_response(self, prompt: str, system_role: str = DEFAULT_SYSTEM_ROLE) -> Iterator[str]:
+        """Потоковая генерация: отдает фрагменты ответа по мере их поступления.
+
+        Повторные попытки делаются только до первого полученного фрагмента.
+        """
+        cache_key = self._cache_key(prompt, system_role)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Ответ LLM взят из кэша.")
+                yield cached
+                return
+
+        payload = self._build_payload(prompt, system_role, stream=True)
+        parts: List[str] = []
+
+        # Span не делается текущим: между yield управление у вызывающего кода
+        with span("llm.stream", activate=False, model=self.model_name) as trace:
+            trace.add("prompt_chars", len(prompt) + len(system_role))
+            attempt = 0
+            while True:
+                wait = self.policy.before_attempt()
+                if wait:
+                    trace.add("rate_limit_wait_s", wait)
+                    time.sleep(wait)
+                started = False
+                try:
+                    for delta in self._stream_once(payload, trace):
+                        if not started:
+                            trace.set("first_chunk_s", round(trace.duration, 3))
+                            self.policy.on_success()
+                        started = True
+                        trace.add("response_chars", len(delta))
+                        if cache_key:
+                            parts.append(delta)
+                        yield delta
+                    if not started:
+                        self.policy.on_success()
+                    if cache_key:
+                        self.cache.set(cache_key, "".join(parts))
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    attempt += 1
+                    delay = self._handle_error(e, attempt)
+                    if delay is None:
+                        self._raise_classified(e)
+                    trace.add("retries")
+                    time.sleep(delay)
+
+    def get_response(self, prompt: str, system_role: str = DEFAULT_SYSTEM_ROLE) -> str:
+        if self.hedger is not None:
+            return self.hedger.call(lambda: self._get_response(prompt, system_role))
+        return self._get_response(prompt, system_role)
+
+    def _get_response(self, prompt: str, system_role: str) -> str:
+        cache_key = self._cache_key(prompt, system_role)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Ответ LLM взят из кэша.")
+                current_span().add("llm.cache_hits")
+                return cached
+
+        payload = self._build_payload(prompt, system_role)
+
+        with span("llm.get_response", model=self.model_name) as trace:
+            trace.add("prompt_chars", len(prompt) + len(system_role))
+            attempt = 0
+            while True:
+                wait = self.policy.before_attempt()
+                if wait:
+                    trace.add("rate_limit_wait_s", wait)
+                    time.sleep(wait)
+                try:
+                    text = self._request_once(payload)
+                except Exception as e:
+                    attempt += 1
+                    delay = self._handle_error(e, attempt)
+                    if delay is None:
+                        self._raise_classified(e)
+                    trace.add("retries")
+                    time.sleep(delay)
+                    continue
+                self.policy.on_success()
+                trace.add("response_chars", len(text))
+                if cache_key:
+                    self.cache.set(cache_key, text)
+                return text
+
+
+class AsyncLLMClient(LLMClient):
+    """asyncio-версия клиента с теми же настройками ретраев, бэкоффа и таймаутов.
+
+    HTTP-запрос выполняется в пуле потоков через общий Session, а паузы между
+    попытками — через asyncio.sleep, поэтому бэкофф не блокирует процесс.
+    """
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        max_concurrency: Optional[int] = None,
+        model_name: Optional[str] = None,
+    ):
+        super().__init__(session, cache, model_name)
+        self.max_concurrency = max_concurrency or int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+
+    async def aget_response(self, prompt: str, system_role: str = DEFAULT_SYSTEM_ROLE) -> str:
+        if self.hedger is not None:
+            return await self.hedger.acall(lambda: self._get_response(prompt, system_role))
+        return await self._aget_response(prompt, system_role)
+
+    async def _aget_response(self, prompt: str, system_role: str) -> str:
+        cache_key = self._cache_key(prompt, system_role)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Ответ LLM взят из кэша.")
+                current_span().add("llm.cache_hits")
+                return cached
+
+        payload = self._build_payload(prompt, system_role)
+
+        with span("llm.aget_response", model=self.model_name) as trace:
+            trace.add("prompt_chars", len(prompt) + len(system_role))
+            attempt = 0
+            while True:
+                wait = self.policy.before_attempt()
+                if wait:
+                    trace.add("rate_limit_wait_s", wait)
+                    await asyncio.sleep(wait)
+                try:
+                    text = await asyncio.to_thread(self._request_once, payload)
+                except Exception as e:
+                    attempt += 1
+                    delay = self._handle_error(e, attempt)
+                    if delay is None:
+                        self._raise_classified(e)
+                    trace.add("retries")
+                    await asyncio.sleep(delay)
+                    continue
+                self.policy.on_success()
+                trace.add("response_chars", len(text))
+                if cache_key:
+                    self.cache.set(cache_key, text)
+                return text
+
+    async def gather_responses(
+        self,
+        prompts: Sequence[str],
+        system_role: str = DEFAULT_SYSTEM_ROLE,
+        max_concurrency: Optional[int] = None,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """Отправляет промпты параллельно, не более max_concurrency одновременно.
+
+        Ответы возвращаются в порядке промптов.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def _bounded(prompt: str) -> str:
+            async with semaphore:
+                return await self.aget_response(prompt, system_role)
+
+        return list(await asyncio.gather(
+            *(_bounded(prompt) for prompt in prompts),
+            return_exceptions=return_exceptions,
+        ))
+
+    def get_responses(
+        self,
+        prompts: Sequence[str],
+        system_role: str = DEFAULT_SYSTEM_ROLE,
+        max_concurrency: Optional[int] = None,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """Синхронная точка входа в gather_responses для агентов."""
+        return asyncio.run(self.gather_responses(prompts, system_role, max_concurrency, return_exceptions))
+
+
+class OpenAICompatibleClient(AsyncLLMClient):
+    """Бэкенд для OpenAI-совместимого API /chat/completions (OpenAI, vLLM, Ollama, локальные заглушки).
+
+    OPENAI_BASE_URL — адрес до /v1, OPENAI_API_KEY — ключ (локальным серверам
+    не нужен), OPENAI_MODEL — модель по умолчанию.
+    """
+
+    def _configure_backend(self, model_name: Optional[str]) -> None:
+        self.api_key = os.environ.get("OPENAI_API_KEY", "")
+        self.folder_id = None
+        self.model_name = model_name or os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+        self.url = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/") + "/chat/completions"
+        self.model_uri = f"{self.url}#{self.model_name}"
+        self.headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            self.headers["Authorization"] = f"Bearer {self.api_key}"
+
+    def _build_payload(self, prompt: str, system_role: str, stream: bool = False) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "stream": stream,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "messages": [
+                {"role": "system", "content": system_role},
+                {"role": "user", "content": prompt}
+            ]
+        }
+
+    @staticmethod
+    def _usage(usage: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # Приводим к полям YandexGPT, которые понимает record_usage
+        if not usage:
+            return None
+        return {
+            "inputTextTokens": usage.get("prompt_tokens", 0),
+            "completionTokens": usage.get("completion_tokens", 0),
+            "totalTokens": usage.get("total_tokens", 0),
         }
 
-        attempt = 0
-        while attempt < self.retries:
-            try:
-                response = requests.post(
-                    self.url,
-                    headers=headers,
-                    json=payload,
-                    timeout=self.timeout
-                )
-                
-                if response.status_code != 200:
-                    error_data = response.json()
-                    error_msg = error_data.get('message', response.text)
-                    logger.error(f"Yandex API Error {response.status_code}: {error_msg}")
-                    
-                    if response.status_code == 400:
-                        raise ValueError(f"Ошибка в параметрах запроса: {error_msg}")
-                    
-                    response.raise_for_status()
-
-                result = response.json()
-                return result['result']['alternatives'][0]['message']['text']
-
-            except Exception as e:
-                attempt += 1
-                if attempt == self.retries:
-                    raise e
-                time.sleep(2 ** attempt)
-        return ""
\ No newline at end of file
+    def _parse_completion(self, result: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        return result['choices'][0]['message']['content'] or "", self._usage(result.get('usage'))
+
+    def _iter_deltas(self, response: requests.Response, trace: Optional[Span] = None) -> Iterator[str]:
+        """Server-sent events: строки `data: {...}` с приращением текста, в конце `data: [DONE]`."""
+        # SSE всегда в UTF-8, а для text/event-stream без charset requests выбрал бы ISO-8859-1
+        response.encoding = "utf-8"
+        usage = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get('usage') or usage
+            for choice in chunk.get('choices', []):
+                delta = (choice.get('delta') or {}).get('content')
+                if delta:
+                    yield delta
+        record_usage(self._usage(usage), trace)
@@ -0,0 +1,107 @@
+import logging
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple, Type
+
+import requests
+
+from core.llm_cache import ResponseCache
+from core.llm_client import AsyncLLMClient, OpenAICompatibleClient
+from core.resilience import Hedger
+
+logger = logging.getLogger(__name__)
+
+# Типы промптов агентов
+TASK_GENERATE = "generate"
+TASK_REVIEW_CHUNK = "review-chunk"
+TASK_REDUCE = "reduce"
+TASK_SUMMARIZE = "summarize"
+TASKS = (TASK_GENERATE, TASK_REVIEW_CHUNK, TASK_REDUCE, TASK_SUMMARIZE)
+
+BACKENDS: Dict[str, Type[AsyncLLMClient]] = {
+    "yandex": AsyncLLMClient,
+    "openai": OpenAICompatibleClient,
+}
+
+# Дешевые массовые промпты по умолчанию идут в lite-модель; остальное — в модель бэкенда по умолчанию
+DEFAULT_TIERS: Dict[str, Dict[str, str]] = {
+    "yandex": {TASK_REVIEW_CHUNK: "yandexgpt-lite", TASK_SUMMARIZE: "yandexgpt-lite"},
+}
+
+
+def register_backend(name: str, client_cls: Type[AsyncLLMClient]) -> None:
+    """Подключает бэкенд: подкласс AsyncLLMClient со своими _configure_backend, _build_payload,
+    _parse_completion и _iter_deltas."""
+    BACKENDS[name] = client_cls
+
+
+class ModelRouter:
+    """Выбирает клиента LLM по типу промпта (generate, review-chunk, reduce, summarize).
+
+    Клиенты создаются при первом обращении и переиспользуются: задачи с одной
+    моделью делят один клиент. Для задач из hedge_tasks ("all" — для всех)
+    включается хеджирование запросов. Обращения к атрибутам, которых у роутера
+    нет (get_response, model_name, ...), уходят клиенту задачи generate.
+    """
+
+    def __init__(
+        self,
+        backend: str = "yandex",
+        tiers: Optional[Dict[str, str]] = None,
+        hedge_tasks: Sequence[str] = (),
+        hedge_after: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд LLM: {backend} (доступны: {', '.join(BACKENDS)})")
+        unknown = set(tiers or {}) - set(TASKS)
+        if unknown:
+            raise ValueError(f"Неизвестные типы промптов в LLM_MODEL_TIERS: {', '.join(sorted(unknown))}")
+        self.backend = backend
+        self.tiers = {**DEFAULT_TIERS.get(backend, {}), **(tiers or {})}
+        self.hedge_tasks = set(TASKS) if "all" in hedge_tasks else set(hedge_tasks)
+        self.hedge_after = hedge_after
+        self.session = session
+        self.cache = cache
+        self._clients: Dict[Tuple[Optional[str], bool], AsyncLLMClient] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, **kwargs: Any) -> "ModelRouter":
+        return cls(
+            backend=config.llm_backend,
+            tiers=config.model_tiers,
+            hedge_tasks=config.hedge_tasks,
+            hedge_after=config.hedge_after,
+            **kwargs,
+        )
+
+    def for_task(self, task: str) -> AsyncLLMClient:
+        if task not in TASKS:
+            raise ValueError(f"Неизвестный тип промпта: {task}")
+        model = self.tiers.get(task)
+        hedged = task in self.hedge_tasks
+        with self._lock:
+            key = (model, hedged)
+            if key not in self._clients:
+                client = BACKENDS[self.backend](session=self.session, cache=self.cache, model_name=model)
+                if hedged:
+                    client.hedger = Hedger(delay=self.hedge_after)
+                self._clients[key] = client
+                logger.info(f"LLM для '{task}': {self.backend}/{client.model_name}{' (хеджирование)' if hedged else ''}")
+            return self._clients[key]
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Метрики устойчивости и хеджирования по созданным клиентам."""
+        with self._lock:
+            clients = list(self._clients.items())
+        result = {}
+        for (_, hedged), client in clients:
+            name = f"{client.model_name}{'+hedge' if hedged else ''}"
+            result[name] = {**client.resilience_metrics(), **(client.hedger.metrics() if client.hedger else {})}
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.for_task(TASK_GENERATE), name)
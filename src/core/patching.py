@@ -0,0 +1,160 @@
+import ast
+import difflib
+import json
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FUZZY_THRESHOLD = 0.85
+
+
+class PatchError(ValueError):
+    """Правку не удалось однозначно применить к файлу или результат не прошел проверку."""
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _indent(line: str) -> str:
+    return line[: len(line) - len(line.lstrip())]
+
+
+def _first_code_line(lines: Sequence[str]) -> Optional[str]:
+    return next((line for line in lines if line.strip()), None)
+
+
+def _reindent(replace: str, found_lines: Sequence[str], search_lines: Sequence[str]) -> str:
+    """Сдвигает отступ replace так же, как найденный фрагмент сдвинут относительно search."""
+    found, wanted = _first_code_line(found_lines), _first_code_line(search_lines)
+    if found is None or wanted is None:
+        return replace
+    have, expected = _indent(found), _indent(wanted)
+    if have == expected:
+        return replace
+
+    shifted = []
+    for line in replace.splitlines(keepends=True):
+        if not line.strip():
+            shifted.append(line)
+        elif line.startswith(expected):
+            shifted.append(have + line[len(expected):])
+        else:
+            shifted.append(have + line.lstrip(" \t"))
+    return "".join(shifted)
+
+
+def _locate_lines(lines: List[str], search_lines: List[str], threshold: float) -> Tuple[int, str]:
+    """Ищет окно строк, совпадающее с search без учета пробелов, а затем приблизительно."""
+    size = len(search_lines)
+    wanted = [_normalize(line) for line in search_lines]
+    normalized = [_normalize(line) for line in lines]
+
+    exact = [i for i in range(len(lines) - size + 1) if normalized[i:i + size] == wanted]
+    if len(exact) == 1:
+        return exact[0], "whitespace"
+    if len(exact) > 1:
+        raise PatchError(f"фрагмент встречается {len(exact)} раз, нужен более уникальный контекст")
+
+    target = "\n".join(wanted)
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(target)
+    best: List[Tuple[float, int]] = []
+    for i in range(len(lines) - size + 1):
+        matcher.set_seq1("\n".join(normalized[i:i + size]))
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            continue
+        ratio = matcher.ratio()
+        if ratio >= threshold:
+            best.append((ratio, i))
+    if not best:
+        raise PatchError("фрагмент не найден в файле")
+    best.sort(reverse=True)
+    if len(best) > 1 and best[0][0] - best[1][0] < 0.02 and abs(best[0][1] - best[1][1]) >= size:
+        raise PatchError("фрагмент приблизительно совпадает с несколькими местами файла")
+    return best[0][1], f"fuzzy {best[0][0]:.2f}"
+
+
+def apply_edit(text: str, search: str, replace: str, threshold: float = DEFAULT_FUZZY_THRESHOLD) -> str:
+    """Заменяет search на replace: точное совпадение, затем без учета пробелов, затем приблизительное."""
+    if not search.strip():
+        raise PatchError("пустой search")
+    count = text.count(search)
+    if count == 1:
+        return text.replace(search, replace, 1)
+    if count > 1:
+        raise PatchError(f"фрагмент встречается {count} раз, нужен более уникальный контекст")
+
+    lines = text.splitlines(keepends=True)
+    search_lines = search.strip("\n").splitlines()
+    start, method = _locate_lines(lines, search_lines, threshold)
+    found = lines[start:start + len(search_lines)]
+    logger.info(f"Правка применена с сопоставлением: {method} (строка {start + 1})")
+
+    replacement = _reindent(replace.strip("\n"), found, search_lines)
+    if replacement and found and found[-1].endswith("\n"):
+        replacement += "\n"
+    return "".join(lines[:start]) + replacement + "".join(lines[start + len(search_lines):])
+
+
+def apply_edits(text: str, edits: Sequence[Dict[str, str]], threshold: float = DEFAULT_FUZZY_THRESHOLD) -> str:
+    """Последовательно применяет список правок {"search", "replace"}."""
+    for number, edit in enumerate(edits, start=1):
+        try:
+            text = apply_edit(text, edit["search"], edit.get("replace", ""), threshold)
+        except KeyError:
+            raise PatchError(f"правка {number}: нет поля search")
+        except PatchError as e:
+            raise PatchError(f"правка {number}: {e}") from e
+    return text
+
+
+def hunks_to_edits(diff: str) -> List[Dict[str, str]]:
+    """Преобразует hunk-и unified diff в правки search/replace (номера строк не используются)."""
+    edits: List[Dict[str, str]] = []
+    search: List[str] = []
+    replace: List[str] = []
+
+    def flush() -> None:
+        if search or replace:
+            edits.append({"search": "\n".join(search), "replace": "\n".join(replace)})
+        search.clear()
+        replace.clear()
+
+    lines = diff.splitlines()
+    in_hunk = False
+    for i, line in enumerate(lines):
+        # Внутри hunk-а "---"/"+++" — удаленная или добавленная строка ("-- комментарий", "++i");
+        # заголовком файла считается только пара "--- "/"+++ " или строка diff
+        next_file = line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ ")
+        if line.startswith("diff ") or next_file:
+            in_hunk = False
+        if line.startswith("\\") or (not in_hunk and line.startswith(("---", "+++", "diff ", "index "))):
+            continue
+        if line.startswith("@@"):
+            flush()
+            in_hunk = True
+        elif line.startswith("-"):
+            search.append(line[1:])
+        elif line.startswith("+"):
+            replace.append(line[1:])
+        else:
+            context = line[1:] if line.startswith(" ") else line
+            search.append(context)
+            replace.append(context)
+    flush()
+    return edits
+
+
+def verify_source(path: str, text: str) -> None:
+    """Проверяет, что результат правки разбирается (Python и JSON)."""
+    try:
+        if path.endswith(".py"):
+            ast.parse(text, filename=path)
+        elif path.endswith(".json"):
+            json.loads(text)
+    except SyntaxError as e:
+        raise PatchError(f"после правки файл не компилируется: {e.msg} (строка {e.lineno})") from e
+    except ValueError as e:
+        raise PatchError(f"после правки файл не разбирается: {e}") from e
@@ -0,0 +1,14 @@
+import os
+from pathlib import Path
+
+
+def agent_cache_dir(*parts: str) -> Path:
+    """Каталог для персистентных кэшей агента (вне рабочего дерева репозитория).
+
+    По умолчанию ~/.cache/coding-agent, переопределяется через AGENT_CACHE_DIR.
+    В CI этот каталог восстанавливается через actions/cache.
+    """
+    base = os.environ.get("AGENT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "coding-agent")
+    path = Path(base).joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
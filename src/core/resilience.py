@@ -0,0 +1,371 @@
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 408 и 409 у облачных API означают конфликт/таймаут на их стороне — их тоже повторяем
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    """Ошибка запроса к LLM после классификации."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class FatalLLMError(LLMError, ValueError):
+    """Повтор не поможет: неверные параметры, авторизация, квота (4xx, кроме 408/409/425/429)."""
+
+
+class RetryableLLMError(LLMError):
+    """Временная ошибка: 429, 5xx, таймаут, обрыв соединения. retry_after — подсказка сервера."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message, status)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMError):
+    """Эндпоинт недоступен: circuit breaker открыт, запрос не отправлялся."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах или HTTP-дате."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_exception(error: Exception) -> LLMError:
+    """Приводит исключение транспорта к FatalLLMError/RetryableLLMError."""
+    if isinstance(error, LLMError):
+        return error
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return RetryableLLMError(f"Сетевая ошибка: {error}")
+    if isinstance(error, ValueError):
+        # Битый JSON в ответе 200 — как правило, оборванный ответ
+        return RetryableLLMError(f"Некорректный ответ: {error}")
+    return FatalLLMError(f"{type(error).__name__}: {error}")
+
+
+def full_jitter(attempt: int, base: float, cap: float) -> float:
+    """Full jitter: случайная пауза в [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов на процесс: rate токенов в секунду, запас capacity.
+
+    reserve() сразу списывает токен и возвращает, сколько нужно подождать, —
+    ждать вызывающий код может как time.sleep, так и asyncio.sleep.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    """closed -> open после failure_threshold подряд временных ошибок; через reset_timeout
+    один пробный запрос (half_open): успех закрывает цепь, ошибка снова открывает."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f"LLM недоступен, circuit breaker открыт (повтор через {retry_in:.0f} с)")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit breaker LLM закрыт: эндпоинт снова отвечает")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                if self.state == self.CLOSED:
+                    logger.warning(f"Circuit breaker LLM открыт после {self.failures} ошибок подряд")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.opens += 1
+                self._probe_in_flight = False
+
+
+class ResiliencePolicy:
+    """Общие для процесса правила обращения к одному эндпоинту: лимит частоты,
+    circuit breaker, пауза перед повтором и счетчики для метрик."""
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+        max_retry_after: Optional[float] = None,
+    ):
+        rate = rate if rate is not None else float(os.environ.get("LLM_RATE_LIMIT", "0"))
+        burst = burst if burst is not None else float(os.environ.get("LLM_RATE_BURST", "0")) or None
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(
+            failure_threshold if failure_threshold is not None else int(os.environ.get("LLM_BREAKER_THRESHOLD", "5")),
+            reset_timeout if reset_timeout is not None else float(os.environ.get("LLM_BREAKER_RESET", "30")),
+        )
+        self.max_retry_after = (
+            max_retry_after if max_retry_after is not None else float(os.environ.get("LLM_MAX_RETRY_AFTER", "60"))
+        )
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "retries": 0,
+            "retryable_errors": 0,
+            "fatal_errors": 0,
+            "short_circuited": 0,
+            "rate_limited_waits": 0,
+            "rate_limited_seconds": 0.0,
+        }
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def before_attempt(self) -> float:
+        """Проверяет breaker (CircuitOpenError) и возвращает паузу по лимиту частоты."""
+        try:
+            self.breaker.allow()
+        except CircuitOpenError:
+            self.count("short_circuited")
+            raise
+        self.count("calls")
+        wait = self.bucket.reserve()
+        if wait > 0:
+            self.count("rate_limited_waits")
+            self.count("rate_limited_seconds", wait)
+        return wait
+
+    def on_success(self) -> None:
+        self.count("successes")
+        self.breaker.record_success()
+
+    def on_error(self, error: LLMError) -> None:
+        if isinstance(error, RetryableLLMError):
+            self.count("retryable_errors")
+            self.breaker.record_failure()
+        elif not isinstance(error, CircuitOpenError):
+            self.count("fatal_errors")
+            # 4xx не говорит о недоступности эндпоинта: эндпоинт ответил, пробный запрос завершен
+            if self.breaker.state == CircuitBreaker.HALF_OPEN:
+                self.breaker.record_success()
+
+    def retry_delay(self, error: LLMError, attempt: int, base: float, cap: float) -> float:
+        self.count("retries")
+        hint = getattr(error, "retry_after", None)
+        if hint is not None:
+            return min(hint, self.max_retry_after)
+        return full_jitter(attempt, base, cap)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics: Dict[str, Any] = dict(self.counters)
+        metrics["rate_limited_seconds"] = round(metrics["rate_limited_seconds"], 3)
+        metrics.update({
+            "breaker_state": self.breaker.state,
+            "breaker_failures": self.breaker.failures,
+            "breaker_opens": self.breaker.opens,
+        })
+        return metrics
+
+
+class Hedger:
+    """Хеджирование хвостовой задержки: если ответ не пришел за порог, отправляется
+    дубликат запроса и берется тот ответ, что придет первым.
+
+    Порог — квантиль quantile последних успешных задержек (после min_samples
+    замеров), до этого — delay; без delay хеджирование включается только
+    после накопления статистики. Проигравший запрос не прерывается: его
+    ответ просто отбрасывается.
+    """
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 200,
+        max_workers: int = 16,
+    ):
+        self.delay = delay
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._max_workers = max_workers
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def threshold(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.delay
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+
+    def _timed(self, func: Callable[[], T]) -> T:
+        started = time.monotonic()
+        result = func()
+        self.record(time.monotonic() - started)
+        return result
+
+    def _submit(self, func: Callable[[], T]) -> "Future[T]":
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix="llm-hedge")
+        # Копия контекста: span-ы запросов остаются дочерними для вызывающего кода
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._timed, func)
+
+    def _count(self, hedge_won: bool = False) -> None:
+        with self._lock:
+            if hedge_won:
+                self.hedge_wins += 1
+            else:
+                self.hedges += 1
+
+    def call(self, func: Callable[[], T]) -> T:
+        threshold = self.threshold()
+        if threshold is None:
+            return self._timed(func)
+        primary = self._submit(func)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+
+        logger.info(f"LLM не ответил за {threshold:.2f} с, отправлен дублирующий запрос")
+        self._count()
+        hedge = self._submit(func)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count(hedge_won=True)
+                    return future.result()
+                error = future.exception()
+        if error is None:
+            raise RuntimeError("Ни основной, ни дублирующий запрос не вернули ни результата, ни ошибки")
+        raise error
+
+    async def acall(self, func: Callable[[], T]) -> T:
+        """asyncio-версия call. Запросы идут в собственный пул потоков, а не в пул цикла
+        событий по умолчанию: asyncio.run при выходе не ждет проигравший запрос."""
+        threshold = self.threshold()
+        primary = asyncio.wrap_future(self._submit(func))
+        if threshold is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            return primary.result()
+
+        logger.info(f"LLM не ответил за {threshold:.2f} с, отправлен дублирующий запрос")
+        self._count()
+        hedge = asyncio.wrap_future(self._submit(func))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count(hedge_won=True)
+                    return future.result()
+                error = future.exception()
+        if error is None:
+            raise RuntimeError("Ни основной, ни дублирующий запрос не вернули ни результата, ни ошибки")
+        raise error
+
+    def metrics(self) -> Dict[str, Any]:
+        threshold = self.threshold()
+        with self._lock:
+            return {
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedge_threshold_s": round(threshold, 3) if threshold is not None else None,
+                "latency_samples": len(self._latencies),
+            }
+
+
+_policies_lock = threading.Lock()
+_policies: Dict[str, ResiliencePolicy] = {}
+
+
+def get_policy(endpoint: str) -> ResiliencePolicy:
+    """Политика, общая для всех клиентов процесса, обращающихся к endpoint."""
+    with _policies_lock:
+        if endpoint not in _policies:
+            _policies[endpoint] = ResiliencePolicy()
+        return _policies[endpoint]
@@ -0,0 +1,57 @@
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+from core.paths import agent_cache_dir
+
+logger = logging.getLogger(__name__)
+
+
+def same_blob(a: Optional[str], b: Optional[str]) -> bool:
+    """Сравнивает blob SHA, допуская сокращенную запись одного из них (как в `index abc..def`)."""
+    if not a or not b:
+        return False
+    n = min(len(a), len(b))
+    return n >= 7 and a[:n] == b[:n]
+
+
+class ReviewStateStore:
+    """Состояние ревью PR между запусками: blob SHA и замечания по каждому файлу.
+
+    Хранится в JSON-файле на PR в каталоге кэша агента:
+    {"files": {path: {"sha": ..., "findings": ...}}, "report": ...,
+     "published": {"review": ..., "summary": ..., "comment_id": ...}}
+    """
+
+    def __init__(self, repo_name: str, base_dir: Optional[Path] = None):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", repo_name)
+        self.base_dir = Path(base_dir) if base_dir else agent_cache_dir("reviews", slug)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, pr_number: int) -> Path:
+        return self.base_dir / f"pr-{pr_number}.json"
+
+    def load(self, pr_number: int) -> Dict:
+        path = self._path(pr_number)
+        if not path.exists():
+            return {"files": {}, "report": None}
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Состояние ревью PR #{pr_number} повреждено, начинаем заново: {e}")
+            return {"files": {}, "report": None}
+
+    def update(self, pr_number: int, **fields) -> None:
+        """Меняет отдельные ключи состояния, сохраняя остальные."""
+        state = self.load(pr_number)
+        state.update(fields)
+        self.save(pr_number, state)
+
+    def save(self, pr_number: int, state: Dict) -> None:
+        path = self._path(pr_number)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, path)
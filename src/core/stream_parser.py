@@ -0,0 +1,100 @@
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHANGE_KINDS = ("files_to_create", "files_to_modify")
+
+
+class ChangesStreamParser:
+    """Инкрементальный парсер ответа вида {"files_to_create": [...], "files_to_modify": [...]}.
+
+    Принимает текст кусками и возвращает каждую запись файла, как только закрылась
+    ее фигурная скобка. В памяти держится только текущая незавершенная запись,
+    поэтому расход памяти не зависит от размера всего ответа. Текст до первой
+    "{" (пояснения, ```json) и после закрытия корневого объекта игнорируется.
+    """
+
+    def __init__(self, kinds: Iterable[str] = CHANGE_KINDS):
+        self.kinds = set(kinds)
+        self.started = False
+        self.finished = False
+        self.entries = 0
+
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._key_parts: List[str] = []
+        self._last_key: Optional[str] = None
+        self._array_kind: Optional[str] = None
+        self._capture: Optional[List[str]] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict]]:
+        """Обрабатывает очередной фрагмент и возвращает завершенные записи (kind, entry)."""
+        ready: List[Tuple[str, Dict]] = []
+        if self.finished:
+            return ready
+
+        segment_start = 0 if self._capture is not None else None
+        for i, ch in enumerate(chunk):
+            if not self.started:
+                if ch != "{":
+                    continue
+                self.started = True
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = "".join(self._key_parts)
+                elif len(self._stack) == 1 and len(self._key_parts) < 256:
+                    self._key_parts.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._key_parts = []
+            elif ch in "{[":
+                if ch == "[" and self._stack == ["{"]:
+                    self._array_kind = self._last_key
+                elif ch == "{" and self._stack == ["{", "["] and self._array_kind in self.kinds:
+                    self._capture = []
+                    segment_start = i
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if ch == "}" and self._capture is not None and self._stack == ["{", "["]:
+                    self._capture.append(chunk[segment_start:i + 1])
+                    entry = self._decode("".join(self._capture))
+                    self._capture = None
+                    segment_start = None
+                    if entry is not None:
+                        self.entries += 1
+                        ready.append((self._array_kind, entry))
+                elif ch == "]" and self._stack == ["{"]:
+                    self._array_kind = None
+                elif not self._stack:
+                    self.finished = True
+                    break
+
+        if self._capture is not None and segment_start is not None:
+            self._capture.append(chunk[segment_start:])
+        return ready
+
+    def _decode(self, text: str) -> Optional[Dict]:
+        try:
+            entry = json.loads(text, strict=False)
+        except json.JSONDecodeError as e:
+            logger.error(f"Не удалось разобрать запись файла из потока: {e}")
+            return None
+        if not isinstance(entry, dict) or "path" not in entry:
+            logger.warning("Пропущена запись без поля path.")
+            return None
+        return entry
@@ -0,0 +1,161 @@
+import fnmatch
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Размер контекстного окна (prompt + ответ) в токенах
+MODEL_CONTEXT_LIMITS = {
+    "yandexgpt": 32000,
+    "yandexgpt-lite": 32000,
+    "yandexgpt-32k": 32000,
+    "llama-lite": 8000,
+    "llama": 8000,
+}
+DEFAULT_CONTEXT_LIMIT = 8000
+
+# Файлы, которые при нехватке места урезаются первыми
+LOW_PRIORITY_PATTERNS = (
+    "*.lock", "*-lock.json", "*.lock.json", "package-lock.json", "poetry.lock", "Pipfile.lock",
+    "*.min.js", "*.min.css", "*.map", "*_pb2.py", "*_pb2_grpc.py", "*.svg",
+    "dist/*", "build/*", "vendor/*", "*/migrations/*", "*.snap",
+)
+
+PRIORITY_REQUIRED = 100
+PRIORITY_HIGH = 50
+PRIORITY_NORMAL = 20
+PRIORITY_LOW = 0
+
+
+def estimate_tokens(text: str) -> int:
+    """Быстрая оценка числа токенов без токенизатора.
+
+    Латиница и код — около 4 символов на токен, кириллица и прочий не-ASCII
+    текст токенизируется плотнее — около 2.5 символов на токен.
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2.5)
+
+
+def context_limit(model_name: str) -> int:
+    override = os.environ.get("LLM_CONTEXT_LIMIT")
+    if override:
+        return int(override)
+    return MODEL_CONTEXT_LIMITS.get(model_name, DEFAULT_CONTEXT_LIMIT)
+
+
+def prompt_budget(model_name: str, max_output_tokens: int, *fixed_texts: str, safety_ratio: float = 0.05) -> int:
+    """Сколько токенов остается на переменную часть промпта.
+
+    Из окна модели вычитаются ответ, фиксированные тексты (системная роль,
+    инструкции) и запас на погрешность оценки.
+    """
+    limit = context_limit(model_name)
+    fixed = sum(estimate_tokens(t) for t in fixed_texts)
+    return max(0, int(limit * (1 - safety_ratio)) - max_output_tokens - fixed)
+
+
+def path_priority(path: str, default: int = PRIORITY_NORMAL) -> int:
+    """Приоритет секции по пути файла: lockfile-ы и сгенерированные файлы — низкий."""
+    name = path.strip().lstrip("./")
+    if any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(os.path.basename(name), p) for p in LOW_PRIORITY_PATTERNS):
+        return PRIORITY_LOW
+    return default
+
+
+@dataclass
+class PromptSection:
+    name: str
+    text: str
+    priority: int = PRIORITY_NORMAL
+    # Краткая замена секции, если она не помещается целиком
+    summary: Optional[str] = None
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+@dataclass
+class PackResult:
+    text: str
+    tokens: int
+    budget: int
+    truncated: List[str] = field(default_factory=list)
+    summarized: List[str] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return not self.truncated and not self.summarized
+
+
+class PromptPacker:
+    """Укладывает секции промпта в бюджет токенов.
+
+    Секции обрабатываются от низкого приоритета к высокому: сначала секция
+    обрезается, а если от нее осталось бы слишком мало — заменяется кратким
+    описанием. Секции с PRIORITY_REQUIRED не трогаются. Порядок секций в
+    итоговом тексте сохраняется.
+    """
+
+    def __init__(self, budget: int, min_section_tokens: int = 200, separator: str = "\n"):
+        self.budget = budget
+        self.min_section_tokens = min_section_tokens
+        self.separator = separator
+
+    def pack(self, sections: Iterable[PromptSection]) -> PackResult:
+        sections = list(sections)
+        texts = [s.text for s in sections]
+        costs = [s.tokens for s in sections]
+        total = sum(costs)
+        result = PackResult(text="", tokens=total, budget=self.budget)
+
+        order = sorted(range(len(sections)), key=lambda i: sections[i].priority)
+        for i in order:
+            if total <= self.budget:
+                break
+            section = sections[i]
+            if section.priority >= PRIORITY_REQUIRED:
+                continue
+            overflow = total - self.budget
+            keep = costs[i] - overflow
+            if keep >= self.min_section_tokens:
+                texts[i] = _truncate(section.text, keep)
+                result.truncated.append(section.name)
+            else:
+                texts[i] = section.summary or f"[{section.name}: опущено, ~{costs[i]} токенов]"
+                result.summarized.append(section.name)
+            new_cost = estimate_tokens(texts[i])
+            total -= costs[i] - new_cost
+            costs[i] = new_cost
+
+        if total > self.budget:
+            logger.warning(f"Обязательные секции промпта превышают бюджет: ~{total} > {self.budget}")
+
+        result.text = self.separator.join(t for t in texts if t)
+        result.tokens = total
+        if not result.complete:
+            logger.info(
+                f"Промпт упакован в ~{total}/{self.budget} токенов: "
+                f"обрезано {len(result.truncated)}, заменено описанием {len(result.summarized)}"
+            )
+        return result
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Оставляет целые строки с начала текста, пока они помещаются в max_tokens."""
+    marker = "\n[... обрезано ...]"
+    limit = max_tokens - estimate_tokens(marker)
+    kept, used = [], 0
+    for line in text.splitlines(keepends=True):
+        cost = estimate_tokens(line)
+        if used + cost > limit:
+            break
+        kept.append(line)
+        used += cost
+    return "".join(kept).rstrip("\n") + marker
@@ -0,0 +1,213 @@
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional, Set, TextIO
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """Отрезок работы конвейера: имя, длительность, атрибуты (размеры, ретраи, токены)."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    # Ключи, накопленные через add(): только они суммируются в сводке
+    counters: Set[str] = field(default_factory=set)
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add(self, key: str, value: float = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + value
+        self.counters.add(key)
+
+    def to_otel(self) -> Dict[str, Any]:
+        """Запись в духе OTLP/JSON: имена полей совпадают с OpenTelemetry."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class _NoopSpan(Span):
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, value: float = 1) -> None:
+        pass
+
+
+_NOOP = _NoopSpan(name="", trace_id="", span_id="", parent_id=None, start_ns=0)
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("agent_span", default=None)
+
+
+class Tracer:
+    """Собирает завершенные span-ы: пишет их в TRACE_FILE (JSON lines) и копит сводку по именам.
+
+    Сводка (число вызовов, суммарное и максимальное время, ошибки, суммы
+    счетчиков из Span.add) печатается при выходе из процесса, если TRACE_SUMMARY=1.
+    """
+
+    def __init__(self, path: Optional[str] = None, summary: bool = True):
+        self.enabled = os.environ.get("TRACE_ENABLED", "1") == "1"
+        self.path = path if path is not None else os.environ.get("TRACE_FILE")
+        self.summary_enabled = summary
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = None
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._root_total = 0.0
+        self._atexit_registered = False
+
+    def _export(self, span: Span) -> None:
+        if not self.path:
+            return
+        line = json.dumps(span.to_otel(), ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def finish(self, span: Span) -> None:
+        self._export(span)
+        with self._lock:
+            stats = self._stats.setdefault(span.name, {"calls": 0, "total": 0.0, "max": 0.0, "errors": 0})
+            stats["calls"] += 1
+            stats["total"] += span.duration
+            stats["max"] = max(stats["max"], span.duration)
+            stats["errors"] += 1 if span.error else 0
+            if span.parent_id is None:
+                self._root_total += span.duration
+            for key in span.counters:
+                stats[f"attr:{key}"] = stats.get(f"attr:{key}", 0) + span.attributes[key]
+            if self.summary_enabled and not self._atexit_registered:
+                atexit.register(self.print_summary)
+                self._atexit_registered = True
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def format_summary(self) -> str:
+        stats = self.summary()
+        if not stats:
+            return ""
+        # Доля считается от суммарного времени корневых span-ов (задач)
+        wall = self._root_total or max(s["total"] for s in stats.values())
+        lines = [f"{'stage':<36} {'calls':>6} {'total, s':>9} {'avg, s':>8} {'max, s':>8} {'share':>6} {'err':>4}  counters"]
+        for name, s in sorted(stats.items(), key=lambda item: item[1]["total"], reverse=True):
+            counters = ", ".join(
+                f"{key[5:]}={value:g}" for key, value in sorted(s.items()) if key.startswith("attr:")
+            )
+            lines.append(
+                f"{name:<36} {int(s['calls']):>6} {s['total']:>9.3f} {s['total'] / s['calls']:>8.3f} "
+                f"{s['max']:>8.3f} {s['total'] / wall:>6.0%} {int(s['errors']):>4}  {counters}"
+            )
+        return "\n".join(lines)
+
+    def print_summary(self, stream: Optional[TextIO] = None) -> None:
+        table = self.format_summary()
+        if table:
+            print("\n=== Сводка по этапам ===\n" + table, file=stream or sys.stderr)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._root_total = 0.0
+
+
+# Сводка по умолчанию выключена: иначе ее печатал бы каждый процесс (pytest, дочерние процессы проверок)
+_tracer = Tracer(summary=os.environ.get("TRACE_SUMMARY", "0") == "1")
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def current_span() -> Span:
+    """Текущий span (или заглушка вне span-а): атрибуты можно писать без проверок."""
+    return _current.get() or _NOOP
+
+
+@contextmanager
+def span(name: str, activate: bool = True, **attributes: Any) -> Iterator[Span]:
+    """Открывает дочерний span текущего контекста (потоки asyncio.to_thread наследуют его).
+
+    activate=False — span не становится текущим; нужно в генераторах, которые
+    отдают управление вызывающему коду между yield.
+    """
+    if not _tracer.enabled:
+        yield _NOOP
+        return
+    parent = _current.get()
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=dict(attributes),
+    )
+    token = _current.set(current) if activate else None
+    try:
+        yield current
+    except GeneratorExit:
+        raise
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        if token is not None:
+            _current.reset(token)
+        _tracer.finish(current)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Декоратор: оборачивает вызов функции в span (по умолчанию имя — qualname функции)."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(usage: Optional[Dict[str, Any]], target: Optional[Span] = None) -> None:
+    """Добавляет токены из поля usage ответа YandexGPT к span-у (по умолчанию текущему)."""
+    if not usage:
+        return
+    target = target or current_span()
+    for source, key in (("inputTextTokens", "tokens.input"), ("completionTokens", "tokens.output"),
+                        ("totalTokens", "tokens.total")):
+        if source in usage:
+            target.add(key, int(usage[source]))
+
@@ -0,0 +1,256 @@
+import ast
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set, Union
+
+from core.impact import build_graph, is_test_file, run_tests, select_tests
+from core.tracing import current_span, get_tracer, traced
+
+logger = logging.getLogger(__name__)
+
+# Правила ruff по умолчанию — только то, что ломает код: синтаксис и неопределенные имена
+DEFAULT_RUFF_SELECT = "E9,F63,F7,F82"
+CHECKS = ("syntax", "ruff", "mypy", "tests")
+
+# path:line:col: message — общий формат ruff (concise) и mypy
+_LOCATION = re.compile(r"^(?P<path>[^:\n]+\.pyi?):(?P<line>\d+):(?:\d+:)?\s*(?P<message>.+)$")
+
+
+@dataclass
+class Diagnostic:
+    check: str
+    path: str
+    line: Optional[int]
+    message: str
+
+    def format(self) -> str:
+        where = f"{self.path}:{self.line}" if self.line else self.path
+        return f"[{self.check}] {where}: {self.message}"
+
+
+@dataclass
+class CheckResult:
+    check: str
+    diagnostics: List[Diagnostic] = field(default_factory=list)
+    seconds: float = 0.0
+    skipped: str = ""
+
+
+@dataclass
+class ValidationReport:
+    """Итог проверки сгенерированного кода перед коммитом."""
+    paths: List[str]
+    results: List[CheckResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def diagnostics(self) -> List[Diagnostic]:
+        return [d for r in self.results for d in r.diagnostics]
+
+    @property
+    def ok(self) -> bool:
+        return not self.diagnostics
+
+    @property
+    def failed_paths(self) -> List[str]:
+        return sorted({d.path for d in self.diagnostics if d.path in self.paths})
+
+    def format_for_prompt(self, max_items: int = 30, max_message: int = 800) -> str:
+        lines = []
+        for diagnostic in self.diagnostics[:max_items]:
+            text = diagnostic.format()
+            lines.append(text if len(text) <= max_message else text[:max_message] + " ...")
+        if len(self.diagnostics) > max_items:
+            lines.append(f"... и еще {len(self.diagnostics) - max_items} замечаний")
+        return "\n".join(lines)
+
+    def summary(self) -> str:
+        parts = []
+        for r in self.results:
+            state = f"пропущено ({r.skipped})" if r.skipped else f"{len(r.diagnostics)} замечаний"
+            parts.append(f"{r.check}: {state}, {r.seconds:.1f} с")
+        return "; ".join(parts)
+
+
+def changed_lines(root: Path, paths: Sequence[str]) -> Dict[str, Optional[Set[int]]]:
+    """Номера строк, измененных относительно HEAD; None — файл новый, изменен целиком."""
+    result: Dict[str, Optional[Set[int]]] = {path: None for path in paths}
+    try:
+        tracked = set(subprocess.run(
+            ["git", "-C", str(root), "ls-files", "--", *paths], check=True, capture_output=True, text=True
+        ).stdout.splitlines())
+        diff = subprocess.run(
+            ["git", "-C", str(root), "diff", "-U0", "--no-color", "HEAD", "--", *sorted(tracked)],
+            check=True, capture_output=True, text=True,
+        ).stdout if tracked else ""
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.debug(f"Не удалось получить diff для проверки: {e}")
+        return result
+    # Отслеживаемые файлы без ханков в diff не изменены: замечания в них не относятся к правке
+    hunks: Dict[str, Set[int]] = {path: set() for path in tracked}
+    current: Optional[Set[int]] = None
+    for line in diff.splitlines():
+        if line.startswith("+++ "):
+            current = hunks.get(line[6:]) if line.startswith("+++ b/") else None
+        elif line.startswith("@@") and current is not None:
+            match = re.search(r"\+(\d+)(?:,(\d+))?", line)
+            if match:
+                start, count = int(match.group(1)), int(match.group(2) or 1)
+                current.update(range(start, start + count))
+    result.update(hunks)
+    return result
+
+
+def _on_changed_lines(diagnostics: List[Diagnostic], lines: Dict[str, Optional[Set[int]]]) -> List[Diagnostic]:
+    """Оставляет замечания по измененным строкам: старые проблемы файла не должны запускать цикл исправлений."""
+    kept = []
+    for d in diagnostics:
+        changed = lines.get(d.path, set())
+        if changed is None or d.line is None or d.line in changed:
+            kept.append(d)
+    return kept
+
+
+def _parse_locations(check: str, output: str, root: Path) -> List[Diagnostic]:
+    diagnostics = []
+    for line in output.splitlines():
+        match = _LOCATION.match(line.strip())
+        if not match or match.group("message").startswith("note:"):
+            continue
+        path = Path(match.group("path"))
+        if path.is_absolute():
+            path = path.relative_to(root) if root in path.parents else path
+        diagnostics.append(Diagnostic(check, path.as_posix(), int(match.group("line")), match.group("message")))
+    return diagnostics
+
+
+def _run_tool(check: str, command: List[str], root: Path, timeout: float) -> CheckResult:
+    started = time.monotonic()
+    try:
+        proc = subprocess.run(command, cwd=root, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return CheckResult(check, seconds=time.monotonic() - started, skipped=f"таймаут {timeout:.0f} с")
+    if "No module named" in proc.stderr:
+        return CheckResult(check, seconds=time.monotonic() - started, skipped=f"{command[2]} не установлен")
+    return CheckResult(check, _parse_locations(check, proc.stdout, root), time.monotonic() - started)
+
+
+def check_syntax(root: str, paths: List[str], timeout: float) -> CheckResult:
+    started = time.monotonic()
+    diagnostics = []
+    for path in paths:
+        try:
+            ast.parse((Path(root) / path).read_text(encoding="utf-8"), filename=path)
+        except SyntaxError as e:
+            diagnostics.append(Diagnostic("syntax", path, e.lineno, e.msg))
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            diagnostics.append(Diagnostic("syntax", path, None, str(e)))
+    return CheckResult("syntax", diagnostics, time.monotonic() - started)
+
+
+def check_ruff(root: str, paths: List[str], timeout: float) -> CheckResult:
+    select = os.environ.get("VALIDATION_RUFF_SELECT", DEFAULT_RUFF_SELECT)
+    command = [sys.executable, "-m", "ruff", "check", "--no-cache", "--output-format=concise", "--quiet"]
+    if select:
+        command.append(f"--select={select}")
+    return _run_tool("ruff", command + paths, Path(root), timeout)
+
+
+def check_mypy(root: str, paths: List[str], timeout: float) -> CheckResult:
+    command = [
+        sys.executable, "-m", "mypy", "--ignore-missing-imports", "--follow-imports=silent",
+        "--no-error-summary", "--no-pretty", "--show-column-numbers", "--cache-dir=/dev/null",
+    ]
+    return _run_tool("mypy", command + paths, Path(root), timeout)
+
+
+def check_tests(root: str, paths: List[str], timeout: float) -> CheckResult:
+    started = time.monotonic()
+    root_path = Path(root)
+    selected, reason = select_tests(build_graph(root_path), paths)
+    if reason:
+        # Весь набор до пуша не гоняем: его проверит ревьюер в CI
+        return CheckResult("tests", seconds=time.monotonic() - started, skipped=f"затронут весь набор: {reason}")
+    # Новые тестовые файлы еще не в индексе git и в граф не попадают
+    selected = sorted(set(selected) | {p for p in paths if is_test_file(p)})
+    cases, crashed, _ = run_tests(selected, root_path, timeout=timeout)
+
+    def module_path(nodeid: str) -> str:
+        module = nodeid.split("::")[0]
+        return next((p for p in selected if module.startswith(p[:-3].replace("/", "."))), module)
+
+    diagnostics = [
+        Diagnostic("tests", module_path(c.nodeid), None, f"{c.outcome.upper()} {c.nodeid}: {c.message}")
+        for c in cases if c.outcome in ("failed", "error")
+    ]
+    diagnostics += [Diagnostic("tests", path, None, "модуль не удалось запустить (ошибка сбора или таймаут)") for path in crashed]
+    return CheckResult("tests", diagnostics, time.monotonic() - started)
+
+
+CHECK_FUNCTIONS: Dict[str, Callable[[str, List[str], float], CheckResult]] = {
+    "syntax": check_syntax,
+    "ruff": check_ruff,
+    "mypy": check_mypy,
+    "tests": check_tests,
+}
+
+
+def _init_worker() -> None:
+    # Сводку по этапам печатает родительский процесс; span-ы проверок по-прежнему пишутся в TRACE_FILE
+    get_tracer().summary_enabled = False
+
+
+def enabled_checks() -> List[str]:
+    configured = os.environ.get("VALIDATION_CHECKS", ",".join(CHECKS))
+    return [c.strip() for c in configured.split(",") if c.strip() in CHECK_FUNCTIONS]
+
+
+@traced("validation.run")
+def validate(
+    root: Union[str, Path],
+    paths: Sequence[str],
+    checks: Optional[Sequence[str]] = None,
+    timeout: Optional[float] = None,
+) -> ValidationReport:
+    """Проверяет измененные файлы: ast, ruff, mypy и затронутые тесты — параллельно в пуле процессов.
+
+    Замечания ruff и mypy учитываются только для измененных строк.
+    """
+    root = Path(root).resolve()
+    paths = sorted({p for p in paths if p.endswith(".py") and (root / p).exists()})
+    checks = list(checks) if checks is not None else enabled_checks()
+    timeout = timeout or float(os.environ.get("VALIDATION_TIMEOUT", "300"))
+    report = ValidationReport(paths)
+    if not paths or not checks:
+        return report
+
+    started = time.monotonic()
+    # spawn: агент многопоточный (serve, batch), fork в таком процессе небезопасен
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(checks), mp_context=context, initializer=_init_worker) as executor:
+        futures = {check: executor.submit(CHECK_FUNCTIONS[check], str(root), paths, timeout) for check in checks}
+        for check, future in futures.items():
+            try:
+                report.results.append(future.result())
+            except Exception as e:
+                logger.error(f"Проверка {check} завершилась с ошибкой: {e}")
+                report.results.append(CheckResult(check, skipped=f"ошибка: {e}"))
+    report.seconds = time.monotonic() - started
+
+    lines = changed_lines(root, paths)
+    # Синтаксические ошибки ruff и mypy повторяют, поэтому по таким файлам их замечания не нужны
+    broken = {d.path for r in report.results if r.check == "syntax" for d in r.diagnostics}
+    for result in report.results:
+        if result.check in ("ruff", "mypy"):
+            result.diagnostics = [d for d in _on_changed_lines(result.diagnostics, lines) if d.path not in broken]
+    current_span().add("diagnostics", len(report.diagnostics))
+    logger.info(f"Проверка {len(paths)} файлов за {report.seconds:.1f} с: {report.summary()}")
+    return report
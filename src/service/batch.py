@@ -0,0 +1,142 @@
+import json
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from agents.reviewer_agent import parse_verdict
+from core.git_utils import GitHubManager
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Тип задачи batch-режима -> квалификатор is: в поиске GitHub
+SEARCH_KINDS = {"solve": "issue", "review": "pr"}
+
+
+@dataclass
+class BatchResult:
+    kind: str
+    target: int
+    ok: bool
+    seconds: float
+    detail: str = ""
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    """Итоги пакетного запуска: результат по каждой задаче и общая пропускная способность."""
+    kind: str
+    results: List[BatchResult] = field(default_factory=list)
+    wall_seconds: float = 0.0
+    prefetch_seconds: float = 0.0
+
+    @property
+    def failed(self) -> List[BatchResult]:
+        return [r for r in self.results if not r.ok]
+
+    def summary(self) -> Dict[str, Any]:
+        durations = [r.seconds for r in self.results]
+        return {
+            "kind": self.kind,
+            "total": len(self.results),
+            "ok": len(self.results) - len(self.failed),
+            "failed": len(self.failed),
+            "wall_s": round(self.wall_seconds, 2),
+            "prefetch_s": round(self.prefetch_seconds, 2),
+            "items_per_min": round(len(self.results) / self.wall_seconds * 60, 2) if self.wall_seconds else 0.0,
+            "item_p50_s": round(statistics.median(durations), 2) if durations else 0.0,
+            "item_max_s": round(max(durations), 2) if durations else 0.0,
+            # > 1 — задачи действительно выполнялись параллельно
+            "parallelism": round(sum(durations) / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+        }
+
+    def format(self) -> str:
+        lines = [f"{'#':>6}  {'status':<6} {'time, s':>8}  result"]
+        for r in sorted(self.results, key=lambda r: r.target):
+            status = "ok" if r.ok else "FAIL"
+            lines.append(f"{r.target:>6}  {status:<6} {r.seconds:>8.1f}  {r.detail if r.ok else r.error}")
+        s = self.summary()
+        lines.append(
+            f"Итого: {s['ok']}/{s['total']} успешно за {s['wall_s']} с (выборка {s['prefetch_s']} с), "
+            f"{s['items_per_min']} задач/мин, медиана {s['item_p50_s']} с, параллельность x{s['parallelism']}"
+        )
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"summary": self.summary(), "results": [asdict(r) for r in self.results]}, ensure_ascii=False, indent=2
+        )
+
+
+def resolve_targets(
+    github: GitHubManager,
+    kind: str,
+    numbers: Sequence[int] = (),
+    query: Optional[str] = None,
+    labels: Sequence[str] = (),
+    limit: Optional[int] = None,
+) -> List[int]:
+    """Номера задач пакета; метаданные issue/PR при этом выбираются пакетно и кэшируются в github.
+
+    Явные номера — одним GraphQL-запросом на GRAPHQL_BATCH номеров, query — через
+    поиск GitHub, labels — постраничным списком открытых issue/PR.
+    """
+    targets: List[int] = list(numbers)
+    if query:
+        targets += github.search_numbers(query, SEARCH_KINDS[kind], limit=limit)
+    if labels:
+        listed = github.list_issues(labels, limit=limit) if kind == "solve" else github.list_pulls(labels, limit=limit)
+        targets += [item["number"] for item in listed]
+    targets = list(dict.fromkeys(targets))[:limit]
+
+    # Явные номера и PR из поиска (он отдает их в виде issue) добираем GraphQL-запросами
+    expected = "issue" if kind == "solve" else "pull"
+    missing = [n for n in targets if not github.is_prefetched(expected, n)]
+    fetched = github.fetch_many(missing) if missing else {}
+    for number in missing:
+        item = fetched.get(number)
+        if item is None:
+            logger.warning(f"#{number} не найден в репозитории, пропускаем")
+        elif ("pull_request" in item) != (expected == "pull"):
+            logger.warning(f"#{number} — {'PR' if expected == 'issue' else 'issue'}, пропускаем")
+    return [n for n in targets if github.is_prefetched(expected, n)]
+
+
+def _describe(kind: str, result: Any) -> str:
+    if kind == "solve":
+        return f"PR #{result}"
+    # Тот же разбор, что при публикации ревью: сводка batch совпадает с событием ревью в PR
+    return parse_verdict(result or "")
+
+
+def run_batch(
+    kind: str,
+    targets: Sequence[int],
+    execute: Callable[[str, int], Any],
+    concurrency: int = 2,
+) -> BatchReport:
+    """Выполняет задачи не более чем в concurrency потоков; ошибка одной задачи не останавливает остальные."""
+    report = BatchReport(kind)
+    if not targets:
+        return report
+
+    def _one(target: int) -> BatchResult:
+        started = time.monotonic()
+        try:
+            with span("batch.item", kind=kind, target=target):
+                result = execute(kind, target)
+            return BatchResult(kind, target, True, time.monotonic() - started, _describe(kind, result))
+        except Exception as e:
+            logger.error(f"Задача {kind}:{target} провалена: {e}")
+            return BatchResult(kind, target, False, time.monotonic() - started, error=f"{type(e).__name__}: {e}")
+
+    logger.info(f"Пакет {kind}: {len(targets)} задач, параллельность {concurrency}")
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"batch-{kind}") as executor:
+        report.results = list(executor.map(_one, targets))
+    report.wall_seconds = time.monotonic() - started
+    return report
@@ -0,0 +1,200 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional, Tuple
+
+from agents.code_agent import BASE_BRANCH, CodeAgent
+from agents.reviewer_agent import ReviewerAgent
+from core.git_utils import GitHubManager, WorktreePool
+from core.job_queue import Job, JobQueue
+from core.llm_router import ModelRouter
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def webhook_job(event: str, payload: dict) -> Optional[Tuple[str, int]]:
+    """Сопоставляет событие GitHub задаче очереди, по тем же правилам, что и workflow."""
+    action = payload.get("action")
+    if event == "issues" and action == "opened":
+        return "solve", payload["issue"]["number"]
+    if event == "issue_comment" and action == "created" and not payload["issue"].get("pull_request"):
+        return "solve", payload["issue"]["number"]
+    if event == "pull_request" and action in ("opened", "synchronize", "reopened"):
+        return "review", payload["pull_request"]["number"]
+    return None
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug("webhook: " + format % args)
+
+    def _reply(self, status: int, message: str) -> None:
+        body = message.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        secret = self.server.secret
+        if secret and not verify_signature(secret, body, self.headers.get("X-Hub-Signature-256")):
+            self._reply(401, "bad signature")
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._reply(400, "bad json")
+            return
+
+        job = webhook_job(self.headers.get("X-GitHub-Event", ""), payload)
+        if job is None:
+            self._reply(204, "")
+            return
+        job_id = self.server.queue.enqueue(*job)
+        self._reply(202, f"queued {job[0]}:{job[1]}" if job_id else f"duplicate {job[0]}:{job[1]}")
+
+
+class Worker:
+    """Долгоживущий обработчик задач solve/review из локальной очереди.
+
+    Клиенты GitHub и LLM создаются один раз и переиспользуются всеми задачами.
+    Задачи выполняются в concurrency потоках. Каждая solve-задача получает
+    отдельный git worktree из пула (AGENT_WORKTREES=1, по умолчанию) на только
+    что загруженном коммите origin/BASE_BRANCH, поэтому
+    несколько issue решаются параллельно; без пула solve-задачи пишут в общую
+    рабочую копию и выполняются по одной. Review-задачи с прогоном тестов
+    (REVIEW_RUN_TESTS=1) берут из пула worktree на head-коммите PR. Без очереди (queue=None) Worker
+    служит исполнителем задач через execute — так его использует batch-режим.
+    """
+
+    def __init__(
+        self,
+        config,
+        queue: Optional[JobQueue],
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        retry_base_delay: float = 30.0,
+    ):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retry_base_delay = retry_base_delay
+
+        self.github = GitHubManager(token=config.github_token, repo_name=config.repo_name)
+        self.llm = ModelRouter.from_config(config)
+        self.code_agent = CodeAgent(config, github=self.github, llm=self.llm)
+        self.reviewer = ReviewerAgent(config, gh_manager=self.github, llm=self.llm)
+
+        self.worktrees: Optional[WorktreePool] = None
+        if os.environ.get("AGENT_WORKTREES", "1") == "1":
+            self.worktrees = WorktreePool(self.github.local_repo, max_size=concurrency)
+        elif self.reviewer.run_tests:
+            logger.warning("AGENT_WORKTREES=0: тесты ревью запускаются в основной рабочей копии, а не на коде PR")
+
+        self._stop = threading.Event()
+        self._solve_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._webhook: Optional[ThreadingHTTPServer] = None
+
+    def execute(self, kind: str, target: int) -> Any:
+        """Выполняет одну задачу; возвращает номер созданного PR (solve) или отчет ревью (review)."""
+        if kind == "solve":
+            if self.worktrees is not None:
+                # Решение строится от свежей базовой ветки, а не от HEAD на момент запуска воркера
+                base = self.github.fetch_branch(BASE_BRANCH)
+                with self.worktrees.lease(base) as workdir:
+                    pr_number = self.code_agent.run(target, workdir=workdir)
+            else:
+                with self._solve_lock:
+                    pr_number = self.code_agent.run(target)
+            if pr_number is None:
+                raise RuntimeError(f"Code Agent не создал PR для Issue #{target}")
+            return pr_number
+        if kind == "review":
+            if self.worktrees is not None and self.reviewer.run_tests:
+                # Затронутые тесты должны идти на коде PR, а не на основной рабочей копии воркера
+                head = self.github.fetch_pull_head(target)
+                with self.worktrees.lease(head) as workdir:
+                    return self.reviewer.run_review(target, workdir=workdir)
+            return self.reviewer.run_review(target)
+        raise ValueError(f"Неизвестный тип задачи: {kind}")
+
+    def run_job(self, job: Job) -> None:
+        self.execute(job.kind, job.target)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            logger.info(f"Задача {job.key} (id={job.id}), попытка {job.attempts}/{job.max_attempts}")
+            try:
+                with span("worker.job", kind=job.kind, target=job.target, attempt=job.attempts):
+                    self.run_job(job)
+                self.queue.complete(job)
+                logger.info(f"Задача {job.key} выполнена")
+            except Exception as e:
+                delay = self.retry_base_delay * 2 ** (job.attempts - 1)
+                if self.queue.fail(job, str(e), delay):
+                    logger.warning(f"Задача {job.key} упала ({e}), повтор через {delay:.0f} с")
+                else:
+                    logger.error(f"Задача {job.key} окончательно провалена: {e}")
+
+    def start_webhook(self, host: str, port: int, secret: Optional[str]) -> None:
+        self._webhook = ThreadingHTTPServer((host, port), _WebhookHandler)
+        self._webhook.queue = self.queue
+        self._webhook.secret = secret
+        thread = threading.Thread(target=self._webhook.serve_forever, name="webhook", daemon=True)
+        thread.start()
+        logger.info(f"Webhook принимает события на http://{host}:{self._webhook.server_address[1]}/")
+
+    def stop(self, *_args) -> None:
+        if not self._stop.is_set():
+            logger.info("Остановка: дожидаемся завершения текущих задач...")
+        self._stop.set()
+
+    def serve(self, webhook_host: str = "127.0.0.1", webhook_port: Optional[int] = None, webhook_secret: Optional[str] = None) -> None:
+        """Запускает обработку очереди до SIGINT/SIGTERM; текущие задачи доводятся до конца."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        requeued = self.queue.requeue_running()
+        if requeued:
+            logger.warning(f"Возвращено в очередь незавершенных задач: {requeued}")
+        if webhook_port is not None:
+            self.start_webhook(webhook_host, webhook_port, webhook_secret)
+
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"worker-{i}") for i in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Worker запущен: {self.concurrency} потоков, очередь {self.queue.path}")
+
+        while not self._stop.wait(1.0):
+            pass
+
+        if self._webhook:
+            self._webhook.shutdown()
+            self._webhook.server_close()
+        for thread in self._threads:
+            thread.join()
+        logger.info(f"Worker остановлен. Очередь: {self.queue.counts()}")
@@ -0,0 +1,77 @@
+import sys
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.llm_client import AsyncLLMClient
+
+
+class FakeResponse:
+    def __init__(self, text: str, status_code: int = 200):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+    def json(self):
+        return {"result": {"alternatives": [{"message": {"text": self.text}}]}}
+
+    def raise_for_status(self):
+        raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    """Отвечает эхом промпта и считает одновременные запросы."""
+
+    def __init__(self, delay: float = 0.05, fail_first: int = 0):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        with self.lock:
+            self.calls += 1
+            call_no = self.calls
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if call_no <= self.fail_first:
+            return FakeResponse("", status_code=503)
+        return FakeResponse(json["messages"][1]["text"].upper())
+
+
+def _client(session, monkeypatch) -> AsyncLLMClient:
+    monkeypatch.setenv("YANDEX_API_KEY", "test")
+    monkeypatch.setenv("YANDEX_FOLDER_ID", "test")
+    monkeypatch.setenv("LLM_BACKOFF_BASE", "0.01")
+    return AsyncLLMClient(session=session)
+
+
+def test_gather_preserves_order_and_bounds_concurrency(monkeypatch):
+    session = FakeSession()
+    client = _client(session, monkeypatch)
+
+    prompts = [f"p{i}" for i in range(8)]
+    results = client.get_responses(prompts, max_concurrency=3)
+
+    assert results == [p.upper() for p in prompts]
+    assert session.peak <= 3
+    assert session.peak > 1
+
+
+def test_aget_response_retries_with_backoff(monkeypatch):
+    session = FakeSession(delay=0, fail_first=2)
+    client = _client(session, monkeypatch)
+
+    assert asyncio.run(client.aget_response("retry")) == "RETRY"
+    assert session.calls == 3
@@ -0,0 +1,88 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+for path in (src_path, src_path.parent / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from git import Repo
+from stubs import FakeGitHubServer
+
+from core.git_utils import GitHubManager
+from service.batch import resolve_targets, run_batch
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    Repo.init(tmp_path / "work")
+    with FakeGitHubServer(tmp_path / "remote.git", "owner/repo") as server:
+        monkeypatch.setenv("GITHUB_API_URL", server.api_url)
+        monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+        server.issues.update({
+            1: {"title": "Bug one", "body": "b1", "labels": ["bug"]},
+            2: {"title": "Bug two", "body": "b2", "labels": ["bug"]},
+            3: {"title": "Feature", "body": "f", "labels": []},
+        })
+        server.add_pull("feature/x", title="PR", labels=["needs-review"])
+        yield server, GitHubManager("token", "owner/repo", str(tmp_path / "work"))
+
+
+def test_explicit_numbers_are_fetched_in_one_graphql_request(github):
+    server, gh = github
+
+    # 1001 — PR, 999 — не существует: оба отбрасываются для solve
+    assert resolve_targets(gh, "solve", [1, 2, 1001, 999]) == [1, 2]
+    assert server.stats()["calls"] == {"POST graphql": 1}
+
+    # Данные issue уже получены: агенту не нужен отдельный запрос
+    assert gh.get_issue(1)["title"] == "Bug one"
+    assert server.stats()["requests"] == 1
+    assert resolve_targets(gh, "review", [1001, 3]) == [1001]
+
+
+def test_labels_and_search_use_paginated_listing(github):
+    server, gh = github
+
+    assert resolve_targets(gh, "solve", labels=["bug"]) == [1, 2]
+    assert resolve_targets(gh, "review", query="label:needs-review") == [1001]
+    assert gh.http.get_pages("repos/owner/repo/issues", per_page=2) == gh.http.get_pages("repos/owner/repo/issues")
+    assert len(gh.http.get_pages("repos/owner/repo/issues", per_page=2, limit=3)) == 3
+
+
+def test_run_batch_bounds_concurrency_and_isolates_failures():
+    active, peak = [0], [0]
+
+    def execute(kind, target):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        time.sleep(0.1)
+        active[0] -= 1
+        if target == 3:
+            raise RuntimeError("LLM недоступен")
+        return target + 100
+
+    report = run_batch("solve", [1, 2, 3, 4], execute, concurrency=2)
+
+    assert peak[0] <= 2
+    assert [r.target for r in report.failed] == [3]
+    assert {r.target: r.detail for r in report.results if r.ok} == {1: "PR #101", 2: "PR #102", 4: "PR #104"}
+    summary = report.summary()
+    assert summary["ok"] == 3 and summary["parallelism"] > 1.5
+    assert "RuntimeError: LLM недоступен" in report.format()
+
+
+def test_review_detail_matches_published_verdict():
+    reports = {
+        1: "Правок не требуется, REQUEST_CHANGES не нужен.\n\nВердикт: APPROVE",
+        2: "### Отчет ревьюера\nВердикт: **REQUEST_CHANGES**",
+        3: "Модель не вынесла вердикт",
+    }
+
+    report = run_batch("review", [1, 2, 3], lambda kind, target: reports[target])
+
+    assert [r.detail for r in report.results] == ["APPROVE", "REQUEST_CHANGES", "COMMENT"]
@@ -0,0 +1,105 @@
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.compression import COMPACT, FULL, OUTLINE, SIGNATURES, CompressionStats, Deduplicator, compress_diff, render
+from core.context_index import ContextIndex
+
+SOURCE = '''"""Модуль расчетов."""
+import math
+
+# Точность округления
+PRECISION = 2
+
+
+class Invoice:
+    """Счет клиента."""
+
+    total: float
+
+    def add(self, amount: float) -> None:
+        """Добавляет строку счета."""
+        # копейки не теряем
+        self.total += round(amount, PRECISION)  # округление
+
+
+def area(r):
+    """Площадь круга."""
+'''
+
+
+def test_render_levels_shrink_python_source():
+    compact = render("calc.py", SOURCE, COMPACT)
+    assert "#" not in compact and '"""' not in compact and "\n\n" not in compact
+    assert "self.total += round(amount, PRECISION)" in compact
+    # Функция, тело которой — только docstring, не остается пустой
+    assert compact.endswith("def area(r):\n    ...\n")
+
+    assert render("calc.py", SOURCE, OUTLINE) == (
+        '"""Модуль расчетов."""\n'
+        "PRECISION = ...\n"
+        "class Invoice:\n"
+        '    """Счет клиента."""\n'
+        "    total: float\n"
+        "    def add(self, amount: float) -> None:\n"
+        '        """Добавляет строку счета."""\n'
+        "def area(r):\n"
+        '    """Площадь круга."""\n'
+    )
+    assert render("calc.py", SOURCE, SIGNATURES) == (
+        "PRECISION = ...\nclass Invoice:\n    total: float\n"
+        "    def add(self, amount: float) -> None: ...\ndef area(r): ...\n"
+    )
+    assert len(render("calc.py", SOURCE, FULL)) > len(render("calc.py", SOURCE, COMPACT))
+    assert render("broken.py", "def f(:\n\n\n\nx", SIGNATURES) is None
+
+
+def test_compress_diff_collapses_unchanged_context():
+    context = [f" line {i}" for i in range(10)]
+    patch = "\n".join(["@@ -1,21 +1,21 @@", *context, "-old", "+new", *context, "\\ No newline at end of file"])
+
+    compressed = compress_diff(patch, context=1)
+    assert compressed.splitlines() == [
+        "@@ -1,21 +1,21 @@",
+        " ... (9 строк без изменений)",
+        " line 9",
+        "-old",
+        "+new",
+        " line 0",
+        " ... (9 строк без изменений)",
+    ]
+    # Короткие участки контекста не сворачиваются
+    assert compress_diff("@@ -1,3 +1,3 @@\n a\n-b\n+c\n d", context=1) == "@@ -1,3 +1,3 @@\n a\n-b\n+c\n d"
+
+
+def test_deduplicator_replaces_repeated_blocks():
+    block = "@@ -{n},4 +{n},4 @@\n+import logging\n+logger = logging.getLogger(__name__)\n+LIMIT = 10\n+TIMEOUT = 5\n"
+    dedupe = Deduplicator()
+
+    first = dedupe("a.py", "File: a.py\n" + block.format(n=1))
+    second = dedupe("b.py", "File: b.py\n" + block.format(n=40))
+    assert first.count("\n+") == 4
+    assert second == "File: b.py\n@@ -40,4 +40,4 @@\n[повтор: 4 строк, как в a.py]\n"
+
+    # Без регистрации блок не запоминается
+    probe = Deduplicator()
+    probe("c.py", block.format(n=1), register=False)
+    assert "повтор" not in probe("d.py", block.format(n=1))
+
+
+def test_context_degrades_fidelity_to_fit_more_files(tmp_path):
+    for name in ("invoice", "payment", "refund"):
+        (tmp_path / f"{name}.py").write_text(SOURCE.replace("Invoice", name.title()) + "# invoice\n" * 40, encoding="utf-8")
+    index = ContextIndex(str(tmp_path), index_path=tmp_path / "index.json", full_files=1)
+
+    context = index.build_context("invoice payment refund", token_budget=500)
+    assert context.count("FILE: ") == 3
+    assert "(без комментариев и docstring)" in context or "(сигнатуры и docstring)" in context
+
+    stats = CompressionStats()
+    stats.add("x" * 400, "x" * 100)
+    assert stats.ratio == 4.0
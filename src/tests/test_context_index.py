@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.context_index import ContextIndex, extract_symbols, git_blob_sha, tokenize
+
+
+def _make_project(root: Path) -> None:
+    (root / "pkg").mkdir()
+    (root / "pkg" / "billing.py").write_text(
+        '"""Расчет счетов."""\n\nclass InvoiceBuilder:\n    def add_line(self, amount: int) -> None:\n        pass\n'
+        + "# filler\n" * 200,
+        encoding="utf-8",
+    )
+    (root / "pkg" / "auth.py").write_text("def login(user, password):\n    return user\n", encoding="utf-8")
+    (root / "README.md").write_text("# Project\n## Usage\n", encoding="utf-8")
+
+
+def test_tokenize_splits_identifiers():
+    assert {"invoicebuilder", "invoice", "builder", "add_line", "add", "line"} <= set(tokenize("InvoiceBuilder.add_line"))
+
+
+def test_blob_sha_matches_git():
+    assert git_blob_sha(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+def test_symbols_are_signatures():
+    symbols = extract_symbols("m.py", "class A(B):\n    def f(self, x: int) -> str:\n        return ''\n")
+    assert symbols == ["class A(B):", "    def f(self, x: int) -> str"]
+
+
+def test_refresh_rereads_only_changed_files(tmp_path):
+    _make_project(tmp_path)
+    index = ContextIndex(str(tmp_path), index_path=tmp_path / "index.json")
+    assert index.refresh()["updated"] == 3
+
+    reloaded = ContextIndex(str(tmp_path), index_path=tmp_path / "index.json")
+    assert reloaded.refresh() == {"unchanged": 3, "updated": 0, "removed": 0}
+
+    (tmp_path / "pkg" / "auth.py").write_text("def logout(user):\n    return None\n", encoding="utf-8")
+    (tmp_path / "README.md").unlink()
+    assert reloaded.refresh() == {"unchanged": 1, "updated": 1, "removed": 1}
+
+
+def test_context_prefers_relevant_files_and_respects_budget(tmp_path):
+    _make_project(tmp_path)
+    index = ContextIndex(str(tmp_path), index_path=tmp_path / "index.json")
+
+    context = index.build_context("Ошибка в login при неверном password", token_budget=200)
+    assert context.index("FILE: pkg/auth.py\n") == 0
+    assert "FILE: pkg/billing.py (только сигнатуры)" in context
+    assert "# filler" not in context
+    assert len(context) // 4 <= 200
+
+
+def test_tracked_files_missing_on_disk_are_ranked_by_path(tmp_path):
+    _make_project(tmp_path)
+    index = ContextIndex(str(tmp_path), index_path=tmp_path / "index.json")
+    index.tracked_blobs = {"pkg/payments/refund.py": "a" * 40, "pkg/auth.py": "b" * 40}
+
+    assert index.candidates("refund payments", limit=1) == ["pkg/payments/refund.py"]
+    assert "pkg/payments/refund.py" in index.build_context("refund payments", 10_000)
+
+    (tmp_path / "pkg" / "payments").mkdir()
+    (tmp_path / "pkg" / "payments" / "refund.py").write_text("def refund_order(order):\n    pass\n", encoding="utf-8")
+    index.refresh()
+    assert index.files["pkg/payments/refund.py"].symbols == ["def refund_order(order)"]
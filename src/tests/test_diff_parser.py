@@ -0,0 +1,114 @@
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+for path in (src_path, src_path.parent / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from git import Repo
+from stubs import FakeGitHubServer
+
+from core.diff_parser import diff_positions, iter_diff_files, render_diff_file
+
+RAW_DIFF = """diff --git a/src/app.py b/src/app.py
+index 1111111..2222222 100644
+--- a/src/app.py
++++ b/src/app.py
+@@ -1,3 +1,3 @@ def main():
+ import os
+-print("old")
++print("new")
+@@ -10,2 +10,3 @@
+ x = 1
++y = 2
+diff --git a/logo.png b/logo.png
+new file mode 100644
+index 0000000..3333333
+Binary files /dev/null and b/logo.png differ
+diff --git a/old.txt b/old.txt
+deleted file mode 100644
+index 4444444..0000000
+--- a/old.txt
++++ /dev/null
+@@ -1 +0,0 @@
+-bye
+diff --git a/poetry.lock b/poetry.lock
+index 5555555..6666666 100644
+--- a/poetry.lock
++++ b/poetry.lock
+@@ -1 +1 @@
+-a
++b
+"""
+
+
+def test_parses_files_hunks_and_metadata():
+    files = list(iter_diff_files(RAW_DIFF.splitlines()))
+    assert [f.path for f in files] == ["src/app.py", "logo.png", "old.txt", "poetry.lock"]
+
+    app = files[0]
+    assert (app.old_sha, app.new_sha, app.status) == ("1111111", "2222222", "modified")
+    assert len(app.hunks) == 2
+    assert app.patch.startswith("@@ -1,3 +1,3 @@ def main():\n import os\n-print")
+
+    assert files[1].is_binary and files[1].status == "added" and files[1].patch is None
+    assert render_diff_file(files[1]) == "File: logo.png\n[бинарный файл]"
+    assert files[2].status == "removed"
+
+
+def test_path_filters():
+    files = list(iter_diff_files(RAW_DIFF.splitlines(), exclude=["*.lock", "*.png"]))
+    assert [f.path for f in files] == ["src/app.py", "old.txt"]
+
+    files = list(iter_diff_files(RAW_DIFF.splitlines(), include=["src/*"]))
+    assert [f.path for f in files] == ["src/app.py"]
+
+
+def test_size_caps():
+    files = list(iter_diff_files(RAW_DIFF.splitlines(), max_file_bytes=40))
+    assert files[0].truncated
+    assert "y = 2" not in files[0].patch
+    assert "[... diff файла обрезан" in render_diff_file(files[0])
+
+    files = list(iter_diff_files(RAW_DIFF.splitlines(), max_total_bytes=60))
+    assert [f.path for f in files] == ["src/app.py"]
+    assert files[0].truncated
+
+
+def test_diff_positions_continue_across_hunks():
+    app, _, old, _ = iter_diff_files(RAW_DIFF.splitlines())
+    # Заголовок второго хунка занимает позицию 4; удаленная строка — позицию 2
+    assert diff_positions(app.patch) == {1: 1, 2: 3, 10: 5, 11: 6}
+    assert diff_positions(old.patch) == {}
+    assert diff_positions(None) == {}
+
+
+def test_unchanged_blobs_get_their_sha_from_pr_head(tmp_path, monkeypatch):
+    from core.git_utils import GitHubManager
+
+    work = Repo.init(tmp_path / "work", initial_branch="main")
+    work.git.config("user.email", "t@example.com")
+    work.git.config("user.name", "T")
+    for name, text in (("run.sh", "echo hi\n"), ("old.py", "x = 1\n"), ("app.py", "y = 1\n")):
+        (tmp_path / "work" / name).write_text(text, encoding="utf-8")
+    work.git.add(A=True)
+    work.git.commit("-m", "base")
+    work.git.checkout("-b", "feature")
+    (tmp_path / "work" / "run.sh").chmod(0o755)
+    work.git.mv("old.py", "new.py")
+    (tmp_path / "work" / "app.py").write_text("y = 2\n", encoding="utf-8")
+    work.git.commit("-am", "feature")
+    Repo.init(tmp_path / "remote.git", bare=True)
+    work.git.push(str(tmp_path / "remote.git"), "main", "feature")
+
+    with FakeGitHubServer(tmp_path / "remote.git", "owner/repo") as server:
+        monkeypatch.setenv("GITHUB_API_URL", server.api_url)
+        monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+        number = server.add_pull("feature")
+        files = GitHubManager("token", "owner/repo", str(tmp_path / "work")).get_pr_files(number)
+
+    blobs = {name: work.git.rev_parse(f"feature:{name}") for name in ("run.sh", "new.py", "app.py")}
+    assert {f["filename"]: f["sha"] for f in files} == blobs
+    assert server.stats()["calls"]["POST graphql"] == 1
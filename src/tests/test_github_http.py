@@ -0,0 +1,111 @@
+import sys
+import json
+import time
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.github_http import ConditionalCache, GitHubHTTP, RateLimitScheduler
+
+
+class FakeResponse:
+    def __init__(self, status_code, body="", headers=None):
+        self.status_code = status_code
+        self.text = body
+        self.headers = headers or {}
+        self.encoding = "utf-8"
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self.text.split("\n")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeGitHub:
+    """Отдает issue с ETag и отвечает 304 на If-None-Match с тем же ETag."""
+
+    def __init__(self, responses=None):
+        self.requests = []
+        self.responses = list(responses or [])
+
+    def get(self, url, headers=None, params=None, timeout=None, stream=False):
+        self.requests.append(headers)
+        if self.responses:
+            return self.responses.pop(0)
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304, headers={"X-RateLimit-Remaining": "4999"})
+        body = json.dumps({"title": "Bug", "body": None, "html_url": "u"})
+        return FakeResponse(200, body, {"ETag": '"v1"', "X-RateLimit-Remaining": "4998"})
+
+
+def test_conditional_requests_reuse_cached_body(tmp_path):
+    session = FakeGitHub()
+    client = GitHubHTTP("t", api_url="http://gh", session=session, cache=ConditionalCache(tmp_path / "c.sqlite"))
+
+    first = client.get_json("repos/o/r/issues/1")
+    second = client.get_json("repos/o/r/issues/1")
+
+    assert first == second == {"title": "Bug", "body": None, "html_url": "u"}
+    assert session.requests[1]["If-None-Match"] == '"v1"'
+    stats = client.stats()
+    assert (stats["requests"], stats["not_modified"], stats["quota_used"]) == (2, 1, 1)
+    assert stats["rate_remaining"] == 4999
+
+
+def test_secondary_rate_limit_is_retried_after_delay(tmp_path):
+    session = FakeGitHub(responses=[FakeResponse(403, "You have exceeded a secondary rate limit", {"Retry-After": "0.05"})])
+    client = GitHubHTTP("t", api_url="http://gh", session=session, cache=ConditionalCache(tmp_path / "c.sqlite"))
+
+    started = time.monotonic()
+    assert client.get_json("repos/o/r/issues/1")["title"] == "Bug"
+    assert time.monotonic() - started >= 0.05
+    assert client.stats()["rate_waits"] == 1
+
+
+def test_retry_after_http_date_is_supported():
+    scheduler = RateLimitScheduler()
+    past = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    assert scheduler.retry_delay(FakeResponse(429, headers={"Retry-After": past})) == 0.0
+    assert scheduler.retry_delay(FakeResponse(403, headers={"Retry-After": "soon"})) == 60.0
+
+
+def test_low_remaining_quota_waits_for_reset(tmp_path):
+    reset_at = time.time() + 0.1
+    session = FakeGitHub(responses=[
+        FakeResponse(200, "{}", {"X-RateLimit-Remaining": "3", "X-RateLimit-Reset": str(reset_at)}),
+    ])
+    client = GitHubHTTP("t", api_url="http://gh", session=session, cache=ConditionalCache(tmp_path / "c.sqlite"))
+    client.scheduler.reserve = 5
+    client.scheduler.max_wait = 2
+
+    client.get_json("repos/o/r/issues/1")
+    client.get_json("repos/o/r/issues/2")
+    assert client.stats()["rate_waits"] == 1
+
+
+def test_streamed_diff_is_cached(tmp_path):
+    diff = "diff --git a/x b/x\n@@ -1 +1 @@\n+x"
+    session = FakeGitHub(responses=[FakeResponse(200, diff, {"ETag": '"d1"'}), FakeResponse(304)])
+    client = GitHubHTTP("t", api_url="http://gh", session=session, cache=ConditionalCache(tmp_path / "c.sqlite"))
+
+    assert list(client.stream_lines("repos/o/r/pulls/1")) == diff.split("\n")
+    assert list(client.stream_lines("repos/o/r/pulls/1")) == diff.split("\n")
+    assert session.requests[1]["If-None-Match"] == '"d1"'
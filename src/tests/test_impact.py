@@ -0,0 +1,164 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from git import Repo
+
+from core.impact import build_graph, extract_imports, parse_junit, run_impacted_tests, select_tests
+
+FILES = {
+    "src/pkg/__init__.py": "",
+    "src/pkg/core.py": "def value():\n    return 1\n",
+    "src/pkg/api.py": "from .core import value\n\ndef api():\n    return value()\n",
+    "src/pkg/cli.py": "import os\n",
+    "src/tests/test_api.py": "from pkg.api import api\n\ndef test_api():\n    assert api() == 1\n",
+    "src/tests/test_core.py": (
+        "from pkg import core\n\ndef test_value():\n    assert core.value() == 1\n\n"
+        "def test_broken():\n    assert core.value() == 2\n"
+    ),
+    "src/tests/test_cli.py": "import pkg.cli\n\ndef test_cli():\n    pass\n",
+    "README.md": "docs\n",
+}
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("TEST_IMPACT_ROOTS", raising=False)
+    root = tmp_path / "project"
+    repo = Repo.init(root)
+    for rel_path, text in FILES.items():
+        (root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel_path).write_text(text, encoding="utf-8")
+    (root / "src/tests/conftest.py").write_text(
+        "import sys, pathlib\nsys.path.insert(0, str(pathlib.Path(__file__).parent.parent))\n", encoding="utf-8"
+    )
+    repo.index.add([*FILES, "src/tests/conftest.py"])
+    repo.index.commit("init")
+    return root, repo
+
+
+def test_extract_imports_resolves_relative_and_from_imports():
+    source = "import os.path\nfrom . import core\nfrom ..util import helpers\n"
+    imports = extract_imports(source, ["pkg.sub.api"])
+
+    assert {"os", "os.path", "pkg.sub", "pkg.sub.core", "pkg.util", "pkg.util.helpers"} <= imports
+
+
+def test_selects_transitive_dependents_only(project):
+    root, _ = project
+    graph = build_graph(root)
+
+    # core <- api <- test_api, и core <- test_core напрямую
+    assert select_tests(graph, ["src/pkg/core.py"]) == (["src/tests/test_api.py", "src/tests/test_core.py"], None)
+    assert select_tests(graph, ["src/pkg/cli.py"]) == (["src/tests/test_cli.py"], None)
+    assert select_tests(graph, ["README.md"]) == ([], None)
+    # conftest каталога тестов — все тесты этого каталога; pyproject — весь набор с причиной
+    assert len(select_tests(graph, ["src/tests/conftest.py"])[0]) == 3
+    tests, reason = select_tests(graph, ["pyproject.toml"])
+    assert len(tests) == 3 and "pyproject.toml" in reason
+
+
+def test_graph_is_cached_per_commit_and_reused_by_blob(project):
+    root, repo = project
+    first = build_graph(root)
+    assert build_graph(root).imports == first.imports
+
+    (root / "src/pkg/cli.py").write_text("from pkg import core\n", encoding="utf-8")
+    # Незакоммиченная правка учитывается, хотя граф коммита уже в кэше
+    assert "src/tests/test_cli.py" in select_tests(build_graph(root), ["src/pkg/core.py"])[0]
+
+    repo.index.add(["src/pkg/cli.py"])
+    repo.index.commit("cli uses core")
+    assert "pkg.core" in build_graph(root).imports["src/pkg/cli.py"]
+    assert len(list((root.parent / "cache" / "test_impact").glob("graph-*.json"))) == 2
+
+
+def test_parse_junit_outcomes():
+    xml = """<testsuites><testsuite>
+      <testcase classname="tests.test_a" name="test_ok" time="0.5"/>
+      <testcase classname="tests.test_a" name="test_bad" time="0.1"><failure message="boom">trace\nassert 1 == 2</failure></testcase>
+      <testcase classname="tests.test_a" name="test_skip" time="0"><skipped message="no db"/></testcase>
+    </testsuite></testsuites>"""
+    cases = parse_junit(xml)
+
+    assert [(c.nodeid, c.outcome) for c in cases] == [
+        ("tests.test_a::test_ok", "passed"),
+        ("tests.test_a::test_bad", "failed"),
+        ("tests.test_a::test_skip", "skipped"),
+    ]
+    assert cases[1].message.endswith("assert 1 == 2") and cases[2].message == "no db"
+
+
+def test_run_impacted_tests_reports_failures(project):
+    root, _ = project
+    report = run_impacted_tests(["src/pkg/core.py"], root, workers=2)
+
+    assert report.selected == ["src/tests/test_api.py", "src/tests/test_core.py"] and report.total_tests == 3
+    assert (report.count("passed"), report.count("failed"), report.crashed) == (2, 1, [])
+    assert not report.ok
+    text = report.format_for_prompt()
+    assert "2 из 3" in text and "test_broken" in text
+
+
+def test_review_job_runs_tests_on_pr_head(project, tmp_path, monkeypatch):
+    from core.git_utils import GitHubManager, WorktreePool
+    from service.worker import Worker
+
+    root, repo = project
+    Repo.init(tmp_path / "origin.git", bare=True)
+    repo.create_remote("origin", str(tmp_path / "origin.git"))
+    base = repo.head.commit.hexsha
+    (root / "src/pkg/core.py").write_text("def value():\n    return 2\n", encoding="utf-8")
+    repo.index.add(["src/pkg/core.py"])
+    repo.index.commit("PR")
+    repo.git.push("origin", "HEAD:refs/pull/5/head")
+    repo.git.reset("--hard", base)
+
+    monkeypatch.setenv("GITHUB_API_URL", "http://127.0.0.1:9")
+    worker = Worker.__new__(Worker)
+    worker.github = GitHubManager("token", "owner/repo", str(root))
+    worker.worktrees = WorktreePool(repo, max_size=1)
+    reports = []
+    worker.reviewer = SimpleNamespace(
+        run_tests=True,
+        run_review=lambda target, workdir=None: reports.append(run_impacted_tests(["src/pkg/core.py"], workdir)),
+    )
+
+    worker.execute("review", 5)
+
+    # На коде PR value() == 2: падают test_value и test_api, test_broken проходит
+    assert (reports[0].count("passed"), reports[0].count("failed")) == (1, 2)
+    assert (root / "src/pkg/core.py").read_text(encoding="utf-8") == FILES["src/pkg/core.py"]
+
+
+def test_solve_job_starts_from_fresh_base_branch(project, tmp_path, monkeypatch):
+    from core.git_utils import GitHubManager, WorktreePool
+    from service.worker import Worker
+
+    root, repo = project
+    Repo.init(tmp_path / "origin.git", bare=True)
+    repo.create_remote("origin", str(tmp_path / "origin.git"))
+    startup = repo.head.commit.hexsha
+    (root / "src/pkg/core.py").write_text("def value():\n    return 2\n", encoding="utf-8")
+    repo.index.add(["src/pkg/core.py"])
+    fresh = repo.index.commit("merged after startup").hexsha
+    repo.git.push("origin", "HEAD:refs/heads/main")
+    repo.git.reset("--hard", startup)
+
+    monkeypatch.setenv("GITHUB_API_URL", "http://127.0.0.1:9")
+    worker = Worker.__new__(Worker)
+    worker.github = GitHubManager("token", "owner/repo", str(root))
+    worker.worktrees = WorktreePool(repo, max_size=1)
+    heads = []
+    worker.code_agent = SimpleNamespace(run=lambda target, workdir=None: heads.append(Repo(workdir).head.commit.hexsha) or 7)
+
+    assert worker.execute("solve", 3) == 7
+    assert heads == [fresh]
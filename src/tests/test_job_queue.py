@@ -0,0 +1,55 @@
+import sys
+import time
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.job_queue import JobQueue
+
+
+def test_pending_duplicates_are_collapsed(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite")
+    assert queue.enqueue("review", 5) is not None
+    assert queue.enqueue("review", 5) is None
+    assert queue.enqueue("solve", 5) is not None
+    assert queue.counts() == {"pending": 2}
+
+
+def test_same_key_is_not_claimed_while_running(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite")
+    queue.enqueue("review", 5)
+    first = queue.claim()
+    assert queue.enqueue("review", 5) is not None  # новое событие, пока идет ревью
+    assert queue.claim() is None
+
+    queue.complete(first)
+    second = queue.claim()
+    assert second.key == "review:5" and second.id != first.id
+
+
+def test_failed_job_is_retried_after_delay_then_gives_up(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite")
+    queue.enqueue("solve", 1, max_attempts=2)
+
+    job = queue.claim()
+    assert queue.fail(job, "boom", retry_delay=0.05) is True
+    assert queue.claim() is None
+    time.sleep(0.06)
+
+    job = queue.claim()
+    assert job.attempts == 2
+    assert queue.fail(job, "boom", retry_delay=0) is False
+    assert queue.counts() == {"failed": 1}
+
+
+def test_running_jobs_are_requeued_after_crash(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite")
+    queue.enqueue("review", 3)
+    queue.claim()
+
+    restarted = JobQueue(tmp_path / "jobs.sqlite")
+    assert restarted.requeue_running() == 1
+    assert restarted.claim().key == "review:3"
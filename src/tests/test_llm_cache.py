@@ -0,0 +1,93 @@
+import sys
+import time
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.llm_cache import ResponseCache
+from core.llm_client import LLMClient
+
+
+def test_key_depends_on_all_request_parameters():
+    base = ResponseCache.make_key("gpt://f/yandexgpt/latest", 0.0, 2000, "role", "prompt")
+    assert base == ResponseCache.make_key("gpt://f/yandexgpt/latest", 0.0, 2000, "role", "prompt")
+    assert base != ResponseCache.make_key("gpt://f/yandexgpt-lite/latest", 0.0, 2000, "role", "prompt")
+    assert base != ResponseCache.make_key("gpt://f/yandexgpt/latest", 0.3, 2000, "role", "prompt")
+    assert base != ResponseCache.make_key("gpt://f/yandexgpt/latest", 0.0, 1000, "role", "prompt")
+    assert base != ResponseCache.make_key("gpt://f/yandexgpt/latest", 0.0, 2000, "other", "prompt")
+
+
+def test_ttl_and_counters(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", ttl_seconds=0.05)
+    cache.set("k", "value")
+    assert cache.get("k") == "value"
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_by_size(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_bytes=25)
+    cache.set("a", "x" * 10)
+    cache.set("b", "x" * 10)
+    time.sleep(0.01)
+    assert cache.get("a") is not None  # "a" становится свежее "b"
+    cache.set("c", "x" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+class CountingSession:
+    def __init__(self):
+        self.calls = 0
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.calls += 1
+        session = self
+
+        class Response:
+            status_code = 200
+
+            def json(self):
+                return {"result": {"alternatives": [{"message": {"text": f"answer {session.calls}"}}]}}
+
+        return Response()
+
+
+def test_deterministic_requests_are_served_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("YANDEX_API_KEY", "test")
+    monkeypatch.setenv("YANDEX_FOLDER_ID", "test")
+    monkeypatch.setenv("LLM_TEMPERATURE", "0")
+    session = CountingSession()
+    client = LLMClient(session=session, cache=ResponseCache(tmp_path / "cache.sqlite"))
+
+    assert client.get_response("same") == "answer 1"
+    assert client.get_response("same") == "answer 1"
+    assert session.calls == 1
+
+    monkeypatch.setenv("LLM_TEMPERATURE", "0.7")
+    hot = LLMClient(session=session, cache=ResponseCache(tmp_path / "cache.sqlite"))
+    hot.get_response("same")
+    hot.get_response("same")
+    assert session.calls == 3
+
+
+def test_zero_temperature_clone_uses_shared_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("YANDEX_API_KEY", "test")
+    monkeypatch.setenv("YANDEX_FOLDER_ID", "test")
+    monkeypatch.setenv("LLM_TEMPERATURE", "0.7")
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr("core.llm_client._shared_cache", None)
+    session = CountingSession()
+    hot = LLMClient(session=session)
+    assert hot.cache is None
+
+    for _ in range(2):
+        assert hot.with_temperature(0).get_response("same") == "answer 1"
+    assert session.calls == 1
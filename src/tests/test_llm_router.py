@@ -0,0 +1,96 @@
+import itertools
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+for path in (src_path, src_path.parent / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from stubs import FakeLLMServer
+
+from core.config import AppConfig
+from core.llm_router import TASK_GENERATE, TASK_REDUCE, TASK_REVIEW_CHUNK, ModelRouter
+
+
+@pytest.fixture
+def llm_env(monkeypatch):
+    monkeypatch.setenv("YANDEX_API_KEY", "test")
+    monkeypatch.setenv("YANDEX_FOLDER_ID", "folder")
+    monkeypatch.setenv("LLM_CACHE", "off")
+    monkeypatch.setenv("LLM_BACKOFF_BASE", "0.01")
+    monkeypatch.delenv("YANDEX_MODEL", raising=False)
+    return monkeypatch
+
+
+def test_tasks_are_routed_to_model_tiers(llm_env):
+    with FakeLLMServer(response_text="ok") as server:
+        llm_env.setenv("YANDEX_LLM_URL", server.url)
+        router = ModelRouter("yandex", tiers={TASK_REDUCE: "yandexgpt-32k"})
+
+        router.for_task(TASK_GENERATE).get_response("code")
+        router.for_task(TASK_REVIEW_CHUNK).get_responses(["a", "b"], "review")
+        router.for_task(TASK_REDUCE).get_response("reduce")
+        # Атрибуты клиента generate доступны через роутер
+        assert router.model_name == "yandexgpt"
+
+        assert server.stats()["models"] == {
+            "gpt://folder/yandexgpt/latest": 1,
+            "gpt://folder/yandexgpt-lite/latest": 2,
+            "gpt://folder/yandexgpt-32k/latest": 1,
+        }
+    assert router.for_task(TASK_GENERATE) is router.for_task(TASK_GENERATE)
+    with pytest.raises(ValueError):
+        ModelRouter("yandex", tiers={"translate": "yandexgpt"})
+
+
+def test_openai_compatible_backend(llm_env):
+    with FakeLLMServer(response_text=lambda payload: f"echo: {payload['messages'][1]['text']}", stream_chunks=4) as server:
+        llm_env.setenv("OPENAI_BASE_URL", server.openai_url)
+        llm_env.setenv("OPENAI_MODEL", "local-coder")
+        client = ModelRouter("openai").for_task(TASK_GENERATE)
+
+        assert client.get_response("hello") == "echo: hello"
+        assert "".join(client.stream_response("streamed text")) == "echo: streamed text"
+        # text/event-stream без charset: requests иначе декодирует его как ISO-8859-1
+        assert "".join(client.stream_response("потоковый ответ")) == "echo: потоковый ответ"
+        assert server.stats()["models"] == {"local-coder": 3}
+
+
+def test_hedged_request_takes_the_faster_answer(llm_env):
+    calls = itertools.count()
+    # Первый запрос «зависает», дубликат отвечает сразу
+    with FakeLLMServer(response_text="fast", latency=lambda payload: 1.0 if next(calls) == 0 else 0.0) as server:
+        llm_env.setenv("YANDEX_LLM_URL", server.url)
+        router = ModelRouter("yandex", hedge_tasks=[TASK_REVIEW_CHUNK], hedge_after=0.1)
+        client = router.for_task(TASK_REVIEW_CHUNK)
+
+        start = time.monotonic()
+        assert client.get_response("chunk") == "fast"
+        assert time.monotonic() - start < 0.8
+        assert client.hedger.metrics()["hedge_wins"] == 1
+
+        calls = itertools.count()
+        start = time.monotonic()
+        assert client.get_responses(["x", "y"], "review") == ["fast", "fast"]
+        assert time.monotonic() - start < 0.8
+        assert router.for_task(TASK_GENERATE).hedger is None
+
+
+def test_config_reads_backend_and_tiers(monkeypatch):
+    monkeypatch.setenv("GITHUB_TOKEN", "t")
+    monkeypatch.setenv("REPO_NAME", "o/r")
+    monkeypatch.setenv("LLM_BACKEND", "openai")
+    monkeypatch.setenv("LLM_MODEL_TIERS", "review-chunk=small, reduce=large")
+    monkeypatch.setenv("LLM_HEDGE", "review-chunk")
+    monkeypatch.setenv("LLM_HEDGE_AFTER", "2.5")
+    monkeypatch.delenv("YANDEX_API_KEY", raising=False)
+
+    config = AppConfig.load()
+    router = ModelRouter.from_config(config)
+    assert config.model_tiers == {"review-chunk": "small", "reduce": "large"}
+    assert router.backend == "openai" and router.hedge_tasks == {"review-chunk"} and router.hedge_after == 2.5
@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.patching import PatchError, apply_edit, apply_edits, hunks_to_edits, verify_source
+
+SOURCE = (
+    "class Billing:\n"
+    "    def total(self, items):\n"
+    "        result = 0\n"
+    "        for item in items:\n"
+    "            result += item.price\n"
+    "        return result\n"
+    "\n"
+    "    def tax(self, amount):\n"
+    "        return amount * 0.2\n"
+)
+
+
+def test_exact_match_replaces_only_the_fragment():
+    updated = apply_edit(SOURCE, "return amount * 0.2", "return round(amount * 0.2, 2)")
+    assert "return round(amount * 0.2, 2)" in updated
+    assert updated.count("\n") == SOURCE.count("\n")
+
+
+def test_whitespace_differences_are_tolerated_and_indent_is_kept():
+    search = "for item in items:\n    result += item.price"
+    replace = "for item in items:\n    result += item.price * item.qty"
+    updated = apply_edit(SOURCE, search, replace)
+    assert "            result += item.price * item.qty\n" in updated
+    assert "        for item in items:\n" in updated
+
+
+def test_fuzzy_match_handles_small_drift():
+    search = "        result = 0\n        for item in item_list:\n            result += item.price"
+    replace = "        result = sum(item.price for item in items)"
+    updated = apply_edits(SOURCE, [{"search": search, "replace": replace}])
+    assert "result = sum(item.price for item in items)\n        return result" in updated
+
+
+def test_ambiguous_or_missing_fragment_is_rejected():
+    text = "x = 1\ny = 2\nx = 1\n"
+    with pytest.raises(PatchError):
+        apply_edit(text, "x = 1", "x = 3")
+    with pytest.raises(PatchError):
+        apply_edit(SOURCE, "def completely_unrelated():\n    pass", "")
+
+
+def test_unified_diff_hunks_become_edits():
+    diff = (
+        "--- a/billing.py\n+++ b/billing.py\n"
+        "@@ -8,2 +8,2 @@\n"
+        "     def tax(self, amount):\n"
+        "-        return amount * 0.2\n"
+        "+        return amount * 0.25\n"
+    )
+    updated = apply_edits(SOURCE, hunks_to_edits(diff))
+    assert "return amount * 0.25" in updated
+
+
+def test_hunk_lines_that_look_like_file_headers_are_kept():
+    sql = "SELECT 1;\n-- старый комментарий\nSELECT 2;\n"
+    diff = (
+        "--- a/q.sql\n+++ b/q.sql\n"
+        "@@ -1,3 +1,3 @@\n"
+        " SELECT 1;\n"
+        "--- старый комментарий\n"
+        "+-- новый комментарий\n"
+        " SELECT 2;\n"
+    )
+    assert hunks_to_edits(diff) == [{
+        "search": "SELECT 1;\n-- старый комментарий\nSELECT 2;",
+        "replace": "SELECT 1;\n-- новый комментарий\nSELECT 2;",
+    }]
+    assert apply_edits(sql, hunks_to_edits(diff)) == sql.replace("старый", "новый")
+
+
+def test_verify_rejects_broken_python():
+    verify_source("m.py", SOURCE)
+    with pytest.raises(PatchError):
+        verify_source("m.py", SOURCE.replace("def tax(self, amount):", "def tax(self, amount)"))
@@ -0,0 +1,140 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core import resilience
+from core.llm_client import LLMClient
+from core.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    FatalLLMError,
+    ResiliencePolicy,
+    RetryableLLMError,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+class ScriptedResponse:
+    def __init__(self, status_code: int, body=None, text: str = "", headers=None):
+        self.status_code = status_code
+        self._body = body
+        self.text = text
+        self.headers = headers or {}
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("not json")
+        return self._body
+
+
+def _ok(text: str = "ok") -> ScriptedResponse:
+    return ScriptedResponse(200, {"result": {"alternatives": [{"message": {"text": text}}]}})
+
+
+class ScriptedSession:
+    """Отдает ответы по списку; последний повторяется."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.calls += 1
+        return self.responses[min(self.calls, len(self.responses)) - 1]
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    monkeypatch.setenv("YANDEX_API_KEY", "test")
+    monkeypatch.setenv("YANDEX_FOLDER_ID", "test")
+    monkeypatch.setenv("LLM_BACKOFF_BASE", "0.01")
+    monkeypatch.setenv("LLM_CACHE", "off")
+    # Политики общие на процесс — каждому тесту свой набор
+    monkeypatch.setattr(resilience, "_policies", {})
+
+    def make(session, **policy):
+        client = LLMClient(session=session)
+        if policy:
+            client.policy = ResiliencePolicy(**policy)
+        return client
+    return make
+
+
+def test_bad_request_is_not_retried(client_for):
+    session = ScriptedSession(ScriptedResponse(400, {"message": "bad modelUri"}))
+    client = client_for(session)
+
+    with pytest.raises(FatalLLMError, match="bad modelUri") as excinfo:
+        client.get_response("hi")
+    # Совместимость: раньше 400 поднимал ValueError
+    assert isinstance(excinfo.value, ValueError)
+    assert session.calls == 1
+    assert client.resilience_metrics()["fatal_errors"] == 1
+
+
+def test_retry_after_is_respected_and_html_error_page_handled(client_for):
+    session = ScriptedSession(
+        ScriptedResponse(503, text="<html>Service Unavailable</html>", headers={"Retry-After": "0.2"}),
+        _ok("done"),
+    )
+    client = client_for(session)
+
+    start = time.monotonic()
+    assert client.get_response("hi") == "done"
+    assert time.monotonic() - start >= 0.2
+    metrics = client.resilience_metrics()
+    assert metrics["retries"] == 1 and metrics["successes"] == 1
+
+
+def test_retries_exhausted_raise_retryable_error(client_for):
+    session = ScriptedSession(ScriptedResponse(429, {"message": "quota"}))
+    client = client_for(session)
+
+    with pytest.raises(RetryableLLMError) as excinfo:
+        client.get_response("hi")
+    assert excinfo.value.status == 429
+    assert session.calls == client.retries
+
+
+def test_breaker_fails_fast_then_probes_after_reset(client_for):
+    session = ScriptedSession(ScriptedResponse(502, text="bad gateway"))
+    client = client_for(session, failure_threshold=2, reset_timeout=0.1, rate=0)
+    client.retries = 1
+
+    for _ in range(2):
+        with pytest.raises(RetryableLLMError):
+            client.get_response("hi")
+    with pytest.raises(CircuitOpenError):
+        client.get_response("hi")
+    assert session.calls == 2
+    assert client.resilience_metrics()["breaker_state"] == CircuitBreaker.OPEN
+
+    time.sleep(0.12)
+    session.responses = [_ok("back")]
+    assert client.get_response("hi") == "back"
+    metrics = client.resilience_metrics()
+    assert metrics["breaker_state"] == CircuitBreaker.CLOSED
+    assert metrics["short_circuited"] == 1 and metrics["breaker_opens"] == 1
+
+
+def test_token_bucket_spreads_requests():
+    bucket = TokenBucket(rate=10, capacity=2)
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.02)
+    assert waits[3] == pytest.approx(0.2, abs=0.02)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+    assert 0 <= parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
@@ -0,0 +1,178 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+
+class FakeLLM:
+    """Имитирует AsyncLLMClient: чанки отвечают с задержкой, reduce — сразу."""
+
+    model_name = "yandexgpt"
+    max_tokens = 500
+
+    def __init__(self):
+        self.chunk_prompts = []
+        self.reduce_prompt = None
+
+    def get_responses(self, prompts, system_role, max_concurrency=None, return_exceptions=False):
+        self.chunk_prompts = list(prompts)
+        results = [None] * len(prompts)
+
+        def worker(i):
+            time.sleep(0.2)
+            results[i] = f"Замечания части {i + 1}"
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(prompts))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def get_response(self, prompt, system_role):
+        self.reduce_prompt = prompt
+        return "### Отчет ревьюера\nВердикт: APPROVE"
+
+
+def _agent(monkeypatch, llm):
+    monkeypatch.setenv("GITHUB_TOKEN", "test")
+    monkeypatch.setenv("YANDEX_API_KEY", "test")
+    monkeypatch.setenv("REPO_NAME", "owner/repo")
+    from agents.reviewer_agent import ReviewerAgent
+
+    agent = ReviewerAgent.__new__(ReviewerAgent)
+    agent.llm = llm
+    agent.max_concurrency = 4
+    agent.diff_context = 1
+    return agent
+
+
+def _diff(n_files, lines_per_file):
+    parts = []
+    for i in range(n_files):
+        hunk = "\n".join(f"+value_{i}_{j} = compute({j})" for j in range(lines_per_file))
+        parts.append(f"\nFile: pkg/module_{i}.py\n@@ -0,0 +1,{lines_per_file} @@\n{hunk}\n")
+    return "".join(parts)
+
+
+def test_chunks_fit_budget_and_cover_all_files(monkeypatch):
+    agent = _agent(monkeypatch, FakeLLM())
+    files = agent._split_diff(_diff(10, 50))
+    chunks = agent._chunk_diff(files, budget=1500)
+
+    assert len(chunks) > 1
+    assert [p for chunk in chunks for p, _ in chunk] == [p for p, _ in files]
+
+
+def test_large_file_is_split_by_hunks(monkeypatch):
+    agent = _agent(monkeypatch, FakeLLM())
+    hunks = "".join(f"@@ -{i},1 +{i},1 @@\n" + "+x = 1\n" * 100 for i in range(6))
+    parts = agent._split_file_by_hunks("big.py", f"File: big.py\n{hunks}", budget=400)
+
+    assert len(parts) > 1
+    assert parts[0][1].startswith(f"File: big.py (часть 1/{len(parts)})")
+
+
+def test_chunked_review_runs_in_parallel_and_reduces(monkeypatch):
+    monkeypatch.setenv("LLM_CONTEXT_LIMIT", "3000")
+    llm = FakeLLM()
+    agent = _agent(monkeypatch, llm)
+    files = agent._split_diff(_diff(16, 60)) + [("poetry.lock", "File: poetry.lock\n" + "+pkg==1\n" * 500)]
+
+    started = time.monotonic()
+    report = agent._review_chunked(files, "Title: задача", "system")
+    elapsed = time.monotonic() - started
+
+    assert len(llm.chunk_prompts) > 2
+    assert elapsed < 0.2 * len(llm.chunk_prompts)
+    assert all("pkg==1" not in p for p in llm.chunk_prompts)
+    assert f"Замечания части {len(llm.chunk_prompts)}" in llm.reduce_prompt
+    assert "Вердикт: APPROVE" in report
+
+
+class PerFileLLM(FakeLLM):
+    """Отвечает в формате "#### path" и запоминает, какие файлы ему прислали."""
+
+    def __init__(self):
+        super().__init__()
+        self.reviewed = []
+
+    def get_responses(self, prompts, system_role, max_concurrency=None, return_exceptions=False):
+        results = []
+        for prompt in prompts:
+            paths = [line[len("File: "):].strip() for line in prompt.splitlines() if line.startswith("File: ")]
+            self.reviewed.extend(paths)
+            results.append("\n".join(f"#### {p}\n- замечание к {p}" for p in paths))
+        return results
+
+    def get_response(self, prompt, system_role):
+        paths = [line[len("File: "):].strip() for line in prompt.splitlines() if line.startswith("File: ")]
+        if not paths:
+            return super().get_response(prompt, system_role)
+        # Ревью одним запросом: отчет с разделами по файлам
+        sections = "\n".join(f"#### {p}\n- замечание к {p}" for p in paths)
+        return f"### Отчет ревьюера\n{sections}\n\nВердикт: REQUEST_CHANGES"
+
+
+def test_incremental_review_sends_only_changed_files(monkeypatch, tmp_path):
+    from core.review_state import ReviewStateStore
+
+    llm = PerFileLLM()
+    agent = _agent(monkeypatch, llm)
+    agent.state_store = ReviewStateStore("owner/repo", base_dir=tmp_path)
+    files = [
+        {"filename": "a.py", "sha": "a" * 40, "status": "modified", "patch": "@@ -1 +1 @@\n+a = 1"},
+        {"filename": "b.py", "sha": "b" * 40, "status": "modified", "patch": "@@ -1 +1 @@\n+b = 1"},
+    ]
+
+    # Первое ревью небольшого PR — один запрос, без map/reduce
+    assert "Вердикт: REQUEST_CHANGES" in agent._review_incremental(7, files, "issue", "system")
+    assert llm.reviewed == []
+
+    files[1] = dict(files[1], sha="c" * 40, patch="@@ -1 +1 @@\n+b = 2")
+    agent._review_incremental(7, files, "issue", "system")
+    assert llm.reviewed == ["b.py"]
+    assert "замечание к a.py" in llm.reduce_prompt
+    # Из первого отчета берется только раздел a.py, без замечаний к b.py и старого вердикта
+    a_section = llm.reduce_prompt.split("#### a.py\n", 1)[1].split("####", 1)[0]
+    assert a_section.strip() == "- замечание к a.py"
+
+    llm.reduce_prompt = None
+    agent._review_incremental(7, files, "issue", "system")
+    assert llm.reviewed == ["b.py"]
+    assert llm.reduce_prompt is None
+
+
+def test_parallel_reviews_run_tests_concurrently(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+
+    agent = _agent(monkeypatch, FakeLLM())
+    agent.gh_manager = SimpleNamespace(
+        local_path=tmp_path,
+        get_pull_request_data=lambda number: {"body": ""},
+        get_pr_files=lambda number, **filters: [],
+        sparse_add=lambda paths: None,
+        api_stats=lambda: {},
+    )
+    agent.diff_filters = {}
+    agent.run_tests = True
+    agent.incremental = False
+    # Прогон тестов каждого ревью ждет прогона другого: общий поток на всех привел бы к таймауту
+    barrier = threading.Barrier(2, timeout=5)
+    agent._run_tests = lambda pr_files, workdir: str(barrier.wait())
+    agent._review_single = lambda file_diffs, issue_text, system_prompt, tests: tests.result()
+    agent._publish = lambda number, pr, pr_files, report: "COMMENT"
+
+    reports = []
+    threads = [threading.Thread(target=lambda n=n: reports.append(agent.run_review(n))) for n in (1, 2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(reports) == ["0", "1"]
@@ -0,0 +1,133 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+for path in (src_path, src_path.parent / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from git import Repo
+from stubs import FakeGitHubServer
+
+from agents.reviewer_agent import ReviewerAgent
+from core.git_utils import SUMMARY_MARKER, GitHubManager
+
+PR_FILES = [{
+    "filename": "src/app.py",
+    "sha": "a1",
+    "status": "modified",
+    "patch": "@@ -1,3 +1,4 @@\n import os\n-x = 1\n+x = 2\n+y = 3\n print(x)",
+}]
+
+REPORT = """### Отчет ревьюера
+Переменная y добавлена, но нигде не используется.
+
+- `src/app.py:3` — y не используется
+- `app.py:2` — магическое число
+- `src/app.py:40` — строка вне diff остается только в отчете
+
+Вердикт: REQUEST_CHANGES
+"""
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    Repo.init(tmp_path / "work")
+    with FakeGitHubServer(tmp_path / "remote.git", "owner/repo") as server:
+        monkeypatch.setenv("GITHUB_API_URL", server.api_url)
+        monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+        number = server.add_pull("feature/x", title="PR")
+        server.add_comment(number, "Посмотрю вечером")
+        gh = GitHubManager("token", "owner/repo", str(tmp_path / "work"))
+        yield server, number, ReviewerAgent(SimpleNamespace(repo_name="owner/repo"), gh_manager=gh, llm=object())
+
+
+def test_findings_are_published_as_one_review(github):
+    server, number, agent = github
+
+    assert agent._publish(number, {"head": {"sha": "f" * 40}}, PR_FILES, REPORT) == "REQUEST_CHANGES"
+
+    [review] = server.reviews[number]
+    assert review["event"] == "REQUEST_CHANGES" and review["commit_id"] == "f" * 40
+    assert review["comments"] == [
+        {"path": "src/app.py", "position": 4, "body": "y не используется"},
+        {"path": "src/app.py", "position": 3, "body": "магическое число"},
+    ]
+    assert server.stats()["calls"] == {"POST pull_reviews": 1, "GET issue_comments": 1, "POST issue_comments": 1}
+    assert server.comments[number][1]["body"] == f"{SUMMARY_MARKER}\n{REPORT}"
+
+
+def test_summary_comment_is_updated_in_place(github):
+    server, number, agent = github
+    agent._publish(number, {}, PR_FILES, REPORT)
+    calls = dict(server.stats()["calls"])
+
+    # Тот же отчет не публикуется повторно и не требует запросов к API
+    agent._publish(number, {}, PR_FILES, REPORT)
+    assert len(server.reviews[number]) == 1
+    assert server.stats()["calls"] == calls
+
+    agent._publish(number, {}, PR_FILES, REPORT.replace("REQUEST_CHANGES", "APPROVE"))
+    assert [c["body"] for c in server.comments[number]] == [
+        "Посмотрю вечером",
+        f"{SUMMARY_MARKER}\n{REPORT.replace('REQUEST_CHANGES', 'APPROVE')}",
+    ]
+    assert [r["state"] for r in server.reviews[number]] == ["CHANGES_REQUESTED", "APPROVED"]
+    assert server.comments[number][1]["html_url"] in server.reviews[number][1]["body"]
+    # Известный комментарий правится без повторного чтения списка
+    assert server.stats()["calls"]["PATCH comment"] == 1
+    assert server.stats()["calls"]["GET issue_comments"] == 1
+
+
+def test_failed_review_is_retried_on_next_run(github, monkeypatch):
+    server, number, agent = github
+    publish_review = agent.gh_manager.publish_review
+
+    def unavailable(*args, **kwargs):
+        raise requests.ConnectionError("GitHub недоступен")
+
+    monkeypatch.setattr(agent.gh_manager, "publish_review", unavailable)
+    with pytest.raises(requests.ConnectionError):
+        agent._publish(number, {}, PR_FILES, REPORT)
+    assert number not in server.reviews and len(server.comments[number]) == 1
+
+    monkeypatch.setattr(agent.gh_manager, "publish_review", publish_review)
+    agent._publish(number, {}, PR_FILES, REPORT)
+    assert [r["state"] for r in server.reviews[number]] == ["CHANGES_REQUESTED"]
+    assert len(server.comments[number]) == 2
+
+
+def test_only_own_summary_comment_is_updated(github):
+    server, number, agent = github
+    quote = server.add_comment(number, f"> {SUMMARY_MARKER}\n> старый отчет бота")
+
+    agent._publish(number, {}, PR_FILES, REPORT)
+
+    assert quote["body"] == f"> {SUMMARY_MARKER}\n> старый отчет бота"
+    assert server.comments[number][-1]["user"]["login"] == "github-actions[bot]"
+    assert server.comments[number][-1]["body"] == f"{SUMMARY_MARKER}\n{REPORT}"
+
+
+def test_rejected_verdict_falls_back_to_comment_without_inline_comments(github):
+    server, number, agent = github
+    server.rejected_events = {"APPROVE", "REQUEST_CHANGES"}
+
+    agent._publish(number, {}, PR_FILES, REPORT)
+
+    assert [r["state"] for r in server.reviews[number]] == ["COMMENTED"]
+    assert server.reviews[number][0]["comments"] == []
+    assert server.stats()["calls"]["POST pull_reviews"] == 2
+
+
+def test_report_without_verdict_line_is_a_comment(github):
+    server, number, agent = github
+
+    verdict = agent._publish(number, {}, PR_FILES, "Нужен ли здесь REQUEST_CHANGES, решит автор.")
+
+    assert verdict == "COMMENT"
+    assert [r["state"] for r in server.reviews[number]] == ["COMMENTED"]
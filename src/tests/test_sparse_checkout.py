@@ -0,0 +1,95 @@
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+import base64
+
+from git import Repo
+
+from core.git_utils import GitHubManager
+
+
+def _sparse_clone(tmp_path: Path, monkeypatch) -> GitHubManager:
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    origin = Repo.init(tmp_path / "origin")
+    origin.git.config("uploadpack.allowFilter", "true")
+    origin.git.config("user.email", "t@example.com")
+    origin.git.config("user.name", "T")
+    for rel in ("README.md", "pkg/a/mod.py", "pkg/b/other.py"):
+        path = tmp_path / "origin" / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"# {rel}\n", encoding="utf-8")
+    origin.git.add(A=True)
+    origin.git.commit("-m", "init")
+
+    Repo.clone_from(
+        f"file://{tmp_path / 'origin'}",
+        str(tmp_path / "work"),
+        multi_options=["--filter=blob:none", "--sparse", "--depth=1"],
+    )
+    return GitHubManager("token", "owner/repo", str(tmp_path / "work"))
+
+
+def test_sparse_add_materializes_only_requested_paths(tmp_path, monkeypatch):
+    gh = _sparse_clone(tmp_path, monkeypatch)
+    work = tmp_path / "work"
+    assert gh.is_sparse
+    assert (work / "README.md").exists() and not (work / "pkg").exists()
+    assert set(gh.tracked_blobs()) == {"README.md", "pkg/a/mod.py", "pkg/b/other.py"}
+
+    gh.sparse_add(["pkg/a/mod.py"])
+    assert (work / "pkg" / "a" / "mod.py").exists()
+    assert not (work / "pkg" / "b").exists()
+
+
+def test_commit_stages_only_written_paths(tmp_path, monkeypatch):
+    gh = _sparse_clone(tmp_path, monkeypatch)
+    work = tmp_path / "work"
+    (work / "pkg" / "c").mkdir(parents=True)
+    (work / "pkg" / "c" / "new.py").write_text("x = 1\n", encoding="utf-8")
+    (work / "scratch.txt").write_text("не коммитится\n", encoding="utf-8")
+    monkeypatch.setattr(type(gh.local_repo.remote("origin")), "push", lambda self, **kw: None)
+
+    gh.commit_and_push("main", "add new", paths=["pkg/c/new.py"])
+
+    changed = gh.local_repo.git.show("--name-only", "--format=", "HEAD").split()
+    assert changed == ["pkg/c/new.py"]
+    assert "scratch.txt" in gh.local_repo.untracked_files
+
+
+def test_token_is_passed_to_git_commands_but_not_stored(tmp_path, monkeypatch):
+    gh = _sparse_clone(tmp_path, monkeypatch)
+    origin_url = gh.local_repo.remote("origin").url
+    header = "AUTHORIZATION: basic " + base64.b64encode(b"x-access-token:token").decode("ascii")
+
+    assert gh.local_repo.git.config("--get", "http.https://github.com/.extraheader") == header
+    worktree = gh.for_local_path(tmp_path / "work")
+    assert worktree.local_repo.git.config("--get", "http.https://github.com/.extraheader") == header
+
+    assert gh.local_repo.remote("origin").url == origin_url
+    assert "extraheader" not in (tmp_path / "work" / ".git" / "config").read_text(encoding="utf-8")
+
+
+def test_partial_clone_keeps_token_out_of_the_repository(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("GITHUB_SERVER_URL", f"file://{tmp_path}/")
+    origin = Repo.init(tmp_path / "owner" / "repo.git", bare=True, initial_branch="main")
+    origin.git.config("uploadpack.allowFilter", "true")
+    source = Repo.init(tmp_path / "source")
+    source.git.config("user.email", "t@example.com")
+    source.git.config("user.name", "T")
+    (tmp_path / "source" / "pkg").mkdir()
+    (tmp_path / "source" / "pkg" / "mod.py").write_text("x = 1\n", encoding="utf-8")
+    source.git.add(A=True)
+    source.git.commit("-m", "init")
+    source.git.push(str(tmp_path / "owner" / "repo.git"), "HEAD:refs/heads/main")
+
+    gh = GitHubManager.partial_clone("secret-token", "owner/repo", tmp_path / "work", paths=["pkg/mod.py"])
+
+    assert (tmp_path / "work" / "pkg" / "mod.py").exists()
+    assert gh.local_repo.remote("origin").url == f"file://{tmp_path}/owner/repo.git"
+    assert "secret-token" not in (tmp_path / "work" / ".git" / "config").read_text(encoding="utf-8")
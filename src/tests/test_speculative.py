@@ -0,0 +1,174 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from git import Repo
+
+from agents.code_agent import Candidate, CodeAgent
+
+FILES = {
+    "src/pkg/__init__.py": "",
+    "src/pkg/calc.py": "def add(a: int, b: int) -> int:\n    raise NotImplementedError\n",
+    "src/tests/test_calc.py": "from pkg.calc import add\n\n\ndef test_add():\n    assert add(2, 2) == 4\n",
+    "src/tests/conftest.py": "import sys, pathlib\nsys.path.insert(0, str(pathlib.Path(__file__).parent.parent))\n",
+}
+
+
+def _edit(replace: str) -> str:
+    return json.dumps({"files_to_modify": [{
+        "path": "src/pkg/calc.py",
+        "edits": [{"search": "    raise NotImplementedError\n", "replace": replace}],
+    }]})
+
+
+class CandidateLLM:
+    """Ответ и задержка зависят от температуры: так кандидаты различаются."""
+    model_name = "fake"
+    max_tokens = 500
+
+    def __init__(self, answers, temperature=0.3):
+        self.answers = answers
+        self.temperature = temperature
+        self.calls = []
+
+    def with_temperature(self, temperature):
+        clone = CandidateLLM(self.answers, temperature)
+        clone.calls = self.calls
+        return clone
+
+    def get_response(self, prompt, system_role=""):
+        self.calls.append(self.temperature)
+        delay, answer = self.answers.get(self.temperature, (0, "не JSON"))
+        time.sleep(delay)
+        return answer
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("VALIDATION_CHECKS", "syntax,tests")
+    monkeypatch.setenv("CODE_AGENT_CANDIDATES", "3")
+    monkeypatch.setenv("CODE_AGENT_CANDIDATE_TEMPERATURES", "0.1,0.5,0.9")
+    monkeypatch.setenv("CODE_AGENT_REPAIR_ATTEMPTS", "0")
+    root = tmp_path / "project"
+    repo = Repo.init(root)
+    for rel_path, text in FILES.items():
+        (root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel_path).write_text(text, encoding="utf-8")
+    repo.index.add(list(FILES))
+    repo.index.commit("init")
+    monkeypatch.chdir(root)
+    return root, repo
+
+
+def test_first_valid_candidate_wins(project):
+    root, repo = project
+    llm = CandidateLLM({
+        0.1: (0, "не JSON"),
+        0.5: (0, _edit("    return a - b\n")),
+        0.9: (0.3, _edit("    return a + b\n")),
+    })
+    agent = CodeAgent(SimpleNamespace(), github=SimpleNamespace(local_repo=repo), llm=llm)
+
+    written, report = agent._solve_speculative("prompt", "system", "task", root)
+
+    assert written == ["src/pkg/calc.py"] and report.ok
+    assert "return a + b" in (root / "src/pkg/calc.py").read_text(encoding="utf-8")
+    assert sorted(llm.calls) == [0.1, 0.5, 0.9]
+
+
+def test_slow_candidates_do_not_delay_the_winner(project):
+    root, repo = project
+    llm = CandidateLLM({
+        0.1: (0, _edit("    return a + b\n")),
+        0.5: (3, _edit("    return b + a\n")),
+        0.9: (3, "не JSON"),
+    })
+    agent = CodeAgent(SimpleNamespace(), github=SimpleNamespace(local_repo=repo), llm=llm)
+    agent.validate_changes = False
+
+    started = time.monotonic()
+    written, _ = agent._solve_speculative("prompt", "system", "task", root)
+
+    assert time.monotonic() - started < 2
+    assert written == ["src/pkg/calc.py"]
+    assert "return a + b" in (root / "src/pkg/calc.py").read_text(encoding="utf-8")
+
+
+def test_no_commit_or_pr_without_changes(project):
+    root, repo = project
+    calls = []
+    github = SimpleNamespace(
+        local_repo=repo,
+        is_sparse=False,
+        get_issue=lambda number: {"title": "Add numbers", "body": "add()"},
+        create_branch=lambda name: calls.append("branch"),
+        commit_and_push=lambda *args, **kwargs: calls.append("commit"),
+        create_pull_request=lambda *args: calls.append("pr"),
+    )
+    agent = CodeAgent(SimpleNamespace(), github=github, llm=CandidateLLM({}))
+
+    assert agent.run(1) is None
+    assert calls == ["branch"]
+
+
+def test_candidate_without_report_is_rejected_not_crashing(project, monkeypatch):
+    root, repo = project
+    agent = CodeAgent(SimpleNamespace(), github=SimpleNamespace(local_repo=repo), llm=CandidateLLM({}))
+    # Кандидат без ошибки и без проверки, но и без файлов — не годится, но и не роняет решение
+    monkeypatch.setattr(agent, "_run_candidate", lambda index, temperature, *args: Candidate(index, temperature))
+
+    assert agent._solve_speculative("prompt", "system", "task", root) == ([], None)
+
+
+def test_cancelled_candidate_does_not_call_llm(project):
+    root, repo = project
+    llm = CandidateLLM({0.1: (0, _edit("    return a + b\n"))})
+    agent = CodeAgent(SimpleNamespace(), github=SimpleNamespace(local_repo=repo), llm=llm)
+    stop = threading.Event()
+    stop.set()
+
+    candidate = agent._run_candidate(0, 0.1, "prompt", "system", "task", repo.head.commit.hexsha, stop)
+
+    assert candidate.error and not candidate.files
+    assert llm.calls == []
+
+
+def test_losers_holding_a_worktree_finish_before_return(project, monkeypatch):
+    import agents.code_agent as code_agent
+
+    root, repo = project
+    llm = CandidateLLM({
+        0.1: (0.2, _edit("    return a + b\n")),
+        0.5: (0, _edit("    return b + a\n")),
+        0.9: (3, "не JSON"),
+    })
+    agent = CodeAgent(SimpleNamespace(), github=SimpleNamespace(local_repo=repo), llm=llm)
+    events = []
+
+    def validate(scratch, written):
+        if "b + a" in (scratch / "src/pkg/calc.py").read_text(encoding="utf-8"):
+            time.sleep(1)
+            events.append("slow validation done")
+            return SimpleNamespace(ok=False, diagnostics=["медленно"])
+        return SimpleNamespace(ok=True, diagnostics=[])
+
+    monkeypatch.setattr(code_agent, "validate", validate)
+
+    started = time.monotonic()
+    written, _ = agent._solve_speculative("prompt", "system", "task", root)
+
+    # Кандидат 0.5 держал черновой worktree и дождался; 0.9 еще ждет ответа LLM и не задерживает
+    assert events == ["slow validation done"]
+    assert time.monotonic() - started < 2.5
+    assert "return a + b" in (root / "src/pkg/calc.py").read_text(encoding="utf-8")
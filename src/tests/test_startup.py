@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+root = src_path.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+HEAVY_MODULES = {"github", "git", "requests", "click", "dotenv"}
+
+
+def _run(*args: str) -> subprocess.CompletedProcess:
+    env = {k: v for k, v in os.environ.items() if k not in ("GITHUB_TOKEN", "YANDEX_API_KEY", "REPO_NAME")}
+    return subprocess.run([sys.executable, "-X", "importtime", *args], cwd=root, env=env, capture_output=True, text=True)
+
+
+def test_help_does_not_import_heavy_dependencies():
+    result = _run("main.py", "--help")
+    assert result.returncode == 0
+    imported = {line.rsplit("|", 1)[-1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")}
+    assert not HEAVY_MODULES & imported
+
+
+def test_config_import_has_no_side_effects():
+    code = (
+        "import logging, sys; sys.path.insert(0, 'src'); import core.config; "
+        "assert not logging.getLogger().handlers; "
+        "assert core.config._config is None"
+    )
+    result = _run("-c", code)
+    assert result.returncode == 0, result.stderr
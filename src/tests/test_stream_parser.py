@@ -0,0 +1,52 @@
+import sys
+import json
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.stream_parser import ChangesStreamParser
+
+RESPONSE = "Вот решение:\n```json\n" + json.dumps({
+    "files_to_create": [
+        {"path": "a.py", "content": "def f():\n    return {\"x\": [1, 2]}\n"},
+        {"path": "b.md", "content": "} ] { [ \\ \""},
+    ],
+    "note": "files_to_create",
+    "files_to_modify": [{"path": "c.py", "content": "print('}')"}],
+}, ensure_ascii=False) + "\n```\nГотово {"
+
+
+def _feed_in_chunks(text, size):
+    parser = ChangesStreamParser()
+    entries = []
+    for i in range(0, len(text), size):
+        entries.extend(parser.feed(text[i:i + size]))
+    return parser, entries
+
+
+def test_entries_are_emitted_for_any_chunking():
+    for size in (1, 3, 17, len(RESPONSE)):
+        parser, entries = _feed_in_chunks(RESPONSE, size)
+        assert [(kind, e["path"]) for kind, e in entries] == [
+            ("files_to_create", "a.py"),
+            ("files_to_create", "b.md"),
+            ("files_to_modify", "c.py"),
+        ]
+        assert entries[1][1]["content"] == "} ] { [ \\ \""
+        assert parser.finished
+
+
+def test_entry_is_emitted_before_response_ends():
+    parser = ChangesStreamParser()
+    head = '{"files_to_create": [{"path": "a.py", "content": "x"}, {"path": "b.py", "cont'
+    assert [e["path"] for _, e in parser.feed(head)] == ["a.py"]
+    assert [e["path"] for _, e in parser.feed('ent": "y"}]}')] == ["b.py"]
+
+
+def test_raw_newlines_inside_strings_are_tolerated():
+    parser = ChangesStreamParser()
+    entries = parser.feed('{"files_to_create": [{"path": "a.py", "content": "line1\nline2"}]}')
+    assert entries[0][1]["content"] == "line1\nline2"
@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core.tokens import (
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    PRIORITY_REQUIRED,
+    PromptPacker,
+    PromptSection,
+    estimate_tokens,
+    path_priority,
+    prompt_budget,
+)
+
+
+def test_estimate_counts_cyrillic_denser_than_ascii():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 400) == 100
+    assert estimate_tokens("я" * 400) > estimate_tokens("a" * 400)
+
+
+def test_prompt_budget_subtracts_answer_and_fixed_text(monkeypatch):
+    monkeypatch.setenv("LLM_CONTEXT_LIMIT", "10000")
+    assert prompt_budget("any", 2000, "x" * 400, safety_ratio=0) == 10000 - 2000 - 100
+
+
+def test_lockfiles_and_generated_files_get_low_priority():
+    assert path_priority("poetry.lock") == PRIORITY_LOW
+    assert path_priority("web/package-lock.json") == PRIORITY_LOW
+    assert path_priority("api/service_pb2.py") == PRIORITY_LOW
+    assert path_priority("src/core/config.py") == PRIORITY_NORMAL
+
+
+def test_packer_reduces_low_priority_sections_first():
+    code = "\n".join(f"line {i} of important code" for i in range(200))
+    lock = "\n".join(f"dependency-{i}==1.0" for i in range(400))
+    sections = [
+        PromptSection("header", "Проверь PR", PRIORITY_REQUIRED),
+        PromptSection("src/app.py", code, PRIORITY_NORMAL),
+        PromptSection("poetry.lock", lock, PRIORITY_LOW, summary="[poetry.lock опущен]"),
+    ]
+    budget = estimate_tokens(code) + 100
+    result = PromptPacker(budget, min_section_tokens=200).pack(sections)
+
+    assert result.tokens <= budget
+    assert result.summarized == ["poetry.lock"]
+    assert result.truncated == []
+    assert code in result.text
+    assert result.text.index("Проверь PR") < result.text.index("[poetry.lock опущен]")
+
+
+def test_packer_truncates_when_enough_remains():
+    text = "\n".join(f"row {i}" for i in range(1000))
+    result = PromptPacker(1000, min_section_tokens=100).pack([PromptSection("big", text)])
+    assert result.truncated == ["big"]
+    assert result.tokens <= 1000
+    assert result.text.startswith("row 0\nrow 1\n")
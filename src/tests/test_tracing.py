@@ -0,0 +1,69 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from core import tracing
+from core.tracing import current_span, record_usage, span, traced
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    tracer = tracing.Tracer(path=str(tmp_path / "trace.jsonl"), summary=False)
+    monkeypatch.setattr(tracing, "_tracer", tracer)
+    return tracer
+
+
+def _spans(tracer):
+    with open(tracer.path, encoding="utf-8") as f:
+        return {s["name"]: s for s in map(json.loads, f)}
+
+
+def test_nested_spans_are_exported_with_parent_links(tracer):
+    @traced("job.step")
+    def step():
+        record_usage({"inputTextTokens": "12", "completionTokens": "3", "totalTokens": "15"})
+        current_span().add("retries")
+
+    with span("job", issue=7):
+        step()
+        step()
+
+    spans = _spans(tracer)
+    assert spans["job.step"]["parentSpanId"] == spans["job"]["spanId"]
+    assert spans["job.step"]["traceId"] == spans["job"]["traceId"]
+    assert spans["job"]["attributes"] == {"issue": 7}
+    assert spans["job.step"]["attributes"] == {"tokens.input": 12, "tokens.output": 3, "tokens.total": 15, "retries": 1}
+
+    summary = tracer.summary()
+    assert summary["job.step"]["calls"] == 2 and summary["job.step"]["attr:tokens.total"] == 30
+    assert "job.step" in tracer.format_summary()
+
+
+def test_errors_are_recorded_and_reraised(tracer):
+    with pytest.raises(RuntimeError):
+        with span("failing"):
+            raise RuntimeError("boom")
+    assert _spans(tracer)["failing"]["status"] == {"code": "ERROR", "message": "RuntimeError: boom"}
+
+
+def test_context_propagates_to_threads(tracer):
+    async def main():
+        with span("parent"):
+            await asyncio.to_thread(lambda: current_span().add("calls"))
+
+    asyncio.run(main())
+    assert _spans(tracer)["parent"]["attributes"] == {"calls": 1}
+
+
+def test_attributes_outside_spans_are_ignored(tracer):
+    current_span().add("anything")
+    record_usage({"totalTokens": "5"})
+    assert tracer.summary() == {}
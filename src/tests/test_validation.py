@@ -0,0 +1,92 @@
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+from git import Repo
+
+from agents.code_agent import CodeAgent
+from core.validation import changed_lines, validate
+
+FILES = {
+    "src/pkg/__init__.py": "",
+    # Старая проблема в неизмененной строке не должна попадать в замечания
+    "src/pkg/calc.py": "def legacy():\n    return missing_name\n\n\ndef add(a: int, b: int) -> int:\n    return a + b\n",
+    "src/tests/test_calc.py": "from pkg.calc import add\n\n\ndef test_add():\n    assert add(2, 2) == 4\n",
+    "src/tests/conftest.py": "import sys, pathlib\nsys.path.insert(0, str(pathlib.Path(__file__).parent.parent))\n",
+}
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("VALIDATION_CHECKS", "syntax,ruff,tests")
+    root = tmp_path / "project"
+    repo = Repo.init(root)
+    for rel_path, text in FILES.items():
+        (root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel_path).write_text(text, encoding="utf-8")
+    repo.index.add(list(FILES))
+    repo.index.commit("init")
+    return root
+
+
+def test_changed_lines(project):
+    (project / "src/pkg/calc.py").write_text(FILES["src/pkg/calc.py"] + "\n\nextra = 1\n", encoding="utf-8")
+    (project / "src/pkg/new.py").write_text("x = 1\n", encoding="utf-8")
+
+    lines = changed_lines(project, ["src/pkg/calc.py", "src/pkg/new.py", "src/pkg/__init__.py"])
+    assert lines == {"src/pkg/calc.py": {7, 8, 9}, "src/pkg/new.py": None, "src/pkg/__init__.py": set()}
+
+
+def test_validate_reports_only_new_problems(project):
+    (project / "src/pkg/calc.py").write_text(
+        FILES["src/pkg/calc.py"].replace("return a + b", "return a - b + undefined_offset"), encoding="utf-8"
+    )
+    (project / "src/pkg/broken.py").write_text("def oops(:\n", encoding="utf-8")
+
+    report = validate(project, ["src/pkg/calc.py", "src/pkg/broken.py", "README.md"])
+
+    found = {(d.check, d.path, d.line) for d in report.diagnostics}
+    assert ("syntax", "src/pkg/broken.py", 1) in found
+    assert ("ruff", "src/pkg/calc.py", 6) in found
+    # legacy() (строка 2) не менялась; ruff не дублирует синтаксическую ошибку
+    assert not any(d.line == 2 for d in report.diagnostics if d.path == "src/pkg/calc.py")
+    assert not any(d.check == "ruff" and d.path == "src/pkg/broken.py" for d in report.diagnostics)
+    assert any(d.check == "tests" and "test_add" in d.message for d in report.diagnostics)
+    assert report.failed_paths == ["src/pkg/broken.py", "src/pkg/calc.py"]
+
+
+class RepairingLLM:
+    model_name = "fake"
+
+    def __init__(self):
+        self.prompts = []
+
+    def get_response(self, prompt, system_role=""):
+        self.prompts.append(prompt)
+        return json.dumps({"files_to_modify": [{
+            "path": "src/pkg/calc.py",
+            "edits": [{"search": "    return a - b\n", "replace": "    return a + b\n"}],
+        }]})
+
+
+def test_code_agent_repairs_failing_change(project, monkeypatch):
+    monkeypatch.chdir(project)
+    llm = RepairingLLM()
+    agent = CodeAgent(SimpleNamespace(), stream=False, github=SimpleNamespace(), llm=llm)
+    (project / "src/pkg/calc.py").write_text(FILES["src/pkg/calc.py"].replace("a + b", "a - b"), encoding="utf-8")
+
+    report = agent._validate_and_repair("Реши задачу", "system", ["src/pkg/calc.py"], project)
+
+    assert report.ok
+    assert len(llm.prompts) == 1
+    # В промпт уходят замечания и фрагмент кода, а не весь контекст проекта
+    assert "test_add" in llm.prompts[0] and "return a - b" in llm.prompts[0]
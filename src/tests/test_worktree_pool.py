@@ -0,0 +1,92 @@
+import sys
+import threading
+from pathlib import Path
+
+current_dir = Path(__file__).resolve().parent
+src_path = current_dir.parent
+if str(src_path) not in sys.path:
+    sys.path.append(str(src_path))
+
+import pytest
+from git import GitCommandError, Repo
+
+from core.git_utils import WorktreePool
+
+
+def _make_repo(path: Path) -> Repo:
+    repo = Repo.init(path)
+    with repo.config_writer() as cfg:
+        cfg.set_value("user", "email", "test@example.com")
+        cfg.set_value("user", "name", "Test")
+    (path / "app.py").write_text("x = 1\n", encoding="utf-8")
+    repo.index.add(["app.py"])
+    repo.index.commit("init")
+    return repo
+
+
+def test_leases_are_isolated_and_recycled_clean(tmp_path):
+    repo = _make_repo(tmp_path / "repo")
+    pool = WorktreePool(repo, max_size=2)
+
+    with pool.lease() as first, pool.lease() as second:
+        assert first != second
+        (first / "app.py").write_text("x = 2\n", encoding="utf-8")
+        (first / "new.py").write_text("", encoding="utf-8")
+        assert (second / "app.py").read_text(encoding="utf-8") == "x = 1\n"
+        assert not (second / "new.py").exists()
+
+    with pool.lease() as again:
+        assert again in (first, second)
+        assert (again / "app.py").read_text(encoding="utf-8") == "x = 1\n"
+        assert not (again / "new.py").exists()
+
+    # основная рабочая копия не затронута
+    assert (tmp_path / "repo" / "app.py").read_text(encoding="utf-8") == "x = 1\n"
+    pool.close()
+    assert len(repo.git.worktree("list").splitlines()) == 1
+
+
+def test_lease_blocks_when_pool_is_exhausted(tmp_path):
+    pool = WorktreePool(_make_repo(tmp_path / "repo"), max_size=1)
+    acquired = threading.Event()
+
+    def other():
+        with pool.lease():
+            acquired.set()
+
+    with pool.lease():
+        thread = threading.Thread(target=other)
+        thread.start()
+        assert not acquired.wait(0.3)
+    thread.join(5)
+    assert acquired.is_set()
+
+
+def test_failed_add_does_not_poison_the_pool(tmp_path):
+    repo = _make_repo(tmp_path / "repo")
+    pool = WorktreePool(repo, max_size=1)
+
+    with pytest.raises(GitCommandError):
+        with pool.lease("no-such-ref"):
+            pass
+
+    with pool.lease() as path:
+        assert (path / "app.py").read_text(encoding="utf-8") == "x = 1\n"
+
+
+def test_failed_path_allocation_releases_the_slot(tmp_path, monkeypatch):
+    repo = _make_repo(tmp_path / "repo")
+    pool = WorktreePool(repo, max_size=1)
+    new_path = pool._new_path
+
+    def broken():
+        raise OSError("нет места")
+
+    monkeypatch.setattr(pool, "_new_path", broken)
+    with pytest.raises(OSError):
+        with pool.lease():
+            pass
+
+    monkeypatch.setattr(pool, "_new_path", new_path)
+    with pool.lease() as path:
+        assert (path / "app.py").exists()